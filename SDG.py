@@ -9,129 +9,57 @@ Generates synthetic breast cancer data following the distribution in a real brea
 @author: Philipp D. Rohde
 """
 import argparse
+import concurrent.futures
 import csv
 import datetime
+import itertools
+import json
 import os
+import shutil
+import socket
+import subprocess
+import sys
 import time
+import typing
 
-import mysql.connector
 import numpy as np
-import pandas as pd
-from mysql.connector.connection import MySQLConnection
-from mysql.connector.cursor import MySQLCursor
-from rdfizer import semantify
-
-max_cycles_adjuvant = 20
-mean_age_dx = 57
-mean_menarche_age = 12.7819
-std_menarche_age = 1.5889
-mean_menopause_age = 49.2085
-std_menopause_age = 4.8551
-max_menopause_age = (60, 68)
-mean_pregnancies = 2.0103
-std_pregnancies = 1.5467
-abort_prob = {0: 0.7330, 1: 0.1858, 2: 0.0516, 3: 0.0214, 4: 0.0082}
-caesarean_prob = {0: 0.9128, 1: 0.0480, 2: 0.0310, 3: 0.0063, 4: 0.0019}
-
-tumor_type_prob = {'PP': 0.1107, 'PN': 0.7574, 'NP': 0.0437, 'NN': 0.0882}
-death_prob = {'PP': 0.0903, 'PN': 0.1234, 'NP': 0.1207, 'NN': 0.1679}
-mean_days_alive = {'PP': 2241, 'PN': 1959, 'NP': 2016, 'NN': 959}
-stage_dx_prob = {'0': 0.0846, 'IA': 0.3243, 'IB': 0.0432, 'IIA': 0.2260, 'IIB': 0.1179, 'IIIA': 0.0867, 'IIIB': 0.0151, 'IIIC': 0.0379, 'IV': 0.06423}
-grade_prob = {'1': 0.2, '2': 0.6, '3': 0.2}
-mean_ki67 = {'PP': 28.2891, 'PN': 16.6183, 'NP': 38.8101, 'NN': 50.2081}
-surgery_prob = {'mastectomy': 0.5, 'partial mastectomy': 0.5}
-stage_neo_prob = {  # Outer: stage at diagnosis, Inner: stage after neoadjuvant treatment
-    '0': {'0': 1.0},
-    'IA': {'0': 0.1, 'IA': 0.9},
-    'IB': {'0': 0.1, 'IA': 0.9},
-    'IIA': {'0': 0.0597, 'IA': 0.3134, 'IB': 0.0150, 'IIA': 0.3284, 'IIB': 0.0148, 'IIIA': 0.2388, 'IIIC': 0.0299},
-    'IIB': {'0': 0.1, 'IA': 0.5, 'IIA': 0.1, 'IIB': 0.1, 'IIIA': 0.17, 'IV': 0.03},
-    'IIIA': {'0': 0.0555, 'IA': 0.1055, 'IB': 0.1056, 'IIA': 0.1389, 'IIB': 0.1111, 'IIIA': 0.3756, 'IIIB': 0.0378, 'IV': 0.07},
-    'IIIB': {'0': 0.0556, 'IA': 0.1055, 'IB': 0.1055, 'IIA': 0.1389, 'IIB': 0.1011, 'IIIA': 0.3656, 'IIIB': 0.0378, 'IV': 0.09},
-    'IIIC': {'0': 0.0555, 'IA': 0.1056, 'IB': 0.1056, 'IIA': 0.1389, 'IIB': 0.1011, 'IIIA': 0.3655, 'IIIB': 0.0278, 'IV': 0.1},
-    'IV': {'IV': 1.0}
-}
-hist_type_prob = {'ductal': 0.6276, 'lobular': 0.0932, 'other': 0.2792}
-ass_in_situ_prob = {'0': 0.4885, '1': 0.5115}
-
-days_to_radio = (28, 42)
-radio_days_mean = 33.57
-radio_days_std = 19.76
-radio_days_range = (7, 60)
-radio_gy_mean = 46.07
-radio_gy_std = 8.35
-radio_gy_range = (4, 70)
-
-commorbidities_prob = {'autoimmune disease': 0.0366,
-                       'cardiac insufficiency': 0.0160,
-                       'diabetes': 0.0751,
-                       'dislipemia': 0.1600,
-                       'gastrointestinal disease': 0.0637,
-                       'hta': 0.2438,
-                       'insomnia': 0.0019,
-                       'ischemic cardiopathology': 0.0187,
-                       'liver disease': 0.0487,
-                       'lung disease': 0.0432,
-                       'musculoskeletal disease': 0.1203,
-                       'other cardiopathology': 0.0475,
-                       'psychiatric disorder': 0.0740,
-                       'renal disease': 0.0191,
-                       'smoker or ex-smoker': 0.3631,
-                       'thyroid disease': 0.1453,
-                       'transplant': 0.0012}
-id_commorbidity = 0
-
-smoker_or_ex_prob = {'ex-smoker': 0.5396, 'smoker': 0.4604}
-
-oral_drug_prob = {'tamoxifen': 0.8124,
-                  'letrozole': 0.4028,
-                  'anastrozole': 0.1532,
-                  'exemestane': 0.1170,
-                  'goserelin': 0.1071,
-                  'abemaciclib': 0.0090,
-                  'alpelisib': 0.0039,
-                  'capecitabine': 0.0826,
-                  'everolimus': 0.0159,
-                  'fulvestrant': 0.0727,
-                  'megestrol acetate': 0.0284,
-                  'olaparib': 0.0013,
-                  'palbociclib': 0.0429,
-                  'ribociclib': 0.0281,
-                  'vinorelbine': 0.0232}
-
-family_prob = {'C0678222': 0.1323,
-               'C0684249': 0.0262,
-               'C0699790': 0.0232,
-               'C0699791': 0.0202,
-               'C0600139': 0.0138,
-               'C0029925': 0.0114,
-               'C0023418': 0.0099,
-               'C0024299': 0.0099,
-               'C2239176': 0.0089,
-               'C0025202': 0.0084,
-               'C0235974': 0.0064,
-               'C0740339': 0.0059,
-               'C0699885': 0.0054,
-               'C0153567': 0.0044,
-               'C0476089': 0.0044,
-               'C1378703': 0.0044,
-               'C0549473': 0.0040,
-               'C0595989': 0.0025,
-               'C0007113': 0.0020,
-               'C0205699': 0.0020,
-               'C0699893': 0.0020,
-               'C0026764': 0.0010,
-               'C0346627': 0.0010,
-               'C0751177': 0.0010,
-               'C1261473': 0.0010,
-               'C0151546': 0.0005,
-               'C0153437': 0.0005,
-               'C0153601': 0.0005,
-               'C0279530': 0.0005,
-               'C0677483': 0.0005}
-
-
-def initialize_database(con: MySQLConnection, cur: MySQLCursor) -> None:
+
+from batch import n_comorbidities
+from distributions import (abort_dist, ass_in_situ_dist, ass_in_situ_prob, caesarean_dist, commorbidities_prob,
+                           death_prob, family_prob, grade_dist, grade_prob, hist_type_dist, hist_type_prob,
+                           max_cycles_adjuvant, max_menopause_age, mean_age_dx, mean_days_alive, mean_ki67,
+                           mean_menarche_age, mean_menopause_age, mean_pregnancies, n_category_iiib_dist,
+                           n_category_iv_dist, oral_drug_prob, profile_hash, radio_days_mean, radio_days_range,
+                           radio_days_std, radio_gy_mean, radio_gy_range, radio_gy_std, smoker_or_ex_dist, stage_dx_dist,
+                           stage_dx_prob, stage_neo_dist, std_menarche_age, std_menopause_age, std_pregnancies, surgery_dist,
+                           t0_n1_iia_prob, t1_ib_prob, t1_n1_iia_prob, t2_n1_iib_prob, t3_n1_iiia_prob,
+                           t_category_iiia_dist, t_category_iiic_dist, t_category_iv_dist, tumor_type_dist)
+from loader import BulkLoader
+from metrics import NO_METRICS, Metrics, process_seconds, profile
+from mutations import mutation_rates
+from output import (CHECKPOINT, MANIFEST, checkpoint_writers, open_writers, read_checkpoint, read_manifest,
+                    remove_checkpoint, write_checkpoint, write_chunks, write_manifest)
+from rdf import NTriplesSerializer, RDFWriter
+from records import generate_records, write_ndjson
+from shards import generate_batches, generate_chunks
+from strata import Cohort, Stratum
+from streams import patient_seed
+from tables import append_batch, clear_patients, read_structure
+from writers import COMPRESSIONS, ThreadedWriter, close_writers, open_compressed, open_text, truncate
+
+# the backends are imported when they are used, e.g., MySQL is not imported with --no-db and the SDM-RDFizer
+# (which imports pandas) only with --rdf-engine rdfizer or the scalar engine
+if typing.TYPE_CHECKING:
+    from mysql.connector.connection import MySQLConnection
+    from mysql.connector.cursor import MySQLCursor
+
+# options of a run that are stored in its checkpoints and restored by --resume, i.e., the ones the data depends on
+RESUMED_OPTIONS = ('n', 'p', 'mutation_rate', 'stratum', 'engine', 'batch_size', 'no_db', 'chunk_size', 'load_method', 'load_batch_size',
+                   'rdf_engine', 'sql_compression', 'csv_compression', 'compression_level', 'compression_threads', 'parquet',
+                   'parquet_row_group_size', 'parquet_partition_size', 'append', 'checkpoint_interval')
+
+
+def initialize_database(con: 'MySQLConnection', cur: 'MySQLCursor') -> None:
     """Creates all the tables in the database."""
     with open('table_structure.sql', 'r', encoding='utf8') as f:
         for _ in cur.execute(f.read(), multi=True):
@@ -139,14 +67,16 @@ def initialize_database(con: MySQLConnection, cur: MySQLCursor) -> None:
         con.commit()
 
 
-def extract_one(probs: dict):
-    r = np.random.rand()
-    accumulated = 0.0
-    for k in probs.keys():
-        accumulated += probs[k]
-        if r < accumulated:
-            return k
-    return list(probs.keys())[-1]
+def unique_rows(rows: list, key=None) -> list:
+    """Removes duplicate rows keeping the first occurrence; by default, whole rows are compared."""
+    seen = set()
+    unique = []
+    for row in rows:
+        k = row if key is None else key(row)
+        if k not in seen:
+            seen.add(k)
+            unique.append(row)
+    return unique
 
 
 def calculate_age(born: datetime.date, current: datetime.date) -> int:
@@ -159,38 +89,40 @@ def get_tnm(stage: str):
     elif stage == 'IA':
         return '1', '0', None, '0'
     elif stage == 'IB':
-        return ('1' if np.random.rand() < 0.78 else '0'), '1', 'MI', '0'
+        return ('1' if np.random.rand() < t1_ib_prob else '0'), '1', 'MI', '0'
     elif stage == 'IIA':
         r = np.random.rand()
-        if r < 0.3:
+        if r < t0_n1_iia_prob:
             return '0', '1', None, '0'
-        elif r < 0.55:
+        elif r < t0_n1_iia_prob + t1_n1_iia_prob:
             return '1', '1', None, '0'
         else:
             return '2', '0', None, '0'
     elif stage == 'IIB':
-        if np.random.rand() < 0.85:
+        if np.random.rand() < t2_n1_iib_prob:
             return '2', '1', None, '0'
         else:
             return '3', '0', None, '0'
     elif stage == 'IIIA':
-        if np.random.rand() < 0.2:
+        if np.random.rand() < t3_n1_iiia_prob:
             return '3', '1', None, '0'
         else:
-            return extract_one({'0': 0.5, '1': 0.1, '2': 0.3, '3': 0.1}), '2', None, '0'
+            return t_category_iiia_dist.draw(), '2', None, '0'
     elif stage == 'IIIB':
-        return '4', extract_one({'0': 0.1, '1': 0.4, '2': 0.5}), None, '0'
+        return '4', n_category_iiib_dist.draw(), None, '0'
     elif stage == 'IIIC':
-        return extract_one({'0': 0.45, '1': 0.1, '2': 0.25, '3': 0.15, '4': 0.05}), '3', None, '0'
+        return t_category_iiic_dist.draw(), '3', None, '0'
     else:
-        return extract_one({'0': 0.4, '1': 0.1, '2': 0.2, '3': 0.1, '4': 0.2}), extract_one({'0': 0.1, '1': 0.35, '2': 0.25, '3': 0.3}), None, '0'
+        return t_category_iv_dist.draw(), n_category_iv_dist.draw(), None, '0'
 
 
-def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
+def generate_data(ehr: int, cur: 'MySQLCursor', error_prob: float = 0.0, metrics=NO_METRICS):
+    stopwatch = metrics.stopwatch('generate_data.')
+
     # Dx Age and tumor type
     age_dx = int(np.random.normal(mean_age_dx, 10))
     age_dx = age_dx if age_dx >= 20 else 20
-    tumor_type = extract_one(tumor_type_prob)
+    tumor_type = tumor_type_dist.draw()
 
     # Death
     death = np.random.rand() < death_prob[tumor_type]
@@ -235,7 +167,7 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     if menopause_age > age_death or menopause_age > calculate_age(birth_date, datetime.date.today()):
         menopause_age = None
     if np.random.rand() < error_prob:
-        if pd.notna(menopause_age):
+        if menopause_age is not None:
             menopause_age = menopause_age + int(np.random.normal(25.0, 4.0) * np.random.choice([1, -1]))
         else:
             menopause_age = int(np.random.normal(120.0, 10.0))
@@ -246,9 +178,9 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     pregnancies = 0 if pregnancies < 0 else pregnancies
     births = aborts = caesareans = 0
     if pregnancies > 0:
-        aborts = extract_one(abort_prob)
+        aborts = abort_dist.draw()
         aborts = pregnancies if aborts > pregnancies else aborts
-        caesareans = extract_one(caesarean_prob)
+        caesareans = caesarean_dist.draw()
         caesareans = pregnancies - aborts if caesareans > (pregnancies-aborts) else caesareans
         births = pregnancies - aborts - caesareans
     if np.random.rand() < error_prob:
@@ -260,6 +192,8 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     if np.random.rand() < error_prob:
         caesareans = caesareans + int(np.random.normal(6.0, 2.0) * np.random.choice([1, -1]))
 
+    stopwatch.lap('demographics')
+
     # Immunohistochemistry (IHC)
     er = tumor_type[0] == 'P'
     pr = tumor_type[0] == 'P'
@@ -272,7 +206,7 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     ki67 = int(np.random.normal(mean_ki67[tumor_type], mean_ki67[tumor_type]/3))
     ki67 = ki67 if ki67 <= 100 else 100
     ki67 = ki67 if ki67 >= 0 else 0
-    grade = extract_one(grade_prob)
+    grade = grade_dist.draw()
     if tumor_type == 'PN':
         if np.random.rand() < 0.15 and int(grade) > 1:
             grade = str(int(grade)-1)
@@ -287,17 +221,19 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
         pr = not pr
     
     # Stage
-    stage_dx = extract_one(stage_dx_prob)
-    stage_neo = extract_one(stage_neo_prob[stage_dx])
+    stage_dx = stage_dx_dist.draw()
+    stage_neo = stage_neo_dist.draw(stage_dx)
     t, n, mi, m = get_tnm(stage_dx)
     t_neo, n_neo, mi_neo, m_neo = get_tnm(stage_neo)
     
     # Other tumor-related data (stage, histological type, etc.)
     neoadjuvant = ((stage_dx == 'IA' or stage_dx == 'IB') and (tumor_type != 'PN')) or stage_dx[:2] == 'II'
     invasive = stage_dx != '0'
-    hist_type = extract_one(hist_type_prob)
-    ass_in_situ = extract_one(ass_in_situ_prob)
+    hist_type = hist_type_dist.draw()
+    ass_in_situ = ass_in_situ_dist.draw()
         
+    stopwatch.lap('stage_tnm')
+
     # Neoadjuvant chemo
     ch_date = dx_date
     cycles = []
@@ -320,12 +256,14 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
             schema = np.random.choice([10, 20, 43, 51, 9, 11, 25, 59, 63])
         
         for i in range(n_ciclos):
-            cycles += [[ehr, schema, ch_date, i+1]]
+            cycles += [(ehr, int(schema), ch_date, i+1)]
             ch_date = ch_date + datetime.timedelta(days=21)
             if np.random.rand() < error_prob:
                 ch_date = ch_date + (datetime.timedelta(days=np.random.randint(10, 20)) * np.random.choice([1, -1]))
 
-    df_chemo = pd.DataFrame(cycles, columns=['ehr', 'id_schema', 'date', 'cycle_number'])
+    chemo = cycles
+
+    stopwatch.lap('chemo')
 
     # Surgery
     surgery_date = ch_date
@@ -336,19 +274,19 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
             surgery_date = surgery_date + datetime.timedelta(days=np.random.randint(21, 35))
             if np.random.rand() < error_prob:
                 surgery_date = surgery_date + (datetime.timedelta(days=np.random.randint(20, 35)) * np.random.choice([1, -1]))
-            surgery_type = extract_one(surgery_prob)
-            surgeries += [[ehr, surgery_type, 1, ch_date.year, ch_date.month, ch_date.day]]
+            surgery_type = surgery_dist.draw()
+            surgeries += [(ehr, surgery_type, 1, ch_date.year, ch_date.month, ch_date.day)]
             if np.random.rand() < 0.5:
-                surgeries += [[ehr, 'sentinel lymph node biopsy', 1, ch_date.year, ch_date.month, ch_date.day]]
+                surgeries += [(ehr, 'sentinel lymph node biopsy', 1, ch_date.year, ch_date.month, ch_date.day)]
             if stage_dx[:2] == 'II':
-                surgeries += [[ehr, 'lymphadenectomy', 1, ch_date.year, ch_date.month, ch_date.day]]
-    
-    df_surgeries = pd.DataFrame(surgeries, columns=['ehr', 'surgery', 'n_surgery', 'date_year', 'date_month', 'date_day'])
+                surgeries += [(ehr, 'lymphadenectomy', 1, ch_date.year, ch_date.month, ch_date.day)]
+
+    stopwatch.lap('surgery')
 
     # Adjuvant chemo
     ch_date = surgery_date
     cycles = []
-    n_prev_cycles = len(df_chemo)
+    n_prev_cycles = len(chemo)
     
     if stage_dx != '0':
         n_ciclos = np.random.randint(3, max_cycles_adjuvant)
@@ -371,30 +309,27 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
         if np.random.rand() < error_prob:
             schema = np.random.choice([10, 20, 43, 44, 50, 51, 9, 11, 25, 59, 63])
         for i in range(n_ciclos):
-            cycles += [[ehr, schema, ch_date, i + 1 + n_prev_cycles]]
+            cycles += [(ehr, int(schema), ch_date, i + 1 + n_prev_cycles)]
             ch_date = ch_date + datetime.timedelta(days=21)
             if np.random.rand() < error_prob:
                 ch_date = ch_date + (datetime.timedelta(days=np.random.randint(10, 20)) * np.random.choice([1, -1]))
     
-    df_chemo2 = pd.DataFrame(cycles, columns=['ehr', 'id_schema', 'date', 'cycle_number'])
-    df_chemo = pd.concat([df_chemo, df_chemo2])
-    df_chemo = df_chemo.drop_duplicates(subset=['ehr', 'id_schema', 'date'])
+    chemo = unique_rows(chemo + cycles, key=lambda cycle: cycle[:3])  # (ehr, id_schema, date) is the primary key
     
     first_chemo_date = None
-    if len(df_chemo) > 0:
-        first_chemo_date = df_chemo['date'].min()
+    if len(chemo) > 0:
+        first_chemo_date = min(cycle[2] for cycle in chemo)
         if np.random.rand() < error_prob:
             first_chemo_date = first_chemo_date + (datetime.timedelta(days=np.random.randint(50, 500)) * np.random.choice([1, -1]))
     
     first_surgery_date = None
-    if len(df_surgeries) > 0:
-        year = int(df_surgeries['date_year'].min())
-        month = int(df_surgeries[df_surgeries['date_year'] == year]['date_month'].min())
-        day = int(df_surgeries[(df_surgeries['date_year'] == year) & (df_surgeries['date_month'] == month)]['date_day'].min())
-        first_surgery_date = datetime.date(year, month, day)
+    if len(surgeries) > 0:
+        first_surgery_date = datetime.date(*min(surgery[3:] for surgery in surgeries))
         if np.random.rand() < error_prob:
             first_surgery_date = first_surgery_date + (datetime.timedelta(days=np.random.randint(50, 500)) * np.random.choice([1, -1]))
 
+    stopwatch.lap('chemo')
+
     # Radiotherapy
     radio_start_date = ch_date + datetime.timedelta(days=np.random.randint(radio_days_range[0], radio_days_range[1]))
     radio_days = int(np.random.normal(radio_days_mean, radio_days_std) + 0.5)
@@ -411,9 +346,11 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     if np.random.rand() < error_prob:
         radio_gy = radio_gy + float(np.random.randint(20, 50) * np.random.choice([1, -1]))
 
+    stopwatch.lap('radiotherapy')
+
     # Tumor prefix
-    prefix_dx = 'C' if len(df_surgeries) == 0 or neoadjuvant else 'P'
-    prefix_neo = 'C' if len(df_surgeries) == 0 else 'P'
+    prefix_dx = 'C' if len(surgeries) == 0 or neoadjuvant else 'P'
+    prefix_neo = 'C' if len(surgeries) == 0 else 'P'
 
     # Mutation relevant tumor info
     if error_prob > 0.0:
@@ -452,8 +389,10 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
         if np.random.rand() < error_prob:
             prefix_neo = np.random.choice(['C', 'P', 'P', 'P'])
 
+    stopwatch.lap('stage_tnm')
+
     # Commorbidities
-    global id_commorbidity
+    id_commorbidity = (ehr - 1) * n_comorbidities  # pre-assigned range of IDs, independent of other patients
     commorbidities = []
     for c in commorbidities_prob.keys():
         id_commorbidity += 1
@@ -461,75 +400,70 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
             present = 1 if np.random.rand() < commorbidities_prob[c] else 0
             if np.random.rand() < error_prob:
                 present = np.random.choice([0, 1])
-            commorbidities += [[id_commorbidity, ehr, c, present]]
+            commorbidities += [(id_commorbidity, ehr, c, int(present))]
         else:
             if np.random.rand() < commorbidities_prob[c]:
-                smoker_or_ex = extract_one(smoker_or_ex_prob)
+                smoker_or_ex = smoker_or_ex_dist.draw()
                 present = 1 if smoker_or_ex == 'smoker' else 0
                 if np.random.rand() < error_prob:
                     present = np.random.choice([0, 1])
-                commorbidities += [[id_commorbidity, ehr, 'smoker', present]]
+                commorbidities += [(id_commorbidity, ehr, 'smoker', int(present))]
                 id_commorbidity += 1
                 present = 1 if smoker_or_ex != 'smoker' else 0
                 if np.random.rand() < error_prob:
                     present = np.random.choice([0, 1])
-                commorbidities += [[id_commorbidity, ehr, 'ex-smoker', present]]
+                commorbidities += [(id_commorbidity, ehr, 'ex-smoker', int(present))]
             else:
                 present = 0
                 if np.random.rand() < error_prob:
                     present = np.random.choice([0, 1])
-                commorbidities += [[id_commorbidity, ehr, 'smoker', present]]
+                commorbidities += [(id_commorbidity, ehr, 'smoker', int(present))]
                 id_commorbidity += 1
                 present = 0
                 if np.random.rand() < error_prob:
                     present = np.random.choice([0, 1])
-                commorbidities += [[id_commorbidity, ehr, 'ex-smoker', present]]
-    df_commorbidities = pd.DataFrame(commorbidities, columns=['id', 'ehr', 'comorbidity', 'negated'])
+                commorbidities += [(id_commorbidity, ehr, 'ex-smoker', int(present))]
+
+    stopwatch.lap('comorbidities')
 
     # Oral drugs
     oral_drug = []
     if er or pr:
         for d in oral_drug_prob.keys():
             if np.random.rand() < oral_drug_prob[d]:
-                oral_drug += [[ehr, str(d)]]
-    df_oral_drug = pd.DataFrame(oral_drug, columns=['ehr', 'drug'])
-    if (len(df_oral_drug) == 2 and np.random.rand() < 0.5) or (len(df_oral_drug) > 2 and np.random.rand() < 0.2):
-        df_oral_drug = df_oral_drug.drop([np.random.randint(len(df_oral_drug))], axis=0)
+                oral_drug += [(ehr, str(d))]
+    if (len(oral_drug) == 2 and np.random.rand() < 0.5) or (len(oral_drug) > 2 and np.random.rand() < 0.2):
+        del oral_drug[np.random.randint(len(oral_drug))]
 
-    remove = []
+    kept = []
     add = []
-    for r in df_oral_drug.index:
-        if np.random.rand() < error_prob:
-            action = np.random.choice(['remove', 'add', 'mutate'])
-            if action == 'remove' or action == 'mutate':
-                remove += [r]
-            if action == 'add' or action == 'mutate':
-                add += [[ehr, str(np.random.choice(list(oral_drug_prob.keys())))]]
-    df_oral_drug.drop(remove, axis=0, inplace=True)
-    df_oral_drug.reset_index(drop=True, inplace=True)
-    df_add = pd.DataFrame(add, columns=['ehr', 'drug'])
-    df_oral_drug = pd.concat([df_oral_drug, df_add]).drop_duplicates()
+    for row in oral_drug:
+        action = np.random.choice(['remove', 'add', 'mutate']) if np.random.rand() < error_prob else None
+        if action != 'remove' and action != 'mutate':
+            kept += [row]
+        if action == 'add' or action == 'mutate':
+            add += [(ehr, str(np.random.choice(list(oral_drug_prob.keys()))))]
+    oral_drug = unique_rows(kept + add)
+
+    stopwatch.lap('oral_drugs')
 
     # Family history
     family = []
     for f in family_prob.keys():
         if np.random.rand() < family_prob[f]:
-            family += [[ehr, str(f)]]
-    df_family = pd.DataFrame(family, columns=['ehr', 'cancer_cui'])
+            family += [(ehr, str(f))]
 
-    remove = []
+    kept = []
     add = []
-    for r in df_family.index:
-        if np.random.rand() < error_prob:
-            action = np.random.choice(['remove', 'add', 'mutate'])
-            if action == 'remove' or action == 'mutate':
-                remove += [r]
-            if action == 'add' or action == 'mutate':
-                add += [[ehr, str(np.random.choice(list(family_prob.keys())))]]
-    df_family.drop(remove, axis=0, inplace=True)
-    df_family.reset_index(drop=True, inplace=True)
-    df_add = pd.DataFrame(add, columns=['ehr', 'cancer_cui'])
-    df_family = pd.concat([df_family, df_add]).drop_duplicates()
+    for row in family:
+        action = np.random.choice(['remove', 'add', 'mutate']) if np.random.rand() < error_prob else None
+        if action != 'remove' and action != 'mutate':
+            kept += [row]
+        if action == 'add' or action == 'mutate':
+            add += [(ehr, str(np.random.choice(list(family_prob.keys()))))]
+    family = unique_rows(kept + add)
+
+    stopwatch.lap('family_history')
 
     # Data insertion
     sql = 'INSERT INTO patient(ehr, birth_date, diagnosis_date, age_at_diagnosis, first_treatment_date, surgery_date, death_date, age_at_death, er_positive, pr_positive, her2_overall_positive, ki67_percent_max_simp, neoadjuvant, menarche_age, menopause_pre, menopause_age, pregnancy, abort, birth, caesarean) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);'
@@ -549,61 +483,112 @@ def generate_data(ehr: int, cur: MySQLCursor, error_prob: float = 0.0):
     cur.execute(sql, (ehr, 1, int(grade)))
 
     sql = 'INSERT INTO chemoterapy_cycle VALUES (%s, %s, %s, %s);'
-    cur.executemany(sql, df_chemo.values.tolist())
+    cur.executemany(sql, chemo)
 
     sql = 'INSERT INTO surgery VALUES (%s, %s, %s, %s, %s, %s);'
-    cur.executemany(sql, df_surgeries.values.tolist())
+    cur.executemany(sql, surgeries)
 
     sql = 'INSERT INTO radiotherapy VALUES (%s, %s, %s, %s, %s);'
     cur.execute(sql, (ehr, radio_start_date, radio_end_date, 1, radio_gy))
 
     sql = 'INSERT INTO comorbidity VALUES (%s, %s, %s, %s);'
-    cur.executemany(sql, df_commorbidities.values.tolist())
+    cur.executemany(sql, commorbidities)
 
     sql = 'INSERT INTO oral_drug VALUES (%s, %s);'
-    cur.executemany(sql, df_oral_drug.values.tolist())
+    cur.executemany(sql, oral_drug)
 
     sql = 'INSERT INTO family_history(ehr, cancer_cui) VALUES (%s, %s);'
-    cur.executemany(sql, df_family.values.tolist())
-
-
-def dump_csv(cur: MySQLCursor):
+    cur.executemany(sql, family)
+    stopwatch.lap('insert')
+
+
+def delete_patients(con: 'MySQLConnection', cur: 'MySQLCursor', since_ehr: int) -> None:
+    """Deletes the rows of the patients after `since_ehr`, e.g., the ones loaded after the last checkpoint of a run."""
+    for table in read_structure().values():
+        if not table.static:
+            cur.execute('DELETE FROM `' + table.name + '` WHERE ehr > %s', (since_ehr,))
+    con.commit()
+
+
+def read_last_patient(cur: 'MySQLCursor') -> tuple:
+    """Returns the largest EHR and comorbidity ID in the database; 0 if there are no patients."""
+    cur.execute('SELECT MAX(ehr) FROM patient')
+    max_ehr = cur.fetchone()[0]
+    cur.execute('SELECT MAX(id) FROM comorbidity')
+    max_comorbidity_id = cur.fetchone()[0]
+    return max_ehr or 0, max_comorbidity_id or 0
+
+
+def dump_sql(path: str, compression: str = 'gzip', level: int = None, threads: int = None, metrics=NO_METRICS,
+             since_ehr: int = None):
+    """Dumps the database; with `since_ehr`, only the rows of the patients after it are appended to the dump."""
+    command = ['mysqldump', '-uroot', '-ppaladin', 'synth']
+    if since_ehr is not None:
+        command = command[:-1] + ['--no-create-info', '--where=ehr > ' + str(since_ehr), 'synth']
+        command += [name for name, table in read_structure().items() if not table.static]
+    with metrics.phase('sql_dump'), \
+            subprocess.Popen(command, stdout=subprocess.PIPE) as dump, \
+            open_compressed(path, compression, level, threads, append=since_ehr is not None) as fp:
+        shutil.copyfileobj(dump.stdout, fp)
+    if dump.returncode != 0:
+        raise RuntimeError('mysqldump failed with exit code ' + str(dump.returncode))
+
+
+def dump_csv(cur: 'MySQLCursor', folder: str = '/data/csv/', fetch_size: int = 10000, compression: str = 'none',
+             level: int = None, threads: int = None, since_ehr: int = None):
+    """Dumps the tables as CSV files; with `since_ehr`, only the rows of the patients after it are appended to the files."""
     db_cur.execute('show tables;')
     result = db_cur.fetchall()
     tables = [res[0] for res in result]
+    if since_ehr is not None:
+        static = [name for name, table in read_structure().items() if table.static]
+        tables = [table for table in tables if table not in static]
 
-    os.makedirs('/data/csv/', exist_ok=True)
+    os.makedirs(folder, exist_ok=True)
 
     for table in tables:
-        cur.execute('SELECT * FROM ' + table)
-        result = cur.fetchall()
+        cur.execute('SELECT * FROM ' + table + ('' if since_ehr is None else ' WHERE ehr > ' + str(since_ehr)))
         column_names = [desc[0] for desc in cur.description]
-        with open('/data/csv/' + table + '.csv', 'w', encoding='utf8') as fp:
+        with open_text(os.path.join(folder, table + '.csv' + COMPRESSIONS[compression]), compression, level, threads,
+                       append=since_ehr is not None) as fp:
             csv_file = csv.writer(fp, lineterminator='\n')
-            csv_file.writerow(column_names)
-            csv_file.writerows(result)
-
-
-def open_db_connection(url: str, port: int, user: str, pwd: str, db_name: str) -> (MySQLConnection, MySQLCursor):
-    tries = 1
-    err = None
-    while tries < 10:
+            if since_ehr is None:
+                csv_file.writerow(column_names)
+            result = cur.fetchmany(fetch_size)
+            while result:  # stream the table instead of materializing all rows in memory
+                csv_file.writerows(result)
+                result = cur.fetchmany(fetch_size)
+
+
+def open_db_connection(url: str, port: int, user: str, pwd: str, db_name: str, allow_local_infile: bool = False,
+                       timeout: float = 60.0, delay: float = 0.05, max_delay: float = 2.0) -> ('MySQLConnection', 'MySQLCursor'):
+    """
+    Connects to the database as soon as it is ready. The server is probed with a TCP connection, which is much
+    cheaper than a failing MySQL handshake; the probes are repeated after `delay` seconds, doubling up to
+    `max_delay`, until the server accepts the connection or `timeout` seconds have passed.
+    """
+    import mysql.connector  # only needed with a database
+
+    deadline = time.monotonic() + timeout
+    while True:
         try:
+            socket.create_connection((url, port), timeout=max_delay).close()
             db_con = mysql.connector.connect(
                 host=url,
                 port=port,
                 user=user,
                 password=pwd,
-                database=db_name
+                database=db_name,
+                allow_local_infile=allow_local_infile
             )
             db_cur = db_con.cursor()
             return db_con, db_cur
-        except mysql.connector.errors.InterfaceError as e:
-            tries += 1
-            err = e
-            print('Could not connect to DB. Re-try in 5 seconds...')
-            time.sleep(5)
-    raise err
+        except (OSError, mysql.connector.errors.InterfaceError):
+            if time.monotonic() + delay > deadline:
+                raise
+            print('Database not ready. Re-try in', delay, 'seconds...')
+            time.sleep(delay)
+            delay = min(2 * delay, max_delay)
 
 
 if __name__ == '__main__':
@@ -612,58 +597,321 @@ if __name__ == '__main__':
                         help='Number of patients to model')
     parser.add_argument('-p', metavar='mutation_prob', type=float, required=True,
                         help='Mutation probability; in [0.0, 1.0]. Clean data will be generated with p=0.0.')
+    parser.add_argument('--mutation-rate', metavar='field=rate', action='append', default=[],
+                        help='Mutation probability of a single field, e.g., death_date=0.2; can be repeated; requires the batch engine')
+    parser.add_argument('--stratum', metavar=('count', 'variable=values'), nargs='+', action='append', default=[],
+                        help='Generate exactly count patients whose tumor_type, stage, death, and neoadjuvant are restricted to the '
+                             'given values, e.g., 500 stage=IIIA,IIIB,IIIC,IV death=yes; can be repeated; the strata take the first '
+                             'EHRs of the run in the given order, the other patients are not restricted; requires the batch engine')
+    parser.add_argument('--engine', choices=['batch', 'scalar'], default='batch',
+                        help='Generate blocks of patients at once (batch) or one patient after the other (scalar)')
+    parser.add_argument('--batch-size', metavar='batch_size', type=int, default=10000,
+                        help='Number of patients generated at once by the batch engine')
+    parser.add_argument('--no-db', action='store_true',
+                        help='Keep the data in memory and write the output files directly instead of using MySQL')
+    parser.add_argument('--chunk-size', metavar='chunk_size', type=int, default=10000,
+                        help='Maximum number of patients kept in memory before they are written to the output files; only used with --no-db')
+    parser.add_argument('--workers', metavar='workers', type=int, default=1,
+                        help='Number of processes generating shards of patients in parallel; requires the batch engine')
+    parser.add_argument('--seed', metavar='seed', type=int, default=None,
+                        help='Seed of the random number generators; the data of each patient is derived from the seed and its EHR')
+    parser.add_argument('--load-method', choices=['insert', 'infile'], default='insert',
+                        help='Load the rows into MySQL with multi-row INSERT statements or with LOAD DATA LOCAL INFILE')
+    parser.add_argument('--load-batch-size', metavar='load_batch_size', type=int, default=10000,
+                        help='Number of rows per table buffered before they are loaded into MySQL')
+    parser.add_argument('--rdf-engine', choices=['native', 'rdfizer'], default='native',
+                        help='Create the RDF with the built-in N-Triples serializer (native) or with the SDM-RDFizer (rdfizer); '
+                             'with a database, the scalar engine always uses the SDM-RDFizer')
+    parser.add_argument('--sql-compression', choices=list(COMPRESSIONS), default='gzip',
+                        help='Compression of the SQL dump; gzip-mt compresses blocks of the file with several threads')
+    parser.add_argument('--csv-compression', choices=list(COMPRESSIONS), default='none',
+                        help='Compression of the CSV files; gzip-mt compresses blocks of the files with several threads')
+    parser.add_argument('--compression-level', metavar='level', type=int, default=None,
+                        help='Compression level; default: 9 for gzip and 3 for zstd')
+    parser.add_argument('--compression-threads', metavar='threads', type=int, default=None,
+                        help='Number of threads used by gzip-mt and zstd; default: number of CPUs')
+    parser.add_argument('--writer-queue', metavar='chunks', type=int, default=2,
+                        help='Number of chunks queued per output format that is written in a background thread; 0 writes in the main thread')
+    parser.add_argument('--parquet', action='store_true',
+                        help='Additionally write the tables as Parquet files with typed columns; requires the batch engine')
+    parser.add_argument('--parquet-row-group-size', metavar='row_group_size', type=int, default=100000,
+                        help='Number of rows per row group of the Parquet files')
+    parser.add_argument('--parquet-partition-size', metavar='partition_size', type=int, default=None,
+                        help='Split the Parquet files of the patient tables into partitions of this number of EHRs')
+    parser.add_argument('-o', '--output', metavar='output_folder', default='/data',
+                        help='Folder in which the output files are stored')
+    parser.add_argument('--append', action='store_true',
+                        help='Append n new patients to the data set in the output folder instead of replacing it; '
+                             'the seed and output formats of the data set are kept; requires the batch engine')
+    parser.add_argument('--checkpoint-interval', metavar='patients', type=int, default=None,
+                        help='Write a checkpoint to the output folder whenever this number of patients is completed, rounded up to '
+                             'whole chunks (with a database, batches), so that an interrupted run can be continued with --resume')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the interrupted run in the output folder from its last checkpoint; the options of the run '
+                             'are taken from the checkpoint, -n and -p have to be the same')
+    parser.add_argument('--stream', action='store_true',
+                        help='Write the patients to stdout as JSON lines, one patient with all her rows per line, as soon as they are '
+                             'generated instead of writing the output files; requires the batch engine')
+    parser.add_argument('--report', metavar='report_file', default=None,
+                        help='JSON file to which the timings and throughput of the run are written; default: report.json in the output folder')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the generation of the data with cProfile and write the statistics to profile.pstats in the output folder')
     args = parser.parse_args()
+    checkpoint = None
+    if args.resume:
+        try:
+            checkpoint = read_checkpoint(args.output)
+        except FileNotFoundError:
+            parser.error('--resume requires an interrupted run; ' + CHECKPOINT + ' not found in ' + args.output)
+        if (args.n, args.p) != (checkpoint['options']['n'], checkpoint['options']['p']):
+            parser.error('the interrupted run has -n ' + str(checkpoint['options']['n']) + ' -p ' + str(checkpoint['options']['p']))
+        for option, value in checkpoint['options'].items():
+            setattr(args, option, value)
+    if args.checkpoint_interval is not None and args.checkpoint_interval < 1:
+        parser.error('--checkpoint-interval must be at least 1')
+    if args.stream and (args.checkpoint_interval is not None or args.resume):
+        parser.error('--stream does not write checkpoints')
+    if args.engine == 'scalar' and (args.no_db or args.workers > 1 or args.parquet or args.mutation_rate or args.append
+                                    or args.stream or args.stratum):
+        parser.error('--no-db, --workers, --parquet, --mutation-rate, --append, --stream, and --stratum require the batch engine')
+    if args.stream and args.append:
+        parser.error('--stream does not write a data set to append to')
+    if args.append and not args.no_db and args.rdf_engine == 'rdfizer':
+        parser.error('--append requires the native RDF engine if a database is used')
+    try:
+        mutation_rate = {field: float(rate) for field, rate in (item.split('=', 1) for item in args.mutation_rate)}
+        mutation_rates(args.p, mutation_rate)
+    except ValueError as e:
+        parser.error('invalid --mutation-rate: ' + str(e))
+    try:
+        strata = [Stratum.parse(arguments) for arguments in args.stratum]
+    except ValueError as e:
+        parser.error('invalid --stratum: ' + str(e))
+    if sum(stratum.count for stratum in strata) > args.n:
+        parser.error('the strata have more than -n patients')
+
+    # the EHRs and comorbidity IDs of appended patients continue the ones of the data set
+    manifest = {'patients': 0, 'max_comorbidity_id': 0, 'seed': args.seed, 'runs': []}
+    if checkpoint is not None:
+        manifest = checkpoint['manifest']  # the manifest of the data set before the interrupted run
+    elif args.append:
+        try:
+            manifest = read_manifest(args.output)
+        except FileNotFoundError:
+            parser.error('--append requires an existing data set; ' + MANIFEST + ' not found in ' + args.output)
+        if manifest['max_comorbidity_id'] != manifest['patients'] * n_comorbidities:
+            parser.error('the comorbidity IDs of the data set do not match the ones of this version')
+        for option in ('sql_compression', 'csv_compression', 'parquet', 'parquet_partition_size'):
+            setattr(args, option, manifest[option])
+    first_ehr = manifest['patients'] + 1
 
     n_patients = args.n
     error_prob_param = args.p
-
-    db_con, db_cur = open_db_connection('localhost', 3306, 'root', 'paladin', 'synth')
-    start = time.time()
-    initialize_database(db_con, db_cur)
-    print("Setting up the database:", time.time() - start)
-
-    start_gen = time.time()
-    for ehr in range(n_patients):
-        generate_data(ehr+1, db_cur, error_prob=error_prob_param)
-    print('Generating data:', time.time() - start_gen)
-
-    db_con.commit()
-
-    start_sql = time.time()
-    os.system('mysqldump -uroot -ppaladin synth | gzip > /data/synth_data.sql.gz')
-    print('Dumping database:', time.time() - start_sql)
-
-    start_csv = time.time()
-    dump_csv(db_cur)
-    print('Dumping CSV:', time.time() - start_csv)
-
-    rdfizer_config = {
-        "default": {
-            "main_directory": "."
-        },
-        "datasets": {
-            "number_of_datasets": 1,
-            "output_folder": "/data",
-            "all_in_one_file": "yes",
-            "remove_duplicate": "yes",
-            "name": "synth_data",
-            "enrichment": "yes",
-            "large_file": "no",
-            "ordered": "yes",
-            "dbType": "mysql"
-        },
-        "dataset1": {
-            "name": "synth_data",
-            "host": "localhost",
-            "port": 3306,
-            "user": "root",
-            "password": "paladin",
-            "db": "synth",
-            "mapping": "${default:main_directory}/mapping.ttl"
+    seed = args.seed if args.seed is not None else manifest['seed']
+    seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+    # the random values of a patient are derived from the seed and its EHR, i.e., the seed is the whole state of the
+    # random number generators and a resumed run continues with the patient after the last checkpoint
+    seed = checkpoint['seed'] if checkpoint is not None else seed
+    start_ehr = checkpoint['ehr'] + 1 if checkpoint is not None else first_ehr
+    cohort = Cohort(strata, first_ehr) if strata else None
+    print('Seed:', seed, file=sys.stderr if args.stream else sys.stdout)
+
+    # the records are written as they are generated; no database, output files, or report
+    if args.stream:
+        try:
+            write_ndjson(generate_records(n_patients, args.batch_size, error_prob_param, workers=args.workers, seed=seed,
+                                          rates=mutation_rate, cohort=cohort), sys.stdout)
+        except BrokenPipeError:  # the consumer, e.g., head, has read enough
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())  # no error when stdout is flushed at exit
+        sys.exit(0)
+    os.makedirs(args.output, exist_ok=True)
+    if checkpoint is None:
+        remove_checkpoint(args.output)  # of an earlier run that was not resumed
+    startup_seconds = process_seconds()
+    metrics = Metrics()
+    metrics.info.update({'n': n_patients, 'p': error_prob_param, 'seed': seed, 'engine': args.engine, 'no_db': args.no_db,
+                         'workers': args.workers, 'batch_size': args.batch_size, 'rdf_engine': args.rdf_engine,
+                         'parquet': args.parquet, 'mutation_rate': mutation_rate, 'strata': cohort.to_list() if cohort else None,
+                         'first_ehr': first_ehr,
+                         'profile_hash': profile_hash, 'startup_seconds': startup_seconds, 'resumed_after_ehr': start_ehr - 1
+                         if checkpoint is not None else None})
+    run_manifest = json.loads(json.dumps(manifest))  # the manifest before this run, kept in the checkpoints
+    manifest.update({'patients': first_ehr - 1 + n_patients, 'max_comorbidity_id': (first_ehr - 1 + n_patients) * n_comorbidities,
+                     'seed': manifest['seed'] if args.append else seed, 'sql_compression': args.sql_compression,
+                     'csv_compression': args.csv_compression, 'parquet': args.parquet,
+                     'parquet_partition_size': args.parquet_partition_size})
+    manifest['runs'].append({'first_ehr': first_ehr, 'n': n_patients, 'p': error_prob_param, 'mutation_rate': mutation_rate,
+                             'strata': cohort.to_list() if cohort else None,
+                             'seed': seed, 'engine': args.engine, 'no_db': args.no_db, 'profile_hash': profile_hash,
+                             'date': datetime.datetime.now().isoformat(timespec='seconds')})
+    if checkpoint is not None:
+        manifest['runs'][-1]['date'] = checkpoint['date']
+    report_path = args.report if args.report is not None else os.path.join(args.output, 'report.json')
+    profile_path = os.path.join(args.output, 'profile.pstats') if args.profile else None
+    checkpoints = args.checkpoint_interval is not None
+
+    def save_checkpoint(ehr: int, writer_states: dict, **state) -> None:
+        """Records that the patients up to `ehr` are written; the states of the writers are the ones after them."""
+        write_checkpoint(args.output, {'ehr': ehr, 'max_comorbidity_id': ehr * n_comorbidities, 'seed': seed,
+                                       'options': {option: getattr(args, option) for option in RESUMED_OPTIONS},
+                                       'manifest': run_manifest, 'date': manifest['runs'][-1]['date'],
+                                       'writers': writer_states, **state})
+
+    if args.no_db:
+        with metrics.phase('setup', 'Setting up the tables'):
+            tables = read_structure()
+            formats = ('sql', 'csv', 'rdf', 'parquet') if args.parquet else ('sql', 'csv', 'rdf')
+            writers = open_writers(tables, args.output, formats, args.sql_compression, args.csv_compression,
+                                   args.compression_level, args.compression_threads, args.parquet_row_group_size,
+                                   args.parquet_partition_size, args.writer_queue, args.append, checkpoints,
+                                   checkpoint['writers'] if checkpoint is not None else None)
+
+        # the checkpoints are taken after every `checkpoint_chunks` chunks, i.e., after the same patients in a resumed run
+        checkpoint_chunks = -(-args.checkpoint_interval // args.chunk_size) if checkpoints else 1
+
+        def chunk_checkpoint(i: int, writer_states: dict) -> None:
+            save_checkpoint(min(start_ehr - 1 + i * args.chunk_size, first_ehr - 1 + n_patients), writer_states)
+
+        # the patients are generated and written in chunks; memory usage does not depend on the number of patients
+        with metrics.phase('generate_and_write', 'Generating and writing data'), profile(profile_path):
+            chunks = generate_chunks(first_ehr + n_patients - start_ehr, args.chunk_size, min(args.batch_size, args.chunk_size),
+                                     error_prob_param, workers=args.workers, seed=seed, rdf_engine=args.rdf_engine,
+                                     formats=formats, rates=mutation_rate, first_ehr=start_ehr, cohort=cohort)
+            write_chunks(chunks, writers, metrics, chunk_checkpoint if checkpoints else None, checkpoint_chunks)
+        metrics.patients = first_ehr + n_patients - start_ehr
+        write_manifest(args.output, manifest)
+        remove_checkpoint(args.output)
+        metrics.write(report_path)
+        print("Finished generating the synthetic data. Total time:", metrics.report()['total_seconds'])
+        sys.exit(0)
+
+    with metrics.phase('connect', 'Connecting to the database'):
+        db_con, db_cur = open_db_connection('localhost', 3306, 'root', 'paladin', 'synth',
+                                            allow_local_infile=args.load_method == 'infile')
+    # the dump of an appending run extends the files of the data set; a resumed run dumps again from their old sizes
+    dump_files = [os.path.join(args.output, 'synth_data.sql' + COMPRESSIONS[args.sql_compression])] + \
+        [os.path.join(args.output, 'csv', name + '.csv' + COMPRESSIONS[args.csv_compression])
+         for name, table in read_structure().items() if not table.static]
+    with metrics.phase('setup', 'Setting up the database'):
+        if checkpoint is not None:
+            delete_patients(db_con, db_cur, checkpoint['ehr'])  # loaded after the checkpoint
+            if read_last_patient(db_cur) != (checkpoint['ehr'], checkpoint['max_comorbidity_id']):
+                raise RuntimeError('the patients in the database do not match the checkpoint in ' + args.output)
+            for path, size in checkpoint['dump_sizes'].items():
+                truncate(path, size)
+        elif not args.append:
+            initialize_database(db_con, db_cur)
+        elif read_last_patient(db_cur) != (manifest['patients'], manifest['max_comorbidity_id']):
+            raise RuntimeError('the patients in the database do not match the data set in ' + args.output)
+    dump_sizes = checkpoint['dump_sizes'] if checkpoint is not None else \
+        {path: os.path.getsize(path) for path in dump_files if args.append and os.path.exists(path)}
+
+    # the batches of the batch engine are transformed into RDF right away instead of querying the database afterwards
+    rdf_native = args.rdf_engine == 'native' and args.engine == 'batch'
+    buffer_batches = rdf_native or args.parquet
+    if buffer_batches:
+        tables = read_structure()
+    writers = {}
+    resume = checkpoint['writers'] if checkpoint is not None else {}
+    if rdf_native:
+        serializer = NTriplesSerializer()
+        writers['rdf'] = RDFWriter(args.output, 'synth_data', args.append, resume.get('rdf'))
+    if args.parquet:
+        from columnar import ParquetWriter, format_arrow  # pyarrow is only imported if Parquet files are written
+        writers['parquet'] = ParquetWriter(tables, os.path.join(args.output, 'parquet'), args.parquet_row_group_size,
+                                           args.parquet_partition_size, args.append, resume.get('parquet'))
+    if args.writer_queue > 0:
+        writers = {name: ThreadedWriter(writer, args.writer_queue) for name, writer in writers.items()}
+
+    with metrics.phase('generate_and_load', 'Generating data'), profile(profile_path), \
+            BulkLoader(db_con, read_structure(), args.load_batch_size, args.load_method, not args.append) as loader:
+        if args.engine == 'scalar':
+            for ehr in range(start_ehr, first_ehr + n_patients):
+                np.random.seed(patient_seed(seed, ehr))
+                generate_data(ehr, loader, error_prob=error_prob_param, metrics=metrics)
+                if checkpoints and (ehr - first_ehr + 1) % args.checkpoint_interval == 0:
+                    with metrics.phase('checkpoint'):
+                        loader.flush()  # commits the rows
+                        save_checkpoint(ehr, {}, dump_sizes=dump_sizes)
+        else:
+            batches = generate_batches(first_ehr + n_patients - start_ehr, args.batch_size, args.batch_size, error_prob_param,
+                                       workers=args.workers, seed=seed, rates=mutation_rate, first_ehr=start_ehr,
+                                       cohort=cohort)
+            checkpoint_batches = -(-args.checkpoint_interval // args.batch_size) if checkpoints else None
+            for i in itertools.count(1):
+                with metrics.phase('generate'):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                with metrics.phase('load'):
+                    loader.insert_batch(batch)
+                if buffer_batches:
+                    append_batch(tables, batch)
+                if rdf_native:
+                    with metrics.phase('rdf'):
+                        writers['rdf'].write(serializer.semantify(tables))
+                if args.parquet:
+                    with metrics.phase('parquet'):
+                        writers['parquet'].write(format_arrow(tables))
+                if buffer_batches:
+                    clear_patients(tables)
+                if checkpoints and i % checkpoint_batches == 0:
+                    with metrics.phase('checkpoint'):
+                        loader.flush()  # commits the rows
+                        save_checkpoint(int(batch['patient']['ehr'][-1]), checkpoint_writers(writers), dump_sizes=dump_sizes)
+        with metrics.phase('load'):
+            loader.flush()
+    with metrics.phase('write.close'):
+        close_writers(list(writers.values()))
+    if args.writer_queue > 0:
+        for name, writer in writers.items():
+            metrics.add_time('thread.' + name, writer.seconds)
+    metrics.patients = first_ehr + n_patients - start_ehr
+    metrics.add_rows(loader.row_counts)
+
+    # the SQL dump is compressed in a thread while the CSV files are dumped
+    compression = {'level': args.compression_level, 'threads': args.compression_threads,
+                   'since_ehr': first_ehr - 1 if args.append else None}
+    with metrics.phase('dump', 'Dumping database and CSV'), concurrent.futures.ThreadPoolExecutor(1) as executor:
+        sql_dump = executor.submit(dump_sql, os.path.join(args.output, 'synth_data.sql' + COMPRESSIONS[args.sql_compression]),
+                                   args.sql_compression, metrics=metrics, **compression)
+        with metrics.phase('csv_dump'):
+            dump_csv(db_cur, os.path.join(args.output, 'csv'), compression=args.csv_compression, **compression)
+        sql_dump.result()
+
+    if not rdf_native:
+        rdfizer_config = {
+            "default": {
+                "main_directory": "."
+            },
+            "datasets": {
+                "number_of_datasets": 1,
+                "output_folder": args.output,
+                "all_in_one_file": "yes",
+                "remove_duplicate": "yes",
+                "name": "synth_data",
+                "enrichment": "yes",
+                "large_file": "no",
+                "ordered": "yes",
+                "dbType": "mysql"
+            },
+            "dataset1": {
+                "name": "synth_data",
+                "host": "localhost",
+                "port": 3306,
+                "user": "root",
+                "password": "paladin",
+                "db": "synth",
+                "mapping": "${default:main_directory}/mapping.ttl"
+            }
         }
-    }
-    semantify(rdfizer_config)
+        with metrics.phase('rdf', 'Creating RDF'):
+            from rdfizer import semantify  # imports pandas; only needed by this engine
+            semantify(rdfizer_config)
 
     db_cur.close()
     db_con.close()
-    print("Finished generating the synthetic data. Total time:", time.time() - start)
+    write_manifest(args.output, manifest)
+    remove_checkpoint(args.output)
+    metrics.write(report_path)
+    print("Finished generating the synthetic data. Total time:", metrics.report()['total_seconds'])
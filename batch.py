@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Generator
+
+Generates the synthetic data of a whole block of patients at once. Instead of drawing dozens of scalars per patient,
+every value is drawn for all the patients of the block in one go and kept as NumPy column arrays. The values follow
+the same distributions as `generate_data` in SDG.py. Categorical values, e.g., stages, are kept as the codes of
+their values in the dimensions of `dimensions` and only decoded when they are written.
+"""
+import datetime
+
+import numpy as np
+
+from dimensions import (ASS_IN_SITU, COMORBIDITY, FAMILY_CUI, HIST_TYPE, M_CATEGORY, N_CATEGORY, N_SUBCATEGORY,
+                        NEOADJUVANT, ORAL_DRUG, PREFIX, STAGE, SURGERY, T_CATEGORY, TUMOR_TYPE)
+from distributions import (abort_dist, ass_in_situ_dist, caesarean_dist, commorbidities_prob, death_prob, family_prob,
+                           grade_dist, hist_type_dist, max_cycles_adjuvant, max_menopause_age, mean_age_dx,
+                           mean_days_alive, mean_ki67, mean_menarche_age, mean_menopause_age, mean_pregnancies,
+                           n_category_iiib_dist, n_category_iv_dist, oral_drug_prob, radio_days_mean, radio_days_range,
+                           radio_days_std, radio_gy_mean, radio_gy_range, radio_gy_std, smoker_or_ex_dist,
+                           stage_dx_dist, stage_neo_dist, std_menarche_age, std_menopause_age, std_pregnancies,
+                           surgery_dist, t0_n1_iia_prob, t1_ib_prob, t1_n1_iia_prob, t2_n1_iib_prob, t3_n1_iiia_prob,
+                           t_category_iiia_dist, t_category_iiic_dist, t_category_iv_dist, tumor_type_dist)
+from mutations import Mutator, mutation_rates
+from streams import PatientStreams
+
+n_comorbidities = len(COMORBIDITY)
+
+# codes of the values of the distributions, indexed by the index of the value in the distribution
+_TUMOR_TYPE = TUMOR_TYPE.encode(tumor_type_dist.keys)
+_STAGE_DX = STAGE.encode(stage_dx_dist.keys)
+_STAGE_NEO = STAGE.encode(stage_neo_dist.keys)  # one row per parent
+_STAGE_NEO_ROW = stage_neo_dist.parent_index(np.array(STAGE.values))  # row of each stage code in `_STAGE_NEO`
+_HIST_TYPE = HIST_TYPE.encode(hist_type_dist.keys)
+_ASS_IN_SITU = ASS_IN_SITU.encode(ass_in_situ_dist.keys)
+_SURGERY = SURGERY.encode(surgery_dist.keys)
+_LYMPH_NODE_SURGERY = SURGERY.encode(['sentinel lymph node biopsy', 'lymphadenectomy'])
+_T_CATEGORY_IIIA = T_CATEGORY.encode(t_category_iiia_dist.keys)
+_T_CATEGORY_IIIC = T_CATEGORY.encode(t_category_iiic_dist.keys)
+_T_CATEGORY_IV = T_CATEGORY.encode(t_category_iv_dist.keys)
+_N_CATEGORY_IIIB = N_CATEGORY.encode(n_category_iiib_dist.keys)
+_N_CATEGORY_IV = N_CATEGORY.encode(n_category_iv_dist.keys)
+
+# properties of the values, indexed by their codes
+_ER_POSITIVE = np.char.startswith(np.array(TUMOR_TYPE.values), 'P')
+_HER2_POSITIVE = np.char.endswith(np.array(TUMOR_TYPE.values), 'P')
+_STAGE_II_III = np.char.startswith(np.array(STAGE.values), 'II')
+
+
+def _choice(rng: np.random.Generator, options: list, size) -> np.ndarray:
+    """Vectorized version of `np.random.choice(options)` with uniform probabilities."""
+    return np.array(options)[rng.integers(0, len(options), size)]
+
+
+def _days(days) -> np.ndarray:
+    return np.asarray(days).astype('timedelta64[D]')
+
+
+def _ymd(dates: np.ndarray) -> tuple:
+    """Splits an array of dates into its years, months, and days."""
+    years = dates.astype('datetime64[Y]')
+    months = dates.astype('datetime64[M]')
+    return (years.astype(np.int64) + 1970,
+            (months - years.astype('datetime64[M]')).astype(np.int64) + 1,
+            (dates - months.astype('datetime64[D]')).astype(np.int64) + 1)
+
+
+def _from_ymd(years: np.ndarray, months: np.ndarray, days: np.ndarray) -> np.ndarray:
+    dates = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1).astype('timedelta64[M]')
+    return dates.astype('datetime64[D]') + _days(days - 1)
+
+
+def _age(born: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """Vectorized version of `calculate_age`."""
+    born_y, born_m, born_d = _ymd(born)
+    current_y, current_m, current_d = _ymd(current)
+    return current_y - born_y - ((current_m * 100 + current_d) < (born_m * 100 + born_d))
+
+
+def _nullable(values: np.ndarray, null: np.ndarray) -> np.ndarray:
+    """Returns `values` as an object array holding None wherever `null` is set."""
+    values = values.astype(object)
+    values[null] = None
+    return values
+
+
+def _nullable_code(codes: np.ndarray, null: np.ndarray) -> np.ndarray:
+    """Returns the codes of a categorical column with the code of NULL, i.e., -1, wherever `null` is set."""
+    return np.where(null, np.array(-1, dtype=codes.dtype), codes)
+
+
+def _tnm(rng: np.random.Generator, stage: np.ndarray) -> tuple:
+    """Vectorized version of `get_tnm`; the stages and the categories are given as codes."""
+    n = len(stage)
+    r, r_t, r_n = rng.random(n), rng.random(n), rng.random(n)
+    t = np.full(n, T_CATEGORY.code('0'), dtype=T_CATEGORY.dtype)
+    n_cat = np.full(n, N_CATEGORY.code('0'), dtype=N_CATEGORY.dtype)
+    mi = np.full(n, N_SUBCATEGORY.code('None'), dtype=N_SUBCATEGORY.dtype)
+    m = np.full(n, M_CATEGORY.code('0'), dtype=M_CATEGORY.dtype)
+    t_code = T_CATEGORY.code
+    n_code = N_CATEGORY.code
+
+    t[stage == STAGE.code('0')] = t_code('IS')
+    t[stage == STAGE.code('IA')] = t_code('1')
+
+    sel = stage == STAGE.code('IB')
+    t[sel] = np.where(r[sel] < t1_ib_prob, t_code('1'), t_code('0'))
+    n_cat[sel] = n_code('1')
+    mi[sel] = N_SUBCATEGORY.code('MI')
+
+    sel = stage == STAGE.code('IIA')
+    t[sel] = np.where(r[sel] < t0_n1_iia_prob, t_code('0'),
+                      np.where(r[sel] < t0_n1_iia_prob + t1_n1_iia_prob, t_code('1'), t_code('2')))
+    n_cat[sel] = np.where(r[sel] < t0_n1_iia_prob + t1_n1_iia_prob, n_code('1'), n_code('0'))
+
+    sel = stage == STAGE.code('IIB')
+    t[sel] = np.where(r[sel] < t2_n1_iib_prob, t_code('2'), t_code('3'))
+    n_cat[sel] = np.where(r[sel] < t2_n1_iib_prob, n_code('1'), n_code('0'))
+
+    sel = stage == STAGE.code('IIIA')
+    t[sel] = np.where(r[sel] < t3_n1_iiia_prob, t_code('3'), _T_CATEGORY_IIIA[t_category_iiia_dist.index(r_t[sel])])
+    n_cat[sel] = np.where(r[sel] < t3_n1_iiia_prob, n_code('1'), n_code('2'))
+
+    sel = stage == STAGE.code('IIIB')
+    t[sel] = t_code('4')
+    n_cat[sel] = _N_CATEGORY_IIIB[n_category_iiib_dist.index(r_n[sel])]
+
+    sel = stage == STAGE.code('IIIC')
+    t[sel] = _T_CATEGORY_IIIC[t_category_iiic_dist.index(r_t[sel])]
+    n_cat[sel] = n_code('3')
+
+    sel = ~np.isin(stage, STAGE.encode(['0', 'IA', 'IB', 'IIA', 'IIB', 'IIIA', 'IIIB', 'IIIC']))
+    t[sel] = _T_CATEGORY_IV[t_category_iv_dist.index(r_t[sel])]
+    n_cat[sel] = _N_CATEGORY_IV[n_category_iv_dist.index(r_n[sel])]
+    return t, n_cat, mi, m
+
+
+def _chemo_schema(rng: np.random.Generator, tumor_type: np.ndarray, stage: np.ndarray, adjuvant: bool) -> np.ndarray:
+    n = len(stage)
+    schema = _choice(rng, [10, 27, 20, 36, 43, 44, 51, 52, 53], n)
+    if adjuvant:
+        schema = np.where(stage == STAGE.code('IV'), 50, schema)
+    schema = np.where((stage == STAGE.code('IA')) | (stage == STAGE.code('IB')), _choice(rng, [10, 27], n), schema)
+    return np.where(~_HER2_POSITIVE[tumor_type], 21, schema)
+
+
+def _chemo_cycles(mutator: Mutator, start: np.ndarray, n_cycles: np.ndarray) -> tuple:
+    """
+    Computes the dates of the chemotherapy cycles. Cycles are 21 days apart, with mutations shifting the date of all
+    following cycles. Returns the matrix of cycle dates (one row per patient) and the date after the last cycle.
+    """
+    width = max(int(n_cycles.max(initial=0)), 1)
+    steps = mutator.apply('chemotherapy_cycle_date', np.full((len(start), width), 21))
+    steps[np.arange(width) >= n_cycles[:, None]] = 0
+    offsets = np.cumsum(steps, axis=1)
+    dates = start[:, None] + _days(offsets - steps)
+    return dates, start + _days(offsets[:, -1])
+
+
+def _ragged(ehr: np.ndarray, valid: np.ndarray, **columns) -> dict:
+    """
+    Flattens matrices of patients x slots into the rows of a 1:N table, i.e., the values of the valid slots of
+    all patients in one array. The rows of a patient are consecutive and ordered by slot; the number of rows of
+    each patient gives the offsets of its rows, and the ehr column repeats the EHR of each patient accordingly.
+    """
+    rows = {'ehr': np.repeat(ehr, valid.sum(axis=1))}
+    rows.update({name: np.broadcast_to(values, valid.shape)[valid] for name, values in columns.items()})
+    return rows
+
+
+def _cycle_rows(ehr: np.ndarray, schemas: tuple, dates: tuple, n_cycles: tuple) -> dict:
+    """
+    Rows of the chemotherapy cycles of the patients; per patient, the cycles of the neoadjuvant chemo come before
+    the ones of the adjuvant chemo, which continue its cycle numbers. `schemas`, `dates`, and `n_cycles` hold the
+    values of both chemos. Cycles repeating an earlier (ehr, id_schema, date) of the same patient are dropped.
+    """
+    valid = np.concatenate([np.arange(d.shape[1]) < k[:, None] for d, k in zip(dates, n_cycles)], axis=1)
+    numbers = np.concatenate([np.broadcast_to(np.arange(1, dates[0].shape[1] + 1), dates[0].shape),
+                              np.arange(1, dates[1].shape[1] + 1) + n_cycles[0][:, None]], axis=1)
+    columns = _ragged(ehr, valid,
+                      id_schema=np.concatenate([np.broadcast_to(s[:, None], d.shape) for s, d in zip(schemas, dates)], axis=1),
+                      date=np.concatenate(dates, axis=1),
+                      cycle_number=numbers)
+    key = np.stack([columns['ehr'], columns['id_schema'], columns['date'].astype(np.int64)], axis=1)
+    first = np.sort(np.unique(key, axis=0, return_index=True)[1])
+    return {name: values[first] for name, values in columns.items()}
+
+
+def _list_rows(ehr: np.ndarray, present: np.ndarray, dimension, actions: np.ndarray, added) -> dict:
+    """
+    Rows of a 1:N list given by the matrix of patients x values of `dimension` `present`, with the edits drawn by
+    `ListEdit`. The k-th element of the list of a patient is kept if its action is -1 (no mutation) or 1 (add), and
+    the k-th added value is appended if the action is 1 or 2 (mutate). Values repeated within a list are dropped.
+    """
+    position = np.cumsum(present, axis=1) - 1
+    action = np.take_along_axis(actions, np.maximum(position, 0), axis=1)
+    valid = present & ((action < 0) | (action == 1))
+    codes = np.broadcast_to(np.arange(len(dimension), dtype=dimension.dtype), present.shape)
+    if added is not None:
+        valid = np.concatenate([valid, (np.arange(present.shape[1]) < present.sum(axis=1)[:, None]) & (actions >= 1)],
+                               axis=1)
+        codes = np.concatenate([codes, added], axis=1)
+    rows = _ragged(ehr, valid, code=codes)
+    if added is not None:
+        first = np.sort(np.unique(rows['ehr'] * len(dimension) + rows['code'], return_index=True)[1])
+        rows = {name: values[first] for name, values in rows.items()}
+    return {'ehr': rows['ehr'], 'value': rows['code']}
+
+
+def generate_batch(ehr_start: int, n_patients: int, error_prob: float = 0.0, rng=None, seed: int = None,
+                   rates: dict = None, cohort=None) -> dict:
+    """
+    Generates the data of the patients `ehr_start`, ..., `ehr_start + n_patients - 1`.
+
+    The random values are drawn from `rng` if given. Otherwise, each patient gets its own stream derived
+    from (seed, ehr), so that the data of a patient does not depend on the batch it is generated in.
+    The mutation probability `error_prob` applies to all the fields in `mutations.FIELDS` except for the
+    ones whose rate is given in `rates`.
+    With a `strata.Cohort`, the tumor type, the stage, and the death of the patients of its strata are drawn from
+    the distribution conditioned on their stratum, from the same random numbers.
+    The result maps each table name to its columns, i.e., a dictionary from column name to NumPy array.
+    Nullable columns are object arrays holding None; nullable dates are NaT.
+    """
+    n = n_patients
+    ehr = np.arange(ehr_start, ehr_start + n)
+    rng = PatientStreams(seed, ehr) if rng is None else rng
+    mutator = Mutator(rng, mutation_rates(error_prob, rates))
+    today = np.datetime64(datetime.date.today(), 'D')
+
+    # Dx Age and tumor type
+    age_dx = np.maximum(rng.normal(mean_age_dx, 10, n).astype(np.int64), 20)
+    r_tumor_type = rng.random(n)
+    tt = tumor_type_dist.index(r_tumor_type)
+    if cohort is not None:
+        tt, cohort_stage, cohort_death = cohort.sample(ehr, r_tumor_type, tt)
+    tumor_type = _TUMOR_TYPE[tt]
+
+    # Death
+    death = rng.random(n) < np.array(list(death_prob.values()))[tt]
+    if cohort is not None:
+        death = np.where(cohort_death < 0, death, cohort_death == 1)
+    death = mutator.apply('death', death)
+    days_alive_mean = np.array(list(mean_days_alive.values()))[tt]
+    days_alive = np.maximum(rng.normal(days_alive_mean, days_alive_mean / 7).astype(np.int64), 200)
+    days_alive = mutator.apply('days_alive', days_alive)
+
+    # Birthdate
+    days_since_dx = np.maximum(rng.integers(10, 500, n) + rng.normal(1800, 100, n).astype(np.int64), 200)
+    days_since_dx = np.where(death, days_since_dx + days_alive, days_since_dx)
+    days_since_birth = days_since_dx + age_dx * 365 + rng.integers(0, 365, n)
+    birth_date = today - _days(days_since_birth)
+    birth_y, birth_m, birth_d = _ymd(birth_date)
+    leap_day = (birth_m == 2) & (birth_d > 28)
+    birth_date = np.where(leap_day, birth_date - _days(5), birth_date)
+    birth_y, birth_m, birth_d = _ymd(birth_date)
+    dx_date = _from_ymd(birth_y + age_dx, birth_m, birth_d) + _days(rng.integers(0, 365, n))
+    dx_date = mutator.apply('diagnosis_date', dx_date)
+
+    # Death date and age
+    death_date = dx_date + _days(days_alive)
+    age_death = _age(birth_date, death_date)
+    death_date = mutator.apply('death_date', death_date)
+
+    # Gynaecological antecedents
+    menarche_age = (rng.normal(mean_menarche_age, std_menarche_age, n) + 0.5).astype(np.int64)
+    menarche_age = mutator.apply('menarche_age', menarche_age)
+    menopause_age = (rng.normal(mean_menopause_age, std_menopause_age, n) + 0.5).astype(np.int64)
+    early = (menopause_age >= max_menopause_age[0]) & (rng.random(n) < 0.6)
+    late = ~early & (menopause_age >= max_menopause_age[1])
+    menopause_age = np.where(early, menopause_age - 30, np.where(late, menopause_age - 8, menopause_age))
+    menopause_pre = menopause_age < age_dx
+    no_menopause = (menopause_age > age_death) | (menopause_age > _age(birth_date, np.full(n, today)))
+    menopause_age, mutated = mutator.apply_masked('menopause_age', menopause_age, no_menopause=no_menopause)
+    no_menopause &= ~mutated
+    menopause_pre = mutator.apply('menopause_pre', menopause_pre)
+
+    pregnancies = np.maximum((rng.normal(mean_pregnancies, std_pregnancies, n) + 0.5).astype(np.int64), 0)
+    aborts = np.minimum(abort_dist.sample(rng.random(n)), pregnancies)
+    caesareans = caesarean_dist.sample(rng.random(n))
+    caesareans = np.minimum(caesareans, pregnancies - aborts)
+    births = pregnancies - aborts - caesareans
+    pregnancies = mutator.apply('pregnancy', pregnancies)
+    births = mutator.apply('birth', births)
+    aborts = mutator.apply('abort', aborts)
+    caesareans = mutator.apply('caesarean', caesareans)
+
+    # Immunohistochemistry (IHC)
+    er = _ER_POSITIVE[tumor_type]
+    pr = er.copy()
+    lost = er & pr & (rng.random(n) < 0.25)
+    er_lost = rng.random(n) < 0.5
+    er &= ~(lost & er_lost)
+    pr &= ~(lost & ~er_lost)
+    her2 = _HER2_POSITIVE[tumor_type]
+    ki67_mean = np.array(list(mean_ki67.values()))[tt]
+    ki67 = np.clip(rng.normal(ki67_mean, ki67_mean / 3).astype(np.int64), 0, 100)
+    grade = grade_dist.sample(rng.random(n)).astype(np.int64)
+    shifted = rng.random(n) < 0.15
+    grade = np.where((tumor_type == TUMOR_TYPE.code('PN')) & shifted & (grade > 1), grade - 1, grade)
+    grade = np.where((tumor_type == TUMOR_TYPE.code('NN')) & shifted & (grade < 3), grade + 1, grade)
+    ki67 = mutator.apply('ki67_percent_max_simp', ki67)
+    er = mutator.apply('er_positive', er)
+    pr = mutator.apply('pr_positive', pr)
+
+    # Stage
+    stage = stage_dx_dist.index(rng.random(n))
+    if cohort is not None:
+        stage = np.where(cohort_stage < 0, stage, cohort_stage)
+    stage_dx = _STAGE_DX[stage]
+    neo_row = _STAGE_NEO_ROW[stage_dx]
+    stage_neo = _STAGE_NEO[neo_row, stage_neo_dist.index(neo_row, rng.random(n))]
+    t, n_cat, mi, m = _tnm(rng, stage_dx)
+    t_neo, n_cat_neo, mi_neo, m_neo = _tnm(rng, stage_neo)
+
+    # Other tumor-related data (stage, histological type, etc.)
+    early_stage = (stage_dx == STAGE.code('IA')) | (stage_dx == STAGE.code('IB'))
+    neoadjuvant = (early_stage & (tumor_type != TUMOR_TYPE.code('PN'))) | _STAGE_II_III[stage_dx]
+    invasive = stage_dx != STAGE.code('0')
+    hist_type = _HIST_TYPE[hist_type_dist.index(rng.random(n))]
+    ass_in_situ = _ASS_IN_SITU[ass_in_situ_dist.index(rng.random(n))]
+
+    # Neoadjuvant chemo
+    n_neo_cycles = np.where(neoadjuvant, rng.integers(3, 6, n), 0)
+    neo_start = dx_date + _days(np.where(neoadjuvant, rng.integers(20, 32, n), 0))
+    n_neo_cycles = mutator.apply('neoadjuvant_cycles', n_neo_cycles, neoadjuvant=neoadjuvant)
+    neo_start = mutator.apply('neoadjuvant_start', neo_start, neoadjuvant=neoadjuvant)
+    neo_schema = _chemo_schema(rng, tumor_type, stage_dx, adjuvant=False)
+    neo_schema = mutator.apply('neoadjuvant_schema', neo_schema)
+    neo_dates, neo_end = _chemo_cycles(mutator, neo_start, n_neo_cycles)
+    neo_end = np.where(neoadjuvant, neo_end, dx_date)
+
+    # Surgery
+    surgery_rate = mutator.rates['surgery']
+    surgery = (stage_dx != STAGE.code('IV')) | (rng.random(n) < surgery_rate)
+    surgery &= (rng.random(n) < 0.8) | (rng.random(n) >= surgery_rate)
+    surgery_date = neo_end + _days(np.where(surgery, rng.integers(21, 35, n), 0))
+    surgery_date = mutator.apply('surgery_date', surgery_date, surgery=surgery)
+    surgery_type = _SURGERY[surgery_dist.index(rng.random(n))]
+    sentinel_biopsy = rng.random(n) < 0.5
+    lymphadenectomy = _STAGE_II_III[stage_dx]
+
+    # Adjuvant chemo
+    adjuvant = stage_dx != STAGE.code('0')
+    n_adj_cycles = np.where(adjuvant, rng.integers(3, max_cycles_adjuvant, n), 0)
+    adj_start = surgery_date + _days(np.where(adjuvant, rng.integers(28, 38, n), 0))
+    n_adj_cycles = mutator.apply('adjuvant_cycles', n_adj_cycles, adjuvant=adjuvant)
+    adj_start = mutator.apply('adjuvant_start', adj_start, adjuvant=adjuvant)
+    adj_schema = _chemo_schema(rng, tumor_type, stage_dx, adjuvant=True)
+    adj_schema = mutator.apply('adjuvant_schema', adj_schema)
+    adj_dates, adj_end = _chemo_cycles(mutator, adj_start, n_adj_cycles)
+    ch_date = np.where(adjuvant, adj_end, surgery_date)
+
+    # Cycles are at least two days apart, hence, the first cycle is the earliest of each chemo
+    first_chemo_date = np.where(n_neo_cycles > 0, neo_start, np.datetime64('NaT'))
+    adj_first = (n_adj_cycles > 0) & ~(first_chemo_date <= adj_start)
+    first_chemo_date = np.where(adj_first, adj_start, first_chemo_date)
+    first_chemo_date = mutator.apply('first_treatment_date', first_chemo_date)
+    # All surgeries are recorded with the date on which the neoadjuvant chemo ended
+    first_surgery_date = np.where(surgery, neo_end, np.datetime64('NaT'))
+    first_surgery_date = mutator.apply('first_surgery_date', first_surgery_date)
+
+    # Radiotherapy
+    radio_start_date = ch_date + _days(rng.integers(radio_days_range[0], radio_days_range[1], n))
+    radio_days = (rng.normal(radio_days_mean, radio_days_std, n) + 0.5).astype(np.int64)
+    radio_days = np.clip(radio_days, radio_days_range[0], radio_days_range[1])
+    radio_end_date = radio_start_date + _days(radio_days)
+    radio_gy = rng.normal(radio_gy_mean, radio_gy_std, n) + 0.5
+    radio_gy = np.where(radio_gy >= radio_gy_range[0], radio_gy, radio_days_range[0])
+    radio_gy = np.where(radio_gy <= radio_gy_range[1], radio_gy, radio_days_range[1])
+    radio_start_date = mutator.apply('radiotherapy_start', radio_start_date)
+    radio_end_date = mutator.apply('radiotherapy_end', radio_end_date)
+    radio_gy = mutator.apply('dose_gy', radio_gy)
+
+    # Tumor prefix
+    prefix_dx = np.where(~surgery | neoadjuvant, PREFIX.code('C'), PREFIX.code('P')).astype(PREFIX.dtype)
+    prefix_neo = np.where(~surgery, PREFIX.code('C'), PREFIX.code('P')).astype(PREFIX.dtype)
+
+    # Mutation relevant tumor info
+    stage_dx = mutator.apply('stage_diagnosis', stage_dx)
+    stage_neo = mutator.apply('stage_after_neo', stage_neo)
+    neoadjuvant = mutator.apply('neoadjuvant', neoadjuvant)
+    t = mutator.apply('t_category', t)
+    n_cat = mutator.apply('n_category', n_cat)
+    mi = mutator.apply('n_subcategory', mi)
+    m = mutator.apply('m_category', m)
+    t_neo = mutator.apply('t_category_after_neoadj', t_neo)
+    n_cat_neo = mutator.apply('n_category_after_neoadj', n_cat_neo)
+    mi_neo = mutator.apply('n_subcategory_after_neoadj', mi_neo)
+    m_neo = mutator.apply('m_category_after_neoadj', m_neo)
+    invasive = mutator.apply('invasive', invasive)
+    hist_type = mutator.apply('hist_type', hist_type)
+    ass_in_situ = mutator.apply('associated_in_situ', ass_in_situ)
+    grade = mutator.apply('grade', grade)
+    prefix_dx = mutator.apply('t_prefix', prefix_dx)
+    prefix_neo = mutator.apply('t_prefix_after_neoadj', prefix_neo)
+
+    # Commorbidities
+    probs = np.array([commorbidities_prob[c] for c in COMORBIDITY.values if c not in ('smoker', 'ex-smoker')])
+    present = rng.random((n, len(probs))) < probs
+    smoker_or_ex = rng.random(n) < commorbidities_prob['smoker or ex-smoker']
+    smoker = smoker_or_ex_dist.index(rng.random(n)) == smoker_or_ex_dist.values.index('smoker')
+    smoker_idx = COMORBIDITY.code('smoker')
+    present = np.concatenate([present[:, :smoker_idx],
+                              (smoker_or_ex & smoker)[:, None],
+                              (smoker_or_ex & ~smoker)[:, None],
+                              present[:, smoker_idx:]], axis=1).astype(np.int64)
+    present = mutator.apply('comorbidity', present)
+
+    # Oral drugs
+    takes = (er | pr)[:, None] & (rng.random((n, len(ORAL_DRUG))) < np.array(list(oral_drug_prob.values())))
+    n_drugs = takes.sum(axis=1)
+    drop = ((n_drugs == 2) & (rng.random(n) < 0.5)) | ((n_drugs > 2) & (rng.random(n) < 0.2))
+    dropped = (rng.random(n) * n_drugs).astype(np.int64)
+    drug_actions, drug_added = mutator.edit_list('oral_drug', takes.shape)
+
+    # Family history
+    family = rng.random((n, len(FAMILY_CUI))) < np.array(list(family_prob.values()))
+    family_actions, family_added = mutator.edit_list('family_history', family.shape)
+
+    # 1:N tables
+    cycles = _cycle_rows(ehr, (neo_schema, adj_schema), (neo_dates, adj_dates), (n_neo_cycles, n_adj_cycles))
+    surgeries = _ragged(ehr, surgery[:, None] & np.stack([np.ones(n, dtype=bool), sentinel_biopsy, lymphadenectomy], axis=1),
+                        surgery=np.concatenate([surgery_type[:, None], np.broadcast_to(_LYMPH_NODE_SURGERY, (n, 2))], axis=1))
+    surgery_ymd = _ymd(neo_end[surgeries['ehr'] - ehr_start])
+    takes &= ~(drop[:, None] & (np.cumsum(takes, axis=1) - 1 == dropped[:, None]))
+    oral_drug = _list_rows(ehr, takes, ORAL_DRUG, drug_actions, drug_added)
+    family_history = _list_rows(ehr, family, FAMILY_CUI, family_actions, family_added)
+
+    no_neo = ~neoadjuvant
+    return {
+        'patient': {
+            'ehr': ehr,
+            'birth_date': birth_date,
+            'diagnosis_date': dx_date,
+            'age_at_diagnosis': age_dx,
+            'first_treatment_date': first_chemo_date,
+            'surgery_date': first_surgery_date,
+            'death_date': np.where(death, death_date, np.datetime64('NaT')),
+            'age_at_death': _nullable(age_death, ~death),
+            'er_positive': er.astype(np.int64),
+            'pr_positive': pr.astype(np.int64),
+            'her2_overall_positive': her2.astype(np.int64),
+            'ki67_percent_max_simp': ki67,
+            'neoadjuvant': neoadjuvant.astype(NEOADJUVANT.dtype),
+            'menarche_age': menarche_age,
+            'menopause_pre': menopause_pre,
+            'menopause_age': _nullable(menopause_age, no_menopause),
+            'pregnancy': pregnancies,
+            'abort': aborts,
+            'birth': births,
+            'caesarean': caesareans
+        },
+        'tumor_tnm': {
+            'ehr': ehr,
+            'n_tumor_tnm': np.ones(n, dtype=np.int64),
+            't_prefix_y': np.zeros(n, dtype=np.int64),
+            't_prefix': prefix_dx,
+            't_category': t,
+            'n_prefix_y': np.zeros(n, dtype=np.int64),
+            'n_prefix': prefix_dx,
+            'n_category': n_cat,
+            'n_subcategory': mi,
+            'm_category': m,
+            't_prefix_y_after_neoadj': _nullable(np.ones(n, dtype=np.int64), no_neo),
+            't_prefix_after_neoadj': _nullable_code(prefix_neo, no_neo),
+            't_category_after_neoadj': _nullable_code(t_neo, no_neo),
+            'n_prefix_y_after_neoadj': _nullable(np.ones(n, dtype=np.int64), no_neo),
+            'n_prefix_after_neoadj': _nullable_code(prefix_neo, no_neo),
+            'n_category_after_neoadj': _nullable_code(n_cat_neo, no_neo),
+            'n_subcategory_after_neoadj': _nullable_code(mi_neo, no_neo),
+            'm_category_after_neoadj': _nullable_code(m_neo, no_neo),
+            'n_tumor_type': np.ones(n, dtype=np.int64),
+            'n_tumor_grade': np.ones(n, dtype=np.int64),
+            'stage_diagnosis': stage_dx,
+            'stage_after_neo': _nullable_code(stage_neo, no_neo)
+        },
+        'tumor_type': {
+            'ehr': ehr,
+            'n_tumor_type': np.ones(n, dtype=np.int64),
+            'ductal': _nullable(np.ones(n, dtype=np.int64), hist_type != HIST_TYPE.code('ductal')),
+            'lobular': _nullable(np.ones(n, dtype=np.int64), hist_type != HIST_TYPE.code('lobular')),
+            'in_situ': _nullable(np.ones(n, dtype=np.int64), invasive),
+            'invasive': _nullable(np.ones(n, dtype=np.int64), ~invasive),
+            'associated_in_situ': _nullable(np.ones(n, dtype=np.int64), ass_in_situ != ASS_IN_SITU.code('1'))
+        },
+        'tumor_grade': {
+            'ehr': ehr,
+            'n_tumor_grade': np.ones(n, dtype=np.int64),
+            'grade': grade
+        },
+        'chemoterapy_cycle': cycles,
+        'surgery': {
+            'ehr': surgeries['ehr'],
+            'surgery': surgeries['surgery'],
+            'n_surgery': np.ones(len(surgeries['ehr']), dtype=np.int64),
+            'date_year': surgery_ymd[0],
+            'date_month': surgery_ymd[1],
+            'date_day': surgery_ymd[2]
+        },
+        'radiotherapy': {
+            'ehr': ehr,
+            'date_start': radio_start_date,
+            'date_end': radio_end_date,
+            'n_radiotherapy': np.ones(n, dtype=np.int64),
+            'dose_gy': radio_gy
+        },
+        'comorbidity': {
+            'id': ((ehr[:, None] - 1) * n_comorbidities + np.arange(1, n_comorbidities + 1)).ravel(),
+            'ehr': np.repeat(ehr, n_comorbidities),
+            'comorbidity': np.tile(np.arange(n_comorbidities, dtype=COMORBIDITY.dtype), n),
+            'negated': present.ravel()
+        },
+        'oral_drug': {'ehr': oral_drug['ehr'], 'drug': oral_drug['value']},
+        'family_history': {'ehr': family_history['ehr'], 'cancer_cui': family_history['value']}
+    }
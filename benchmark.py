@@ -0,0 +1,157 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark
+
+Measures the throughput of the generator and the cost of each output format for several cohort sizes and
+mutation probabilities. The benchmark runs offline: the patients are generated by the batch engine in chunks
+and kept in memory, and the database is replaced by an in-memory SQLite database. Each configuration runs in
+a fresh process, so that the peak memory usage of the configurations does not interfere.
+
+The results are appended to a JSON Lines file together with the version of the code, so that the runs of
+different versions can be compared with `--compare`.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+
+import numpy as np
+
+from batch import generate_batch
+from columnar import ParquetWriter, format_arrow
+from metrics import Metrics
+from rdf import NTriplesSerializer, RDFWriter
+from tables import append_batch, clear_patients, read_structure
+from writers import CSVWriter, SQLDumpWriter, format_csv, format_sql
+
+
+def _sqlite_tables(con: sqlite3.Connection, tables: dict) -> None:
+    for name, table in tables.items():
+        con.execute('CREATE TABLE ' + name + ' (' + ', '.join(table.columns) + ')')
+
+
+def _sqlite_insert(con: sqlite3.Connection, tables: dict) -> None:
+    """Inserts the rows of the patients currently held in the buffers, one statement per table."""
+    for name, table in tables.items():
+        if not table.static:
+            con.executemany('INSERT INTO ' + name + ' VALUES (' + ', '.join(['?'] * len(table.columns)) + ')', table.rows())
+    con.commit()
+
+
+def run(n_patients: int, error_prob: float, chunk_size: int = 10000, seed: int = 42) -> dict:
+    """Generates the patients and writes all output formats; returns the report of the run."""
+    metrics = Metrics(verbose=False)
+    metrics.info.update({'n': n_patients, 'p': error_prob, 'chunk_size': chunk_size, 'seed': seed})
+    with tempfile.TemporaryDirectory() as folder:
+        with metrics.phase('setup'):
+            tables = read_structure()
+            serializer = NTriplesSerializer()
+            sql_writer = SQLDumpWriter(tables, os.path.join(folder, 'synth_data.sql.gz'))
+            csv_writer = CSVWriter(tables, os.path.join(folder, 'csv'))
+            rdf_writer = RDFWriter(folder, 'synth_data')
+            parquet_writer = ParquetWriter(tables, os.path.join(folder, 'parquet'))
+            db = sqlite3.connect(':memory:')
+            _sqlite_tables(db, tables)
+
+        for start in range(1, n_patients + 1, chunk_size):
+            with metrics.phase('generate'):
+                batch = generate_batch(start, min(chunk_size, n_patients + 1 - start), error_prob=error_prob, seed=seed)
+                append_batch(tables, batch)
+            metrics.add_batch(batch)
+            with metrics.phase('sql'):
+                sql_writer.write(format_sql(tables))
+            with metrics.phase('csv'):
+                csv_writer.write(format_csv(tables))
+            with metrics.phase('rdf'):
+                rdf_writer.write(serializer.semantify(tables))
+            with metrics.phase('parquet'):
+                parquet_writer.write(format_arrow(tables))
+            with metrics.phase('sqlite'):
+                _sqlite_insert(db, tables)
+            clear_patients(tables)
+
+        with metrics.phase('sql'):
+            sql_writer.close()
+        with metrics.phase('csv'):
+            csv_writer.close()
+        with metrics.phase('rdf'):
+            rdf_writer.close()
+        with metrics.phase('parquet'):
+            parquet_writer.close()
+        db.close()
+    metrics.patients = n_patients
+
+    report = metrics.report()
+    report['generate_patients_per_second'] = n_patients / report['phases']['generate']
+    return report
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _run_isolated(n_patients: int, error_prob: float, chunk_size: int) -> dict:
+    """Runs a configuration in a new process, so that its peak memory usage is measured on its own."""
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run, n_patients, error_prob, chunk_size).result()
+
+
+def _previous(path: str, n_patients: int, error_prob: float):
+    """Returns the last stored result of the same configuration, if any."""
+    previous = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf8') as fp:
+            for line in fp:
+                result = json.loads(line)
+                if result['n'] == n_patients and result['p'] == error_prob:
+                    previous = result
+    return previous
+
+
+def _summary(result: dict, previous: dict = None) -> str:
+    phases = result['phases']
+    text = (f"n={result['n']:>7} p={result['p']:<5} {result['patients_per_second']:9.1f} patients/s "
+            f"(generate {result['generate_patients_per_second']:9.1f}/s) | " +
+            ' '.join(f"{phase} {phases[phase]:7.2f}s" for phase in ('generate', 'sql', 'csv', 'rdf', 'parquet', 'sqlite')) +
+            f" | peak RSS {result['peak_rss_bytes']['self'] / 2**20:7.1f} MiB")
+    if previous is not None:
+        text += f" | {result['patients_per_second'] / previous['patients_per_second']:5.2f}x vs {previous['version']}"
+    return text
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the Synthetic Data Generator')
+    parser.add_argument('-n', metavar='number_patients', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Cohort sizes to benchmark')
+    parser.add_argument('-p', metavar='mutation_prob', type=float, nargs='+', default=[0.0, 0.05, 0.5],
+                        help='Mutation probabilities to benchmark')
+    parser.add_argument('--chunk-size', metavar='chunk_size', type=int, default=10000,
+                        help='Number of patients generated and written at once')
+    parser.add_argument('--results', metavar='results_file', default='benchmark_results.jsonl',
+                        help='JSON Lines file to which the results are appended')
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare the throughput with the last stored result of the same configuration')
+    args = parser.parse_args()
+
+    version = _version()
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                   'cpus': os.cpu_count()}
+    for n in args.n:
+        for p in args.p:
+            previous = _previous(args.results, n, p) if args.compare else None
+            result = {'version': version, 'date': datetime.datetime.now().isoformat(timespec='seconds'), **environment,
+                      **_run_isolated(n, p, args.chunk_size)}
+            print(_summary(result, previous))
+            with open(args.results, 'a', encoding='utf8') as fp:
+                fp.write(json.dumps(result) + '\n')
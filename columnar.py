@@ -0,0 +1,179 @@
+"""
+Columnar
+
+Writes the tables held in memory as Parquet files with typed columns, i.e., dates, nullable integers,
+booleans for the BIT columns, and dictionary encoded strings. The files can be scanned by analytics
+tools without parsing the CSV files. As for the other formats, the chunks of patients are converted to
+Arrow tables independently of the writer and appended in order. The rows are written in row groups of a
+fixed size, so that the files do not depend on the size of the chunks. Optionally, the patient tables
+are partitioned by ranges of EHRs in the directory layout `table/ehr_start=N/part-0.parquet`. Parquet files
+cannot be extended, so patients appended to a data set are written to new files next to the existing ones.
+"""
+import glob
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+_ARROW_TYPES = {'int': pa.int64(), 'bit': pa.bool_(), 'date': pa.date32(), 'float': pa.float32(),
+                'varchar': pa.string(), 'char': pa.string()}
+
+
+def _arrow_column(values: np.ndarray, sql_type: str) -> pa.Array:
+    """Converts an array to an Arrow array of the type corresponding to the SQL type; None and NaT become null."""
+    arrow_type = _ARROW_TYPES[sql_type]
+    if sql_type in ('varchar', 'char') and values.dtype.kind != 'U':
+        values = np.array([None if v is None else str(v) for v in values.tolist()], dtype=object)
+    elif sql_type == 'bit':
+        return pa.array(values, type=pa.int64(), from_pandas=True).cast(arrow_type)
+    elif sql_type == 'float' and values.dtype.kind == 'f':
+        values = values.astype(np.float32)  # MySQL FLOAT is single precision
+    return pa.array(values, type=arrow_type, from_pandas=True)
+
+
+def _arrow_codes(codes: np.ndarray, dimension) -> pa.Array:
+    """Decodes the codes of a categorical column by taking its values from the dimension; -1 becomes null."""
+    return pa.array(dimension.values, type=pa.string()).take(pa.array(codes, mask=codes < 0))
+
+
+def _arrow_table(table) -> pa.Table:
+    columns = [[] for _ in table.columns]
+    for chunk in table.chunks:
+        for i, (values, (name, sql_type)) in enumerate(zip(chunk, table.columns.items())):
+            if name in table.dimensions:
+                columns[i].append(_arrow_codes(values, table.dimensions[name]))
+            else:
+                columns[i].append(_arrow_column(values, sql_type))
+    schema = _schema(table)
+    return pa.Table.from_arrays([pa.chunked_array(arrays, type=field.type) for arrays, field in zip(columns, schema)],
+                                schema=schema)
+
+
+def _schema(table, dictionary: bool = False) -> pa.Schema:
+    """Schema of a table; the string columns are dictionary encoded in the files if `dictionary` is True."""
+    fields = []
+    for column, sql_type in table.columns.items():
+        arrow_type = _ARROW_TYPES[sql_type]
+        if dictionary and arrow_type == pa.string():
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+def format_arrow(tables: dict) -> dict:
+    """Converts the rows of the patients currently held in the buffers to Arrow tables; one table per table."""
+    return {name: _arrow_table(table) for name, table in tables.items() if not table.static}
+
+
+class ParquetWriter:
+    """
+    Writes one Parquet file per table to `folder`; the rows of the patients are appended chunk by chunk.
+    If `partition_size` is given, the rows of the patient tables are split into one file per range of
+    `partition_size` EHRs instead. A partition is closed as soon as a chunk contains rows of a later one,
+    hence, the chunks must be written in the order of the EHRs.
+    With `append`, the static tables are not written again and the rows are written to new files, i.e.,
+    `table-1.parquet` or `part-1.parquet` in a partition, etc., that are read together with the existing ones.
+    A checkpoint closes the open files in the same way; with `resume`, the state returned by `checkpoint`, the
+    files written after the checkpoint are removed.
+    """
+
+    def __init__(self, tables: dict, folder: str, row_group_size: int = 100000, partition_size: int = None,
+                 append: bool = False, resume: dict = None):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.row_group_size = row_group_size
+        self.partition_size = partition_size
+        self.append = append or resume is not None
+        self.schemas = {name: _schema(table, dictionary=True) for name, table in tables.items()}
+        self.writers = {}  # (table, partition) -> open Parquet writer
+        self.pending = {}  # (table, partition) -> Arrow tables not yet written as a row group
+        if resume is not None:
+            for path in self._files():
+                if path not in resume['files']:
+                    os.remove(os.path.join(folder, path))
+            self.pending = {(name, partition): [] for name, partition in resume['pending']}
+            return
+        for name, table in tables.items():
+            if table.static and append:
+                continue
+            if table.static:
+                self._append(name, None, _arrow_table(table))
+                self._close(name, None)
+            elif partition_size is None:
+                self.pending[(name, None)] = []  # the file is created even if the table stays empty
+
+    def _path(self, name: str, partition) -> str:
+        if partition is None:
+            folder, names = self.folder, (name + '.parquet', name + '-{}.parquet')
+        else:
+            folder = os.path.join(self.folder, name, 'ehr_start=' + str(partition * self.partition_size + 1))
+            os.makedirs(folder, exist_ok=True)
+            names = ('part-0.parquet', 'part-{}.parquet')
+        part = 0
+        while self.append and os.path.exists(os.path.join(folder, names[0] if part == 0 else names[1].format(part))):
+            part += 1
+        return os.path.join(folder, names[0] if part == 0 else names[1].format(part))
+
+    def _write_row_group(self, name: str, partition, rows: pa.Table) -> None:
+        key = (name, partition)
+        if key not in self.writers:
+            self.writers[key] = pq.ParquetWriter(self._path(name, partition), self.schemas[name])
+        # the dictionaries are built per row group, i.e., independently of the chunks the rows came from
+        columns = [pc.dictionary_encode(column) if pa.types.is_dictionary(field.type) else column
+                   for column, field in zip(rows.columns, self.schemas[name])]
+        self.writers[key].write_table(pa.Table.from_arrays(columns, schema=self.schemas[name]),
+                                      row_group_size=self.row_group_size)
+
+    def _append(self, name: str, partition, rows: pa.Table) -> None:
+        key = (name, partition)
+        pending = self.pending.setdefault(key, [])
+        pending.append(rows)
+        n_rows = sum(len(table) for table in pending)
+        if n_rows < self.row_group_size:
+            return
+        rows = pa.concat_tables(pending).combine_chunks()
+        end = n_rows - n_rows % self.row_group_size
+        for start in range(0, end, self.row_group_size):
+            self._write_row_group(name, partition, rows.slice(start, self.row_group_size))
+        self.pending[key] = [rows.slice(end)] if end < n_rows else []
+
+    def _close(self, name: str, partition) -> None:
+        key = (name, partition)
+        pending = self.pending.pop(key, [])
+        if sum(len(table) for table in pending) > 0:
+            self._write_row_group(name, partition, pa.concat_tables(pending).combine_chunks())
+        if key not in self.writers:  # write a file without rows for empty tables
+            self.writers[key] = pq.ParquetWriter(self._path(name, partition), self.schemas[name])
+        self.writers.pop(key).close()
+
+    def write(self, chunk: dict) -> None:
+        """Appends the rows of one chunk of patients formatted with `format_arrow`."""
+        for name, rows in chunk.items():
+            if self.partition_size is None:
+                self._append(name, None, rows)
+                continue
+            ehr = rows.column('ehr').cast(pa.int64()).to_numpy()
+            partitions = (ehr - 1) // self.partition_size
+            for partition in np.unique(partitions):
+                self._append(name, int(partition), rows.filter(pa.array(partitions == partition)))
+            if len(partitions) > 0:
+                for key in [key for key in self.pending if key[0] == name and key[1] < partitions.max()]:
+                    self._close(*key)
+
+    def _files(self) -> list:
+        return sorted(os.path.relpath(path, self.folder)
+                      for path in glob.glob(os.path.join(self.folder, '**', '*.parquet'), recursive=True))
+
+    def checkpoint(self) -> dict:
+        """Closes the files written so far, so that the rows that follow go to new files; returns the names of all files."""
+        for key in [key for key in self.pending if key in self.writers or self.pending[key]]:
+            self._close(*key)
+        self.append = True
+        # the files of the tables that are still empty are created when the writer is closed
+        return {'files': self._files(), 'pending': [list(key) for key in self.pending]}
+
+    def close(self) -> None:
+        for key in list(self.pending):
+            self._close(*key)
@@ -0,0 +1,82 @@
+"""
+Dimensions
+
+The categorical columns of the batch engine, e.g., the stages, the TNM categories, or the oral drugs, are generated
+as small integer codes instead of strings. Each code is the index of the value in the dimension of the column,
+i.e., the interned list of its values built once from the profile and the data model. The codes are decoded to
+the strings only when the rows are written, by `TableBuffer.rows`, the Parquet writer, and the database loader;
+NULL is given by the code -1.
+"""
+import numpy as np
+
+from distributions import (ass_in_situ_dist, commorbidities_prob, family_prob, hist_type_dist, oral_drug_prob,
+                           stage_dx_dist, surgery_dist, tumor_type_dist)
+
+
+class Dimension:
+    """Interned values of a categorical column; the rows hold the codes, i.e., the indices of the values."""
+
+    def __init__(self, values: list):
+        self.values = list(values)
+        self.dtype = np.min_scalar_type(-len(self.values))  # the smallest signed integer type, e.g., int8
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self.decoder = np.array(self.values + [None], dtype=object)  # the code -1 (NULL) selects the last entry
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value) -> int:
+        return self.codes[value]
+
+    def encode(self, values) -> np.ndarray:
+        """Codes of the given values, e.g., of the values of a distribution; raises a KeyError for unknown values."""
+        return np.array([self.codes[value] for value in np.ravel(values).tolist()],
+                        dtype=self.dtype).reshape(np.shape(values))
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Values of the codes as an object array holding the interned strings; -1 becomes None."""
+        return self.decoder[codes]
+
+
+TUMOR_TYPE = Dimension(tumor_type_dist.values)
+STAGE = Dimension(stage_dx_dist.values)
+T_CATEGORY = Dimension(['0', '1', '2', '3', '4', 'IS'])
+N_CATEGORY = Dimension(['0', '1', '2', '3'])
+N_SUBCATEGORY = Dimension(['None', 'MI'])  # None is stored as its string representation
+M_CATEGORY = Dimension(['0', '1'])
+PREFIX = Dimension(['C', 'P'])
+NEOADJUVANT = Dimension(['no', 'yes'])  # the code is the boolean
+HIST_TYPE = Dimension(hist_type_dist.values)
+ASS_IN_SITU = Dimension(ass_in_situ_dist.values)
+SURGERY = Dimension(surgery_dist.values + ['sentinel lymph node biopsy', 'lymphadenectomy'])
+# every patient has one row per comorbidity, except for 'smoker or ex-smoker' which results in two rows
+COMORBIDITY = Dimension([c for k in commorbidities_prob.keys()
+                         for c in (['smoker', 'ex-smoker'] if k == 'smoker or ex-smoker' else [k])])
+ORAL_DRUG = Dimension(oral_drug_prob.keys())
+FAMILY_CUI = Dimension(family_prob.keys())
+
+# table -> column -> dimension of the coded columns in the batches of `generate_batch`
+DIMENSIONS = {
+    'patient': {'neoadjuvant': NEOADJUVANT},
+    'tumor_tnm': {
+        't_prefix': PREFIX,
+        't_category': T_CATEGORY,
+        'n_prefix': PREFIX,
+        'n_category': N_CATEGORY,
+        'n_subcategory': N_SUBCATEGORY,
+        'm_category': M_CATEGORY,
+        't_prefix_after_neoadj': PREFIX,
+        't_category_after_neoadj': T_CATEGORY,
+        'n_prefix_after_neoadj': PREFIX,
+        'n_category_after_neoadj': N_CATEGORY,
+        'n_subcategory_after_neoadj': N_SUBCATEGORY,
+        'm_category_after_neoadj': M_CATEGORY,
+        'stage_diagnosis': STAGE,
+        'stage_after_neo': STAGE
+    },
+    'surgery': {'surgery': SURGERY},
+    'comorbidity': {'comorbidity': COMORBIDITY},
+    'oral_drug': {'drug': ORAL_DRUG},
+    'family_history': {'cancer_cui': FAMILY_CUI}
+}
+
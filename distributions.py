@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Distributions
+
+Parameters of the distributions followed by the values of the synthetic breast cancer patients and the samplers
+compiled from them. They are taken from the profile given by the environment variable SDG_PROFILE, or from the
+default profile (see `profiles`). The profile is loaded at import, so that it applies to all modules of a run,
+including the worker processes, which inherit the environment.
+"""
+import os
+
+from profiles import load_profile
+
+PROFILE = os.environ.get('SDG_PROFILE') or None  # path of the profile; None for the default profile
+_profile = load_profile(PROFILE)
+profile_hash = _profile['profile_hash']
+
+max_cycles_adjuvant = _profile['max_cycles_adjuvant']
+mean_age_dx = _profile['mean_age_dx']
+mean_menarche_age = _profile['mean_menarche_age']
+std_menarche_age = _profile['std_menarche_age']
+mean_menopause_age = _profile['mean_menopause_age']
+std_menopause_age = _profile['std_menopause_age']
+max_menopause_age = _profile['max_menopause_age']
+mean_pregnancies = _profile['mean_pregnancies']
+std_pregnancies = _profile['std_pregnancies']
+abort_prob = _profile['abort_prob']
+caesarean_prob = _profile['caesarean_prob']
+tumor_type_prob = _profile['tumor_type_prob']
+death_prob = _profile['death_prob']
+mean_days_alive = _profile['mean_days_alive']
+stage_dx_prob = _profile['stage_dx_prob']
+grade_prob = _profile['grade_prob']
+mean_ki67 = _profile['mean_ki67']
+surgery_prob = _profile['surgery_prob']
+stage_neo_prob = _profile['stage_neo_prob']
+hist_type_prob = _profile['hist_type_prob']
+ass_in_situ_prob = _profile['ass_in_situ_prob']
+t1_ib_prob = _profile['t1_ib_prob']
+t0_n1_iia_prob = _profile['t0_n1_iia_prob']
+t1_n1_iia_prob = _profile['t1_n1_iia_prob']
+t2_n1_iib_prob = _profile['t2_n1_iib_prob']
+t3_n1_iiia_prob = _profile['t3_n1_iiia_prob']
+t_category_iiia_prob = _profile['t_category_iiia_prob']
+n_category_iiib_prob = _profile['n_category_iiib_prob']
+t_category_iiic_prob = _profile['t_category_iiic_prob']
+t_category_iv_prob = _profile['t_category_iv_prob']
+n_category_iv_prob = _profile['n_category_iv_prob']
+days_to_radio = _profile['days_to_radio']
+radio_days_mean = _profile['radio_days_mean']
+radio_days_std = _profile['radio_days_std']
+radio_days_range = _profile['radio_days_range']
+radio_gy_mean = _profile['radio_gy_mean']
+radio_gy_std = _profile['radio_gy_std']
+radio_gy_range = _profile['radio_gy_range']
+commorbidities_prob = _profile['commorbidities_prob']
+smoker_or_ex_prob = _profile['smoker_or_ex_prob']
+oral_drug_prob = _profile['oral_drug_prob']
+family_prob = _profile['family_prob']
+
+# samplers of the categorical distributions
+abort_dist = _profile['abort_dist']
+caesarean_dist = _profile['caesarean_dist']
+tumor_type_dist = _profile['tumor_type_dist']
+stage_dx_dist = _profile['stage_dx_dist']
+grade_dist = _profile['grade_dist']
+surgery_dist = _profile['surgery_dist']
+stage_neo_dist = _profile['stage_neo_dist']
+hist_type_dist = _profile['hist_type_dist']
+ass_in_situ_dist = _profile['ass_in_situ_dist']
+t_category_iiia_dist = _profile['t_category_iiia_dist']
+n_category_iiib_dist = _profile['n_category_iiib_dist']
+t_category_iiic_dist = _profile['t_category_iiic_dist']
+t_category_iv_dist = _profile['t_category_iv_dist']
+n_category_iv_dist = _profile['n_category_iv_dist']
+smoker_or_ex_dist = _profile['smoker_or_ex_dist']
@@ -0,0 +1,168 @@
+"""
+Loader
+
+Bulk loading of the generated rows into MySQL. Instead of sending one statement per patient and table,
+the rows are buffered per table and flushed in large blocks, either as multi-row INSERT statements or
+with `LOAD DATA LOCAL INFILE` from temporary files. During the load, the unique and foreign key checks
+as well as the secondary indexes of the patient tables are disabled; the indexes are rebuilt at the end.
+"""
+import collections
+import datetime
+import os
+import re
+import tempfile
+import typing
+
+import numpy as np
+
+if typing.TYPE_CHECKING:  # mysql.connector is imported by SDG.py when it connects to the database
+    from mysql.connector.connection import MySQLConnection
+
+_INSERT = re.compile(r'^\s*INSERT INTO (\w+)\s*(?:\(([^)]*)\))?\s+VALUES', re.IGNORECASE)
+_INDEX_NAME = re.compile(r'^CREATE INDEX (\w+) ON')
+_ESCAPE = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+
+def _infile_value(value) -> str:
+    """Formats a value for a tab-separated file read by `LOAD DATA` with the default escaping."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    if isinstance(value, (datetime.date, str)):
+        return str(value).translate(_ESCAPE)
+    return str(value)
+
+
+class BulkLoader:
+    """
+    Buffers the rows of the patients per table and loads them into MySQL in blocks of `batch_size` rows.
+
+    The loader can be used in place of a cursor by `generate_data`, i.e., it accepts the INSERT statements
+    of single patients via `execute` and `executemany`. The batches of `generate_batch` are added with
+    `insert_batch`. Use it as a context manager; the remaining rows are flushed and the keys are enabled
+    again on exit. With `drop_indexes=False`, e.g., when patients are appended to a large database, the
+    secondary indexes are kept and updated by the inserts instead of being rebuilt for all rows.
+    """
+
+    def __init__(self, con: 'MySQLConnection', tables: dict, batch_size: int = 10000, method: str = 'insert',
+                 drop_indexes: bool = True):
+        if method not in ('insert', 'infile'):
+            raise ValueError('unknown load method: ' + method)
+        self.con = con
+        self.cur = con.cursor()
+        self.tables = tables  # structure of the tables as returned by `read_structure`
+        self.batch_size = batch_size
+        self.method = method
+        self.drop_indexes = drop_indexes
+        self.buffers = {}  # (table, columns) -> list of rows
+        self.row_counts = collections.Counter()  # number of rows added per table
+
+    def __enter__(self):
+        self.disable_keys()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        self.enable_keys()
+        self.cur.close()
+
+    def _patient_tables(self):
+        return [table for table in self.tables.values() if not table.static]
+
+    def _index_names(self, table) -> set:
+        """Names of the indexes the table has in the database; an interrupted run may have dropped some of them."""
+        self.cur.execute('SHOW INDEX FROM `' + table.name + '`')
+        return {row[2] for row in self.cur.fetchall()}
+
+    def disable_keys(self) -> None:
+        """Disables the key checks and drops the secondary indexes of the patient tables until `enable_keys` is called."""
+        self.cur.execute('SET SESSION unique_checks = 0')
+        self.cur.execute('SET SESSION foreign_key_checks = 0')
+        for table in self._patient_tables():
+            self.cur.execute('ALTER TABLE `' + table.name + '` DISABLE KEYS')
+            existing = self._index_names(table) if self.drop_indexes and table.indexes else set()
+            for index in table.indexes if self.drop_indexes else []:
+                name = _INDEX_NAME.match(index).group(1)
+                if name in existing:
+                    self.cur.execute('DROP INDEX ' + name + ' ON `' + table.name + '`')
+
+    def enable_keys(self) -> None:
+        """Rebuilds the secondary indexes of the patient tables and enables the key checks again."""
+        for table in self._patient_tables():
+            existing = self._index_names(table) if self.drop_indexes and table.indexes else set()
+            for index in table.indexes if self.drop_indexes else []:
+                if _INDEX_NAME.match(index).group(1) not in existing:
+                    self.cur.execute(index)
+            self.cur.execute('ALTER TABLE `' + table.name + '` ENABLE KEYS')
+        self.cur.execute('SET SESSION foreign_key_checks = 1')
+        self.cur.execute('SET SESSION unique_checks = 1')
+        self.con.commit()
+
+    def _add(self, table: str, columns: tuple, rows: list) -> None:
+        buffer = self.buffers.setdefault((table, columns), [])
+        buffer.extend(rows)
+        self.row_counts[table] += len(rows)
+        if len(buffer) >= self.batch_size:
+            self._flush(table, columns)
+
+    def _parse(self, sql: str) -> tuple:
+        match = _INSERT.match(sql)
+        if match is None:
+            raise ValueError('only INSERT statements can be buffered: ' + sql)
+        table = match.group(1)
+        if match.group(2) is None:
+            return table, tuple(self.tables[table].columns)
+        return table, tuple(column.strip() for column in match.group(2).split(','))
+
+    def execute(self, sql: str, params: tuple) -> None:
+        """Buffers the row of an INSERT statement."""
+        self._add(*self._parse(sql), [tuple(params)])
+
+    def executemany(self, sql: str, seq_params: list) -> None:
+        """Buffers the rows of an INSERT statement."""
+        self._add(*self._parse(sql), [tuple(params) for params in seq_params])
+
+    def insert_batch(self, batch: dict) -> None:
+        """Buffers the tables of a batch of patients generated by `generate_batch`."""
+        for table, columns in batch.items():
+            self._add(table, tuple(columns.keys()), list(zip(*[self.tables[table].decoded(name, values).tolist()
+                                                               for name, values in columns.items()])))
+
+    def flush(self) -> None:
+        """Loads all the buffered rows into the database."""
+        for table, columns in list(self.buffers):
+            self._flush(table, columns)
+
+    def _flush(self, table: str, columns: tuple) -> None:
+        rows = self.buffers.pop((table, columns))
+        for start in range(0, len(rows), self.batch_size):
+            if self.method == 'insert':
+                self._insert(table, columns, rows[start:start + self.batch_size])
+            else:
+                self._load_infile(table, columns, rows[start:start + self.batch_size])
+        self.con.commit()
+
+    def _insert(self, table: str, columns: tuple, rows: list) -> None:
+        # the connector rewrites `executemany` of an INSERT into one statement with multiple rows
+        sql = 'INSERT INTO ' + table + '(' + ', '.join(columns) + ') VALUES (' + ', '.join(['%s'] * len(columns)) + ')'
+        self.cur.executemany(sql, rows)
+
+    def _load_infile(self, table: str, columns: tuple, rows: list) -> None:
+        # BIT columns are read into variables; loading the text '1' directly would store the character code
+        types = self.tables[table].columns
+        targets = ['@' + column if types[column] == 'bit' else column for column in columns]
+        assignments = [column + ' = CAST(@' + column + ' AS UNSIGNED)' for column in columns if types[column] == 'bit']
+        fd, path = tempfile.mkstemp(suffix='.tsv')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf8') as fp:
+                for row in rows:
+                    fp.write('\t'.join(_infile_value(value) for value in row) + '\n')
+            sql = ("LOAD DATA LOCAL INFILE '" + path.replace('\\', '/') + "' INTO TABLE `" + table + "`" +
+                   " CHARACTER SET utf8mb4 (" + ', '.join(targets) + ')')
+            if assignments:
+                sql += ' SET ' + ', '.join(assignments)
+            self.cur.execute(sql)
+        finally:
+            os.remove(path)
@@ -0,0 +1,141 @@
+"""
+Metrics
+
+Timing and throughput of the phases of a run. The wall-clock time of each phase is accumulated by name,
+together with the number of patients and the number of rows per table. The report contains the
+patients and rows per second as well as the peak memory usage and is written as JSON.
+"""
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+
+_IMPORTED = time.perf_counter()
+
+
+def peak_rss() -> dict:
+    """Peak resident set size in bytes of this process and of its terminated child processes, e.g., workers."""
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+
+
+def process_seconds() -> float:
+    """
+    Seconds since this process was started, i.e., including the start of the interpreter and the imports.
+    Where the start time of the process is not available, the time since this module was imported.
+    """
+    try:
+        with open('/proc/self/stat', 'r') as fp:
+            started = int(fp.read().rsplit(')', 1)[1].split()[19]) / os.sysconf('SC_CLK_TCK')
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, AttributeError, ValueError, IndexError):
+        return time.perf_counter() - _IMPORTED
+
+
+class Stopwatch:
+    """Attributes the time between consecutive laps to the given sections, e.g., of the code generating a patient."""
+
+    def __init__(self, metrics, prefix: str = ''):
+        self.metrics = metrics
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, section: str) -> None:
+        now = time.perf_counter()
+        self.metrics.add_time(self.prefix + section, now - self.last)
+        self.last = now
+
+
+class Metrics:
+    """Collects the times of the phases of a run and the number of generated patients and rows."""
+
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose  # print the time of each phase when it ends
+        self.start = time.perf_counter()
+        self.times = collections.defaultdict(float)
+        self.rows = collections.Counter()
+        self.patients = 0
+        self.info = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str, label: str = None):
+        """Measures the time of the enclosed code; `label` is printed with the time if given."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(name, elapsed)
+            if self.verbose and label is not None:
+                print(label + ':', elapsed)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.times[name] += seconds
+
+    def add_rows(self, counts: dict) -> None:
+        """Adds the number of rows per table."""
+        self.rows.update(counts)
+
+    def add_batch(self, batch: dict) -> None:
+        """Adds the rows of a batch generated by `generate_batch`."""
+        self.add_rows({table: len(next(iter(columns.values()))) for table, columns in batch.items()})
+
+    def stopwatch(self, prefix: str = '') -> Stopwatch:
+        return Stopwatch(self, prefix)
+
+    def report(self) -> dict:
+        total = time.perf_counter() - self.start
+        return {
+            **self.info,
+            'total_seconds': total,
+            'phases': {name: seconds for name, seconds in sorted(self.times.items())},
+            'patients': self.patients,
+            'patients_per_second': self.patients / total if total > 0 else None,
+            'rows': {table: n for table, n in sorted(self.rows.items())},
+            'rows_per_second': {table: n / total if total > 0 else None for table, n in sorted(self.rows.items())},
+            'peak_rss_bytes': peak_rss()
+        }
+
+    def write(self, path: str) -> None:
+        with open(path, 'w', encoding='utf8') as fp:
+            json.dump(self.report(), fp, indent=2)
+            fp.write('\n')
+
+
+class _NoStopwatch:
+    def lap(self, section: str) -> None:
+        pass
+
+
+class _NoMetrics:
+    """Used when no metrics are collected; all calls are ignored."""
+
+    def stopwatch(self, prefix: str = '') -> _NoStopwatch:
+        return _NoStopwatch()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, label: str = None):
+        yield
+
+
+NO_METRICS = _NoMetrics()
+
+
+@contextlib.contextmanager
+def profile(path: str = None):
+    """Profiles the enclosed code with cProfile and writes the statistics to `path`; does nothing if `path` is None."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
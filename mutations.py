@@ -0,0 +1,245 @@
+"""
+Mutations
+
+The rules by which the batch engine makes the data deviate from the treatment guidelines. Each rule names the
+mutated field, the perturbation applied to the mutated values, and optionally the condition, i.e., the name of
+a mask that restricts the rule to some patients (e.g., only patients with neoadjuvant chemotherapy). A rule is
+applied to a whole column at once using one Bernoulli mask drawn with the mutation rate of the field. Rules
+with a rate of zero do not draw any random values, hence, clean data is generated without mutation overhead.
+With the streams of `PatientStreams`, each rule draws from its own substream. The values of the clean data
+then do not depend on the mutation rates, and the rate of a field only affects that field and the values
+derived from it.
+"""
+import collections
+
+import numpy as np
+
+from dimensions import (ASS_IN_SITU, FAMILY_CUI, HIST_TYPE, M_CATEGORY, N_CATEGORY, N_SUBCATEGORY, ORAL_DRUG, PREFIX,
+                        STAGE, T_CATEGORY)
+from distributions import grade_dist
+
+
+def _sign(rng, size) -> np.ndarray:
+    return np.where(rng.random(size) < 0.5, 1, -1)
+
+
+def _shift(values: np.ndarray, mask: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    """Adds `delta` to the masked values; `delta` is a number of days for dates."""
+    delta = np.where(mask, delta, 0)
+    if np.issubdtype(values.dtype, np.datetime64):
+        delta = delta.astype('timedelta64[D]')
+    return values + delta
+
+
+class Flip:
+    """Negates the mutated booleans."""
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return values ^ mask
+
+
+class Bernoulli:
+    """Replaces the mutated values with True with probability `p` and False otherwise."""
+
+    def __init__(self, p: float):
+        self.p = p
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return np.where(mask, rng.random(mask.shape) < self.p, values)
+
+
+class Choice:
+    """
+    Replaces the mutated values with one of the options drawn uniformly; options may be repeated to weight them.
+    The options of the categorical columns are given as the codes of their values (see `dimensions`).
+    """
+
+    def __init__(self, options: list):
+        self.options = np.array(options)
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return np.where(mask, self.options[rng.integers(0, len(self.options), mask.shape)], values)
+
+
+class NormalShift:
+    """Shifts the mutated values up or down by the integer part of a normally distributed amount."""
+
+    def __init__(self, mean: float, std: float):
+        self.mean = mean
+        self.std = std
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return _shift(values, mask, (rng.normal(self.mean, self.std, mask.shape) * _sign(rng, mask.shape)).astype(np.int64))
+
+
+class UniformShift:
+    """Shifts the mutated values up or down by an integer amount drawn uniformly from [low, high)."""
+
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return _shift(values, mask, rng.integers(self.low, self.high, mask.shape) * _sign(rng, mask.shape))
+
+
+class UniformOffset:
+    """Adds an integer drawn uniformly from [low, high) to the mutated counts; counts do not become negative."""
+
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        return np.where(mask, np.maximum(values + rng.integers(self.low, self.high, mask.shape), 0), values)
+
+
+class ShiftOrInvent:
+    """
+    Shifts the mutated values like `NormalShift` with the parameters `shift`; values marked as missing by the
+    mask `missing` of the context are replaced by a normally distributed value with the parameters `invent`.
+    """
+
+    def __init__(self, shift: tuple, invent: tuple, missing: str):
+        self.shift = NormalShift(*shift)
+        self.invent = invent
+        self.missing = missing
+
+    def apply(self, rng, values: np.ndarray, mask: np.ndarray, context: dict) -> np.ndarray:
+        shifted = self.shift.apply(rng, values, np.ones(mask.shape, dtype=bool), context)
+        invented = rng.normal(*self.invent, mask.shape).astype(np.int64)
+        return np.where(mask, np.where(context[self.missing], invented, shifted), values)
+
+
+class ListEdit:
+    """
+    Edits the elements of the 1:N lists, i.e., oral drugs and family history. For the k-th element of the list of
+    each patient, the result holds -1 (no mutation), 0 (remove), 1 (add), or 2 (mutate) and the code of the added value.
+    """
+
+    def __init__(self, options: list):
+        self.options = np.array(options)
+
+    def apply(self, rng, values, mask: np.ndarray, context: dict) -> tuple:
+        actions = np.where(mask, rng.integers(0, 3, mask.shape), -1)
+        return actions, self.options[rng.integers(0, len(self.options), mask.shape)]
+
+
+Rule = collections.namedtuple('Rule', ['field', 'perturbation', 'condition'], defaults=[None])
+
+_STAGES = STAGE.encode(STAGE.values)
+_T_CATEGORIES = T_CATEGORY.encode(['0', '1', '2', '3', '4', 'IS'])
+_N_CATEGORIES = N_CATEGORY.encode(['0', '1', '2', '3'])
+_N_SUBCATEGORIES = N_SUBCATEGORY.encode(['MI', 'None', 'None', 'None'])
+_M_CATEGORIES = M_CATEGORY.encode(['0', '1'])
+_PREFIXES = PREFIX.encode(['C', 'P', 'P', 'P'])
+
+# in the order in which they are applied by `generate_batch`
+RULES = {rule.field: rule for rule in [
+    Rule('death', Bernoulli(1 / 16)),
+    Rule('days_alive', NormalShift(700.0, 70.0)),
+    Rule('diagnosis_date', NormalShift(1500.0, 300.0)),
+    Rule('death_date', NormalShift(1500.0, 300.0)),
+    Rule('menarche_age', NormalShift(6.0, 2.0)),
+    Rule('menopause_age', ShiftOrInvent((25.0, 4.0), (120.0, 10.0), missing='no_menopause')),
+    Rule('menopause_pre', Flip()),
+    Rule('pregnancy', NormalShift(6.0, 2.0)),
+    Rule('birth', NormalShift(6.0, 2.0)),
+    Rule('abort', NormalShift(6.0, 2.0)),
+    Rule('caesarean', NormalShift(6.0, 2.0)),
+    Rule('ki67_percent_max_simp', NormalShift(40.0, 8.0)),
+    Rule('er_positive', Flip()),
+    Rule('pr_positive', Flip()),
+    Rule('neoadjuvant_cycles', UniformOffset(-7, 8), 'neoadjuvant'),
+    Rule('neoadjuvant_start', UniformShift(10, 20), 'neoadjuvant'),
+    Rule('neoadjuvant_schema', Choice([10, 20, 43, 51, 9, 11, 25, 59, 63])),
+    Rule('chemotherapy_cycle_date', UniformShift(10, 20)),
+    Rule('surgery_date', UniformShift(20, 35), 'surgery'),
+    Rule('adjuvant_cycles', UniformOffset(-7, 8), 'adjuvant'),
+    Rule('adjuvant_start', UniformShift(15, 35), 'adjuvant'),
+    Rule('adjuvant_schema', Choice([10, 20, 43, 44, 50, 51, 9, 11, 25, 59, 63])),
+    Rule('first_treatment_date', UniformShift(50, 500)),
+    Rule('first_surgery_date', UniformShift(50, 500)),
+    Rule('radiotherapy_start', UniformShift(20, 50)),
+    Rule('radiotherapy_end', UniformShift(20, 50)),
+    Rule('dose_gy', UniformShift(20, 50)),
+    Rule('stage_diagnosis', Choice(_STAGES)),
+    Rule('stage_after_neo', Choice(_STAGES)),
+    Rule('neoadjuvant', Flip()),
+    Rule('t_category', Choice(_T_CATEGORIES)),
+    Rule('n_category', Choice(_N_CATEGORIES)),
+    Rule('n_subcategory', Choice(_N_SUBCATEGORIES)),
+    Rule('m_category', Choice(_M_CATEGORIES)),
+    Rule('t_category_after_neoadj', Choice(_T_CATEGORIES)),
+    Rule('n_category_after_neoadj', Choice(_N_CATEGORIES)),
+    Rule('n_subcategory_after_neoadj', Choice(_N_SUBCATEGORIES)),
+    Rule('m_category_after_neoadj', Choice(_M_CATEGORIES)),
+    Rule('invasive', Choice([True, True, True, False])),
+    Rule('hist_type', Choice(HIST_TYPE.encode(HIST_TYPE.values))),
+    Rule('associated_in_situ', Choice(ASS_IN_SITU.encode(ASS_IN_SITU.values))),
+    Rule('grade', Choice([int(g) for g in grade_dist.values])),
+    Rule('t_prefix', Choice(_PREFIXES)),
+    Rule('t_prefix_after_neoadj', Choice(_PREFIXES)),
+    Rule('comorbidity', Choice([0, 1])),
+    Rule('oral_drug', ListEdit(ORAL_DRUG.encode(ORAL_DRUG.values))),
+    Rule('family_history', ListEdit(FAMILY_CUI.encode(FAMILY_CUI.values)))
+]}
+
+# fields whose mutation rate is used directly by the generator instead of a rule
+# surgery: patients in stage IV may get a surgery and other patients may not get one
+FIELDS = list(RULES) + ['surgery']
+
+
+def mutation_rates(error_prob: float, rates: dict = None) -> dict:
+    """Mutation rate of each field; `error_prob` applies to all the fields not given in `rates`."""
+    unknown = set(rates or {}) - set(FIELDS)
+    if unknown:
+        raise ValueError('unknown mutation fields: ' + ', '.join(sorted(unknown)))
+    for field, rate in (rates or {}).items():
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError('the mutation rate of ' + field + ' is not in [0.0, 1.0]: ' + str(rate))
+    return {field: (rates or {}).get(field, error_prob) for field in FIELDS}
+
+
+class Mutator:
+    """Applies the rules to the columns of a batch, drawing the random values from `rng` or its substreams."""
+
+    def __init__(self, rng, rates: dict):
+        self.rng = rng
+        self.rates = rates  # as returned by `mutation_rates`
+        self.streams = {}  # field -> substream of `rng`
+
+    def _stream(self, field: str):
+        if not hasattr(self.rng, 'substream'):
+            return self.rng
+        if field not in self.streams:
+            self.streams[field] = self.rng.substream('mutation.' + field)
+        return self.streams[field]
+
+    def mask(self, field: str, shape, context: dict = None) -> np.ndarray:
+        """Bernoulli mask of the mutated values of the field; no random values are drawn if its rate is zero."""
+        rate = self.rates[field]
+        if rate <= 0.0:
+            return np.zeros(shape, dtype=bool)
+        mask = self._stream(field).random(shape) < rate
+        condition = RULES[field].condition
+        if condition is not None:
+            mask &= context[condition]
+        return mask
+
+    def apply(self, field: str, values: np.ndarray, **context) -> np.ndarray:
+        """Returns the values of the field with the rule applied; the masks used by the rule are passed as keywords."""
+        return self.apply_masked(field, values, **context)[0]
+
+    def apply_masked(self, field: str, values: np.ndarray, **context) -> tuple:
+        """Same as `apply`, but also returns the mask of the mutated values."""
+        if self.rates[field] <= 0.0:
+            return values, np.zeros(np.shape(values), dtype=bool)
+        mask = self.mask(field, np.shape(values), context)
+        return RULES[field].perturbation.apply(self._stream(field), values, mask, context), mask
+
+    def edit_list(self, field: str, shape: tuple) -> tuple:
+        """Draws the edits of a 1:N list with `ListEdit`; returns no edits (-1, None) if the rate is zero."""
+        if self.rates[field] <= 0.0:
+            return np.full(shape, -1), None
+        return RULES[field].perturbation.apply(self._stream(field), None, self.mask(field, shape), {})
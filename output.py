@@ -0,0 +1,121 @@
+"""
+Output
+
+Opens the writers of the output files of a run without a database and writes the chunks created by
+`generate_chunks` to them. Used by SDG.py with `--no-db` and by the generation service, which keeps the
+generator running and writes one cohort after the other.
+
+The manifest stored next to the output files records the patients and the settings of a data set, so that
+new patients can be appended to it later without reading the data. During a run, a checkpoint records the
+patients written so far and the state of the writers, so that an interrupted run can be continued.
+"""
+import contextlib
+import json
+import os
+
+from rdf import RDFWriter
+from writers import COMPRESSIONS, CSVWriter, SQLDumpWriter, ThreadedWriter, close_writers
+
+FORMATS = ('sql', 'csv', 'rdf', 'parquet')
+MANIFEST = 'manifest.json'
+CHECKPOINT = 'checkpoint.json'
+
+
+def open_writers(tables: dict, folder: str, formats: tuple = ('sql', 'csv', 'rdf'), sql_compression: str = 'gzip',
+                 csv_compression: str = 'none', compression_level: int = None, compression_threads: int = None,
+                 parquet_row_group_size: int = 100000, parquet_partition_size: int = None, writer_queue: int = 2,
+                 append: bool = False, checkpoints: bool = False, resume: dict = None) -> dict:
+    """
+    Opens one writer per format in `folder`; the files are named as the ones of a run with a database.
+    With `writer_queue` > 0, each writer runs in its own thread and queues up to `writer_queue` chunks.
+    With `append`, the patients are added to the files written before. With `checkpoints`, the writers can take
+    checkpoints; with `resume`, the states of the writers at a checkpoint, the files are reset to the checkpoint.
+    """
+    os.makedirs(folder, exist_ok=True)
+    resume = resume or {}
+    writers = {}
+    if 'sql' in formats:
+        writers['sql'] = SQLDumpWriter(tables, os.path.join(folder, 'synth_data.sql' + COMPRESSIONS[sql_compression]),
+                                       compression=sql_compression, level=compression_level, threads=compression_threads,
+                                       append=append, checkpoints=checkpoints, resume=resume.get('sql'))
+    if 'csv' in formats:
+        writers['csv'] = CSVWriter(tables, os.path.join(folder, 'csv'), csv_compression, compression_level,
+                                   compression_threads, append, resume.get('csv'))
+    if 'rdf' in formats:
+        writers['rdf'] = RDFWriter(folder, 'synth_data', append, resume.get('rdf'))
+    if 'parquet' in formats:
+        from columnar import ParquetWriter  # pyarrow is only imported if Parquet files are written
+        writers['parquet'] = ParquetWriter(tables, os.path.join(folder, 'parquet'), parquet_row_group_size,
+                                           parquet_partition_size, append, resume.get('parquet'))
+    if writer_queue > 0:
+        writers = {name: ThreadedWriter(writer, writer_queue) for name, writer in writers.items()}
+    return writers
+
+
+def write_chunks(chunks, writers: dict, metrics, checkpoint=None, checkpoint_interval: int = 1) -> None:
+    """
+    Writes the chunks yielded by `generate_chunks` and closes the writers; the times are added to `metrics`.
+    If given, `checkpoint` is called with the number of chunks written and the states of the writers after every
+    `checkpoint_interval` chunks.
+    """
+    try:
+        for i, (chunk, rows, times) in enumerate(chunks, 1):
+            for name, seconds in times.items():
+                metrics.add_time('chunks.' + name, seconds)
+            metrics.add_rows(rows)
+            for name, writer in writers.items():
+                with metrics.phase('write.' + name):  # with threads, only the time waiting for the queue
+                    writer.write(chunk[name])
+            if checkpoint is not None and i % checkpoint_interval == 0:
+                with metrics.phase('checkpoint'):
+                    checkpoint(i, checkpoint_writers(writers))
+    except BaseException:
+        for writer in writers.values():  # stops the threads; the files of the failed run are incomplete
+            with contextlib.suppress(Exception):
+                writer.close()
+        raise
+    with metrics.phase('write.close'):
+        close_writers(list(writers.values()))
+    for name, writer in writers.items():
+        if isinstance(writer, ThreadedWriter):
+            metrics.add_time('thread.' + name, writer.seconds)
+
+
+def checkpoint_writers(writers: dict) -> dict:
+    """Takes a checkpoint of each writer, i.e., waits until the chunks written before are in the files; returns the states."""
+    return {name: writer.checkpoint() for name, writer in writers.items()}
+
+
+def read_manifest(folder: str) -> dict:
+    """Returns the manifest of the data set in `folder`; raises a FileNotFoundError if there is none."""
+    with open(os.path.join(folder, MANIFEST), 'r', encoding='utf8') as fp:
+        return json.load(fp)
+
+
+def write_manifest(folder: str, manifest: dict) -> None:
+    """Replaces the manifest of the data set in `folder`; the file is replaced at once, so it is never incomplete."""
+    _write_json(os.path.join(folder, MANIFEST), manifest)
+
+
+def read_checkpoint(folder: str) -> dict:
+    """Returns the last checkpoint of the interrupted run in `folder`; raises a FileNotFoundError if there is none."""
+    with open(os.path.join(folder, CHECKPOINT), 'r', encoding='utf8') as fp:
+        return json.load(fp)
+
+
+def write_checkpoint(folder: str, checkpoint: dict) -> None:
+    """Replaces the checkpoint of the run in `folder`; the file is replaced at once, so it is never incomplete."""
+    _write_json(os.path.join(folder, CHECKPOINT), checkpoint)
+
+
+def remove_checkpoint(folder: str) -> None:
+    """Removes the checkpoint of a finished run."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(os.path.join(folder, CHECKPOINT))
+
+
+def _write_json(path: str, content: dict) -> None:
+    with open(path + '.tmp', 'w', encoding='utf8') as fp:
+        json.dump(content, fp, indent=2)
+        fp.write('\n')
+    os.replace(path + '.tmp', path)
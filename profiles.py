@@ -0,0 +1,224 @@
+"""
+Profiles
+
+The parameters of the distributions followed by the synthetic patients are given by a profile, i.e., a JSON or
+YAML file, so that cohorts following the populations of different hospitals can be generated. The default
+profile `profiles/default.json` holds the parameters of the original population; other profiles only give
+the parameters that differ from it. The categories of the distributions, e.g., the stages or the oral drugs,
+are the ones of the data model and cannot be changed; a profile changes their probabilities.
+
+A profile is validated and compiled into the samplers used by the generators, i.e., the `Categorical`
+distributions of `sampling`. The compiled profile is cached on disk, keyed by the hash of the profile, so that
+a profile is only parsed, validated, and compiled the first time it is used.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+try:
+    import yaml
+except ImportError:  # only needed for YAML profiles
+    yaml = None
+
+from sampling import Categorical, ConditionalCategorical
+
+DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles', 'default.json')
+CACHE_DIR = os.environ.get('SDG_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'sdg', 'profiles'))
+_VERSION = b'2'  # part of the cache key; to be changed whenever the compiled form or the validation changes
+
+# kind of each parameter:
+# number - a number; std - a non-negative number; count - a non-negative integer; range - [low, high];
+# integer_range - [low, high) of integers with low < high, as drawn by randint; probability - a number in [0, 1];
+# categorical - value -> probability, summing up to 1; conditional - parent -> categorical;
+# probabilities - value -> probability of each value independently; per_tumor_type - tumor type -> number
+SCHEMA = {
+    'max_cycles_adjuvant': 'count',
+    'mean_age_dx': 'number',
+    'mean_menarche_age': 'number',
+    'std_menarche_age': 'std',
+    'mean_menopause_age': 'number',
+    'std_menopause_age': 'std',
+    'max_menopause_age': 'range',
+    'mean_pregnancies': 'number',
+    'std_pregnancies': 'std',
+    'abort_prob': 'categorical',
+    'caesarean_prob': 'categorical',
+    'tumor_type_prob': 'categorical',
+    'death_prob': 'per_tumor_type',
+    'mean_days_alive': 'per_tumor_type',
+    'stage_dx_prob': 'categorical',
+    'grade_prob': 'categorical',
+    'mean_ki67': 'per_tumor_type',
+    'surgery_prob': 'categorical',
+    'stage_neo_prob': 'conditional',
+    'hist_type_prob': 'categorical',
+    'ass_in_situ_prob': 'categorical',
+    't1_ib_prob': 'probability',
+    't0_n1_iia_prob': 'probability',
+    't1_n1_iia_prob': 'probability',
+    't2_n1_iib_prob': 'probability',
+    't3_n1_iiia_prob': 'probability',
+    't_category_iiia_prob': 'categorical',
+    'n_category_iiib_prob': 'categorical',
+    't_category_iiic_prob': 'categorical',
+    't_category_iv_prob': 'categorical',
+    'n_category_iv_prob': 'categorical',
+    'days_to_radio': 'integer_range',
+    'radio_days_mean': 'number',
+    'radio_days_std': 'std',
+    'radio_days_range': 'integer_range',
+    'radio_gy_mean': 'number',
+    'radio_gy_std': 'std',
+    'radio_gy_range': 'range',
+    'commorbidities_prob': 'probabilities',
+    'smoker_or_ex_prob': 'categorical',
+    'oral_drug_prob': 'probabilities',
+    'family_prob': 'probabilities'
+}
+_INTEGER_VALUES = ('abort_prob', 'caesarean_prob')  # the values of these distributions are numbers
+_TOLERANCE = 1e-3  # tolerated deviation of the sum of the probabilities of a categorical distribution from 1
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_probabilities(name: str, probs, categories: list, total: bool) -> None:
+    if not isinstance(probs, dict) or set(probs) != set(categories):
+        raise ValueError(name + ': the values must be ' + ', '.join(categories))
+    for value, prob in probs.items():
+        if not _is_number(prob) or not 0.0 <= prob <= 1.0:
+            raise ValueError(name + ': the probability of ' + value + ' is not a number in [0, 1]')
+    if total and abs(sum(probs.values()) - 1.0) > _TOLERANCE:
+        raise ValueError(name + ': the probabilities sum up to ' + str(sum(probs.values())) + ' instead of 1')
+
+
+def validate(params: dict, default: dict) -> None:
+    """Raises a ValueError if a parameter is unknown or does not match its kind and the categories of `default`."""
+    unknown = set(params) - set(SCHEMA)
+    if unknown:
+        raise ValueError('unknown parameters: ' + ', '.join(sorted(unknown)))
+    for name, value in params.items():
+        kind = SCHEMA[name]
+        if kind == 'number' and not _is_number(value):
+            raise ValueError(name + ': not a number')
+        if kind == 'std' and (not _is_number(value) or value < 0):
+            raise ValueError(name + ': not a non-negative number')
+        if kind == 'count' and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError(name + ': not a non-negative integer')
+        if kind == 'probability' and (not _is_number(value) or not 0.0 <= value <= 1.0):
+            raise ValueError(name + ': not a number in [0, 1]')
+        if kind == 'range' and (not isinstance(value, list) or len(value) != 2 or not all(map(_is_number, value))
+                                or value[0] > value[1]):
+            raise ValueError(name + ': not a range [low, high]')
+        if kind == 'integer_range' and (not isinstance(value, list) or len(value) != 2 or not all(map(_is_integer, value))
+                                        or value[0] >= value[1]):
+            raise ValueError(name + ': not a range [low, high) of integers with low < high')
+        if kind in ('categorical', 'probabilities'):
+            _check_probabilities(name, value, list(default[name]), kind == 'categorical')
+        if kind == 'conditional':
+            if not isinstance(value, dict) or set(value) != set(default[name]):
+                raise ValueError(name + ': the parents must be ' + ', '.join(default[name]))
+            for parent, probs in value.items():
+                if not isinstance(probs, dict) or not set(probs) <= set(default['stage_dx_prob']):
+                    raise ValueError(name + ': the values of ' + parent + ' must be stages')
+                _check_probabilities(name + ' of ' + parent, probs, list(probs), True)
+        if kind == 'per_tumor_type':
+            if not isinstance(value, dict) or set(value) != set(default[name]) or not all(map(_is_number, value.values())):
+                raise ValueError(name + ': a number is needed for each of ' + ', '.join(default[name]))
+    merged = {**default, **params}
+    if merged['max_cycles_adjuvant'] <= 3:  # the number of adjuvant cycles is drawn from [3, max_cycles_adjuvant)
+        raise ValueError('max_cycles_adjuvant must be more than 3')
+    if merged['t0_n1_iia_prob'] + merged['t1_n1_iia_prob'] > 1.0:
+        raise ValueError('t0_n1_iia_prob and t1_n1_iia_prob sum up to more than 1')
+    if not all(0.0 <= prob <= 1.0 for prob in merged['death_prob'].values()):
+        raise ValueError('death_prob: the probabilities must be in [0, 1]')
+
+
+def compile_profile(params: dict, default: dict) -> dict:
+    """
+    Returns the parameters of the profile, with the defaults for the ones not given, and the samplers of the
+    categorical distributions, i.e., `<name>_dist` for each `<name>_prob`. The categories are ordered as in the
+    default profile, i.e., the samplers do not depend on the order in which a profile lists them.
+    """
+    compiled = {}
+    for name, kind in SCHEMA.items():
+        value = params.get(name, default[name])
+        if kind in ('range', 'integer_range'):
+            value = tuple(value)
+        elif kind in ('categorical', 'probabilities', 'per_tumor_type'):
+            value = {category: value[category] for category in default[name]}
+        elif kind == 'conditional':
+            value = {parent: value[parent] for parent in default[name]}
+        if name in _INTEGER_VALUES:
+            value = {int(category): prob for category, prob in value.items()}
+        compiled[name] = value
+        if kind == 'categorical':
+            compiled[name[:-len('_prob')] + '_dist'] = Categorical(value)
+        elif kind == 'conditional':
+            compiled[name[:-len('_prob')] + '_dist'] = ConditionalCategorical(value)
+    return compiled
+
+
+def _str_keys(value):
+    """The values of the distributions are strings, as in JSON, even if YAML reads them as numbers."""
+    if isinstance(value, dict):
+        return {str(key): _str_keys(item) for key, item in value.items()}
+    return value
+
+
+def _parse(content: bytes, path: str) -> dict:
+    if path.endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ImportError('YAML profiles require the package PyYAML')
+        params = yaml.safe_load(content)
+    else:
+        params = json.loads(content)
+    if not isinstance(params, dict):
+        raise ValueError('the profile must map the names of the parameters to their values')
+    return _str_keys(params)
+
+
+def load_profile(path: str = None, cache_dir: str = CACHE_DIR) -> dict:
+    """
+    Returns the compiled profile in `path` (JSON, or YAML if the file ends with .yaml or .yml); the default profile
+    if `path` is None. The compiled profile is taken from `cache_dir` if it was compiled before; the cache is
+    skipped if it cannot be written. The hash of the profile is given as `profile_hash`.
+    """
+    with open(DEFAULT, 'rb') as fp:
+        default_content = fp.read()
+    content = default_content
+    if path is not None:
+        with open(path, 'rb') as fp:
+            content = fp.read()
+    key = hashlib.sha256(b'\0'.join([_VERSION, default_content, os.path.splitext(path or DEFAULT)[1].encode(),
+                                     content])).hexdigest()
+    cache_path = os.path.join(cache_dir, key + '.pickle')
+    try:
+        with open(cache_path, 'rb') as fp:
+            return pickle.load(fp)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    default = _parse(default_content, DEFAULT)
+    params = default if path is None else _parse(content, path)
+    try:
+        validate(params, default)
+    except ValueError as e:
+        raise ValueError('invalid profile ' + (path or DEFAULT) + ': ' + str(e)) from None
+    compiled = compile_profile(params, default)
+    compiled['profile_hash'] = key
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=cache_dir, delete=False) as fp:
+            pickle.dump(compiled, fp)
+        os.replace(fp.name, cache_path)  # other processes never see an incomplete file
+    except OSError:
+        pass
+    return compiled
@@ -0,0 +1,462 @@
+"""
+RDF
+
+Creates the RDF version of the tables held in memory, i.e., without a MySQL database.
+The SQL queries of the mapping are evaluated in Python. `NTriplesSerializer` compiles the mapping
+and creates the triples directly from the results; `Semantifier` stores the results as CSV files
+and executes the SDM-RDFizer with a copy of the mapping that reads from these files. Both create
+the same triples. This is done chunk by chunk, so that only one chunk of patients is kept in memory.
+"""
+import csv
+import os
+import re
+import tempfile
+import urllib.parse
+
+import rdflib
+
+from writers import truncate
+
+ENTITY = 'http://research.tib.eu/paladin/entity/'
+
+_LOGICAL_SOURCE = re.compile(r'rml:source <#DB_source>;(\s*)rml:query "(.*?)";')
+_TEMPLATE_REFERENCE = re.compile(r'{(.+?)}')
+_DECIMAL = re.compile(r'^-?\d+(?:\.\d+)$')
+_BLANK = re.compile(r'^[\s|\t]*$')
+_UNSAFE = re.compile(r'[^\w.\-~#/:]', re.ASCII)  # characters encoded in the IRIs created from templates
+_NULL = ('nan', 'N/A', 'None')  # values treated as missing by the SDM-RDFizer
+_RR = rdflib.Namespace('http://www.w3.org/ns/r2rml#')
+_RML = rdflib.Namespace('http://semweb.mmlab.be/ns/rml#')
+_PATIENT_SUBJECT = re.compile('<' + re.escape(ENTITY) + r'(?:BC_HUPHM_(\d+)[_>]|(\d+)_)')  # all IRIs of a patient contain its EHR
+_TAIL_BLOCK_SIZE = 64 * 1024  # block size used to read the shared triples at the end of an N-Triples file
+
+_COMORBIDITY = {
+    'smoker': '', 'ex-smoker': '', 'hta': 'HTA', 'cardiac insufficiency': 'Heart_failure',
+    'dislipemia': 'Hypercholesterolemia', 'thyroid disease': 'Thyroid_diseases',
+    'musculoskeletal disease': 'Musculoskeletal_diseases', 'renal disease': 'renal_disease_uncharacterized',
+    'gastrointestinal disease': 'Gastrointestinal', 'psychiatric disorder': 'Mental_disorder',
+    'insomnia': 'Sleeplessness', 'liver disease': 'Liver_diseases', 'autoimmune disease': 'Autoimmune_diseases',
+    'lung disease': 'Lung_diseases', 'transplant': 'Transplantation'
+}
+_SMOKING_HABIT = {'smoker': 'CurrentSmoker', 'ex-smoker': 'PreviousSmoker'}
+
+
+def to_uri(a):
+    """Python version of the SQL function `to_uri`."""
+    if a is None or a == '':
+        return None
+    return ENTITY + (a[:1].upper() + a[1:]).replace(' ', '_')
+
+
+def to_bool_uri(a):
+    """Python version of the SQL function `to_bool_uri`."""
+    return to_uri('Yes' if a == 1 else 'No')
+
+
+def cap_first(value: str) -> str:
+    """Python version of the SQL function `CAP_FIRST`."""
+    return ' '.join(word[:1].upper() + word[1:] for word in value.lower().split(' '))
+
+
+def split_str(value: str, delim: str, pos: int) -> str:
+    """Python version of the SQL function `SPLIT_STR`."""
+    parts = value.split(delim)
+    return cap_first(parts[pos - 1]) if pos <= len(parts) else ''
+
+
+def _records(table):
+    columns = list(table.columns)
+    for row in table.rows():
+        yield dict(zip(columns, row))
+
+
+def _columns(table, *extra) -> list:
+    return list(table.columns) + list(extra)
+
+
+def _oral_drug(tables):
+    # the URIs are created once per row of the dimension table instead of once per row of the patients
+    uris = {drug: (to_uri(drug), to_uri(drug_type)) for drug, drug_type in tables['oral_drug_type'].rows()}
+    for row in _records(tables['oral_drug']):
+        drug, drug_type = uris[row['drug']]
+        yield {'ehr': row['ehr'], 'drug': drug, 'drug_type': drug_type}
+
+
+def _family_history(tables):
+    descriptions = {cui: to_uri(description) for cui, description in tables['cui_description'].rows()}
+    for row in _records(tables['family_history']):
+        if row['cancer_cui'] in descriptions:
+            yield {'ehr': row['ehr'], 'cancer_cui': row['cancer_cui'], 'description': descriptions[row['cancer_cui']]}
+
+
+def _radiotherapy(tables):
+    yield from _records(tables['radiotherapy'])
+
+
+def _surgery(tables):
+    for row in _records(tables['surgery']):
+        row['surgery_uri'] = to_uri(row['surgery'])
+        yield row
+
+
+def _comorbidity(tables):
+    for row in _records(tables['comorbidity']):
+        comorbidity = row['comorbidity']
+        yield {
+            'ehr': row['ehr'],
+            'comorbidity_orig': comorbidity,
+            'negated_orig': row['negated'],
+            'comorbidity': to_uri(_COMORBIDITY.get(comorbidity, comorbidity)),
+            'smokingHabit': to_uri(_SMOKING_HABIT.get(comorbidity, '')),
+            'negated': to_uri('NoComorbidity' if row['negated'] is not None and int(row['negated']) == 0 else 'WithComorbidity')
+        }
+
+
+def _tumor_grade(tables):
+    for row in _records(tables['tumor_grade']):
+        yield {'ehr': row['ehr'], 'grade': row['grade']}
+
+
+def _tumor_tnm(tables):
+    patients = {row['ehr']: row for row in _records(tables['patient'])}
+
+    def category(prefix, value):
+        if value is None:
+            return None
+        return to_uri('In_Situ' if prefix == 't' and value == 'IS' else prefix + value)
+
+    for row in _records(tables['tumor_tnm']):
+        patient = patients.get(row['ehr'])
+        if patient is None:
+            continue
+        neoadjuvant = patient['neoadjuvant']
+        row['diagnosis_date'] = patient['diagnosis_date']
+        row['neoadjuvant_derived_date'] = None if neoadjuvant is not None and 'no' in neoadjuvant.lower() else patient['first_treatment_date']
+        row['neoadjuvant'] = neoadjuvant
+        row['url_diag_tumor_size'] = category('t', row['t_category'])
+        row['url_diag_lymph_nodes'] = category('n', row['n_category'])
+        row['url_diag_metastatis'] = category('m', row['m_category'])
+        row['url_neoadj_tumor_size'] = category('t', row['t_category_after_neoadj'])
+        row['url_neoadj_lymph_nodes'] = category('n', row['n_category_after_neoadj'])
+        row['url_neoadj_metastatis'] = category('m', row['m_category_after_neoadj'])
+        yield row
+
+
+def _patient(tables):
+    for row in _records(tables['patient']):
+        row['neoadjuvant_uri'] = to_uri(row['neoadjuvant'])
+        row['er_positive_uri'] = to_bool_uri(row['er_positive'])
+        row['pr_positive_uri'] = to_bool_uri(row['pr_positive'])
+        row['her2_overall_positive_uri'] = to_bool_uri(row['her2_overall_positive'])
+        yield row
+
+
+def _chemoterapy_cycle(tables):
+    schemas = dict(tables['chemoterapy_schema'].rows())
+    for row in _records(tables['chemoterapy_cycle']):
+        name = schemas.get(row['id_schema'])
+        if name is None:
+            continue
+        yield {
+            'ehr': row['ehr'],
+            'date': row['date'],
+            'cycle_number': row['cycle_number'],
+            'id_schema': row['id_schema'],
+            'drug1': split_str(name, ' + ', 1),
+            'drug2': split_str(name, ' + ', 2),
+            'drug3': split_str(name, ' + ', 3),
+            'drug4': split_str(name, ' + ', 4),
+            'uri_schema': to_uri(cap_first(name).replace(' + ', '_'))
+        }
+
+
+# the queries of the mapping are identified by the table in their FROM clause
+_VIEWS = {
+    'oral_drug': (_oral_drug, lambda tables: ['ehr', 'drug', 'drug_type']),
+    'family_history': (_family_history, lambda tables: ['ehr', 'cancer_cui', 'description']),
+    'radiotherapy': (_radiotherapy, lambda tables: _columns(tables['radiotherapy'])),
+    'surgery': (_surgery, lambda tables: _columns(tables['surgery'], 'surgery_uri')),
+    'comorbidity': (_comorbidity, lambda tables: ['ehr', 'comorbidity_orig', 'negated_orig', 'comorbidity', 'smokingHabit', 'negated']),
+    'tumor_grade': (_tumor_grade, lambda tables: ['ehr', 'grade']),
+    'tumor_tnm': (_tumor_tnm, lambda tables: _columns(tables['tumor_tnm'], 'diagnosis_date', 'neoadjuvant_derived_date', 'neoadjuvant',
+                                                      'url_diag_tumor_size', 'url_diag_lymph_nodes', 'url_diag_metastatis',
+                                                      'url_neoadj_tumor_size', 'url_neoadj_lymph_nodes', 'url_neoadj_metastatis')),
+    'patient': (_patient, lambda tables: _columns(tables['patient'], 'neoadjuvant_uri', 'er_positive_uri', 'pr_positive_uri', 'her2_overall_positive_uri')),
+    'chemoterapy_cycle': (_chemoterapy_cycle, lambda tables: ['ehr', 'date', 'cycle_number', 'id_schema', 'drug1', 'drug2', 'drug3', 'drug4', 'uri_schema'])
+}
+
+
+def _view_name(query: str) -> str:
+    return re.search(r' FROM (\w+)', query).group(1)
+
+
+def _write_view(tables: dict, view: str, path: str) -> None:
+    rows, columns = _VIEWS[view]
+    with open(path, 'w', encoding='utf8') as fp:
+        csv_file = csv.DictWriter(fp, fieldnames=columns(tables), lineterminator='\n')
+        csv_file.writeheader()
+        csv_file.writerows(rows(tables))
+
+
+class Semantifier:
+    """Transforms chunks of patients into RDF using the SDM-RDFizer and a copy of the mapping reading CSV files."""
+
+    def __init__(self, mapping: str = 'mapping.ttl'):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.views = []
+
+        with open(mapping, 'r', encoding='utf8') as f:
+            mapping_str = f.read()
+
+        def csv_source(match):
+            view = _view_name(match.group(2))
+            if view not in self.views:
+                self.views.append(view)
+            return 'rml:source "' + self._view_path(view) + '";' + match.group(1) + 'rml:referenceFormulation ql:CSV;'
+
+        with open(os.path.join(self.tmp_dir.name, 'mapping.ttl'), 'w', encoding='utf8') as f:
+            f.write(_LOGICAL_SOURCE.sub(csv_source, mapping_str))
+
+    def _view_path(self, view: str) -> str:
+        return os.path.join(self.tmp_dir.name, view + '.csv')
+
+    def semantify(self, tables: dict) -> str:
+        """Returns the N-Triples of the patients currently held in the buffers."""
+        from rdfizer import semantify  # imports pandas; only loaded if this engine is used
+
+        for view in self.views:
+            _write_view(tables, view, self._view_path(view))
+
+        semantify({
+            'default': {
+                'main_directory': self.tmp_dir.name
+            },
+            'datasets': {
+                'number_of_datasets': 1,
+                'output_folder': self.tmp_dir.name,
+                'all_in_one_file': 'no',  # only this mode reads all CSV values as strings
+                'remove_duplicate': 'yes',
+                'name': 'chunk',
+                'enrichment': 'yes',
+                'large_file': 'no',
+                'ordered': 'yes'
+            },
+            'dataset1': {
+                'name': 'chunk',
+                'mapping': '${default:main_directory}/mapping.ttl'
+            }
+        })
+
+        with open(os.path.join(self.tmp_dir.name, 'chunk.nt'), 'r', encoding='utf8') as f:
+            return _sort_triples(f)
+
+
+def _sort_triples(triples) -> str:
+    """Orders the triples by the EHR of their subject, so that the order does not depend on the chunks."""
+    keyed = []
+    for triple in triples:
+        match = _PATIENT_SUBJECT.match(triple)
+        keyed.append((int(match.group(1) or match.group(2)) if match is not None else 0, triple))
+    keyed.sort()
+    return ''.join(triple for _, triple in keyed)
+
+
+def _cell(value) -> str:
+    """The value as it is read back from the CSV file of a view."""
+    return '' if value is None else str(value)
+
+
+def _is_null(value: str) -> bool:
+    return value in _NULL or _BLANK.search(value) is not None
+
+
+def _template(template: str):
+    """Compiles an `rr:template` into a function returning the IRI for a row, or None if a value is missing."""
+    parts = []
+    pos = 0
+    for match in _TEMPLATE_REFERENCE.finditer(template):
+        parts.append((template[pos:match.start()], match.group(1)))
+        pos = match.end()
+    suffix = template[pos:]
+
+    def iri(row: dict):
+        result = ''
+        for text, column in parts:
+            value = row[column]
+            if _is_null(value):
+                return None
+            if _DECIMAL.match(value) is not None:
+                value = repr(float(value))
+            result += text
+            if 'http' not in value and 'http' in result and _UNSAFE.search(value) is not None:
+                value = urllib.parse.quote(value, safe='~#/:')
+            result += value.strip()
+        return '<' + result + suffix + '>'
+    return iri
+
+
+def _reference(column: str, datatype: str = None, iri: bool = False):
+    """Compiles an `rml:reference` into a function returning the IRI or literal for a row, or None if the value is missing."""
+    suffix = '' if datatype is None else '^^<' + datatype + '>'
+
+    def term(row: dict):
+        value = row[column]
+        if _is_null(value):
+            return None
+        if iri:
+            return '<' + value.strip() + '>'
+        return '"' + value.strip().replace('"', "'") + '"' + suffix
+    return term
+
+
+def _constant(value: str):
+    return lambda row: value
+
+
+class _TriplesMap:
+    """A triples map of the mapping compiled into functions creating the terms of the triples from a row of its view."""
+
+    def __init__(self, graph: rdflib.Graph, node):
+        self.node = node
+        self.view = _view_name(str(graph.value(graph.value(node, _RML.logicalSource), _RML.query)))
+        subject_map = graph.value(node, _RR.subjectMap)
+        if graph.value(subject_map, _RR.template) is not None:
+            self.subject = _template(str(graph.value(subject_map, _RR.template)))
+        else:
+            self.subject = _reference(str(graph.value(subject_map, _RML.reference)), iri=True)
+        self.classes = [' <' + str(rdflib.RDF.type) + '> <' + str(c) + '>.\n' for c in graph.objects(subject_map, _RR['class'])]
+        self.predicate_objects = []  # (predicate, object map node)
+        for predicate_object_map in graph.objects(node, _RR.predicateObjectMap):
+            self.predicate_objects.append(('<' + str(graph.value(predicate_object_map, _RR.predicate)) + '>',
+                                           graph.value(predicate_object_map, _RR.objectMap)))
+
+    def compile(self, graph: rdflib.Graph, triples_maps: dict) -> None:
+        """Compiles the object maps; references to other triples maps use the subject of the parent for the same row."""
+        objects = []
+        for predicate, object_map in self.predicate_objects:
+            datatype = graph.value(object_map, _RR.datatype)
+            term_type = graph.value(object_map, _RR.termType)
+            if graph.value(object_map, _RR.parentTriplesMap) is not None:
+                parent = triples_maps.get(graph.value(object_map, _RR.parentTriplesMap))
+                if parent is None:
+                    continue  # the mapping refers to a triples map that does not exist
+                if parent.view != self.view:
+                    raise ValueError('joins of different logical sources are not supported: ' + str(parent.node))
+                term = parent.subject
+            elif graph.value(object_map, _RR.constant) is not None:
+                constant = graph.value(object_map, _RR.constant)
+                term = _constant('"' + str(constant) + '"' if isinstance(constant, rdflib.Literal) else '<' + str(constant) + '>')
+            elif graph.value(object_map, _RR.template) is not None:
+                term = _template(str(graph.value(object_map, _RR.template)))
+            elif graph.value(object_map, _RML.reference) is not None:
+                term = _reference(str(graph.value(object_map, _RML.reference)),
+                                  None if datatype is None else str(datatype), term_type == _RR.IRI)
+            else:
+                continue  # e.g., references to function maps not defined in the mapping
+            objects.append((predicate, term))
+        self.predicate_objects = objects
+
+    def triples(self, row: dict, triples: set) -> None:
+        subject = self.subject(row)
+        if subject is None:
+            return
+        for c in self.classes:
+            triples.add(subject + c)
+        for predicate, term in self.predicate_objects:
+            value = term(row)
+            if value is not None:
+                triples.add(subject + ' ' + predicate + ' ' + value + '.\n')
+
+
+class NTriplesSerializer:
+    """
+    Transforms chunks of patients into RDF without the SDM-RDFizer. The triples maps of the mapping are compiled
+    once into templates of the terms, which are filled directly from the rows of the views. The triples are the
+    same as the ones created by `Semantifier`.
+    """
+
+    def __init__(self, mapping: str = 'mapping.ttl'):
+        graph = rdflib.Graph()
+        graph.parse(mapping, format='turtle')
+        triples_maps = {node: _TriplesMap(graph, node) for node in graph.subjects(_RML.logicalSource, None)}
+        self.views = {}
+        for triples_map in triples_maps.values():
+            triples_map.compile(graph, triples_maps)
+            self.views.setdefault(triples_map.view, []).append(triples_map)
+
+    def semantify(self, tables: dict) -> str:
+        """Returns the N-Triples of the patients currently held in the buffers."""
+        triples = set()
+        for view, triples_maps in self.views.items():
+            rows, columns = _VIEWS[view]
+            for row in rows(tables):
+                row = {column: _cell(value) for column, value in row.items()}
+                for triples_map in triples_maps:
+                    triples_map.triples(row, triples)
+        return _sort_triples(sorted(triples))
+
+
+def _shared_offset(fp) -> int:
+    """
+    Offset of the triples about shared entities at the end of a file written by `RDFWriter`, i.e., of the line
+    after the last triple of a patient. The file is read backwards, so only the shared triples are read.
+    """
+    position = fp.seek(0, os.SEEK_END)
+    tail = b''
+    while position > 0:
+        step = min(_TAIL_BLOCK_SIZE, position)
+        position -= step
+        fp.seek(position)
+        tail = fp.read(step) + tail
+        lines = tail.splitlines(keepends=True)
+        if position > 0:
+            lines = lines[1:]  # may be incomplete; it is read again with the next block
+        end = position + len(tail)
+        for line in reversed(lines):
+            if _PATIENT_SUBJECT.match(line.decode('utf8')) is not None:
+                return end
+            end -= len(line)
+    return 0
+
+
+class RDFWriter:
+    """
+    Writes the N-Triples of the chunks of patients to `output_folder/name.nt`.
+    Triples about entities shared by all patients, e.g., drugs or stages, are written once at the end.
+    With `append`, the triples of the patients are added to a file written before; its shared triples are
+    merged with the new ones, so the file is the same as if all patients had been written at once.
+    With `resume`, the state returned by `checkpoint`, the file is truncated to the triples written before the
+    checkpoint and the shared triples collected until then are restored.
+    """
+
+    def __init__(self, output_folder: str, name: str, append: bool = False, resume: dict = None):
+        self.shared_triples = set()
+        path = os.path.join(output_folder, name + '.nt')
+        if resume is not None:
+            truncate(path, resume['size'])
+            self.shared_triples.update(resume['shared_triples'])
+            append = False
+        elif append:
+            with open(path, 'r+b') as fp:
+                offset = _shared_offset(fp)
+                fp.seek(offset)
+                self.shared_triples.update(fp.read().decode('utf8').splitlines(keepends=True))
+                fp.truncate(offset)
+        self.fp = open(path, 'a' if append or resume is not None else 'w', encoding='utf8')
+
+    def write(self, triples: str) -> None:
+        """Appends the triples of one chunk of patients."""
+        for triple in triples.splitlines(keepends=True):
+            if _PATIENT_SUBJECT.match(triple) is None:
+                self.shared_triples.add(triple)
+            else:
+                self.fp.write(triple)
+
+    def checkpoint(self) -> dict:
+        """Writes the triples of the patients received so far; returns the size of the file and the shared triples."""
+        self.fp.flush()
+        return {'size': self.fp.tell(), 'shared_triples': sorted(self.shared_triples)}
+
+    def close(self) -> None:
+        self.fp.writelines(sorted(self.shared_triples))
+        self.fp.close()
@@ -0,0 +1,74 @@
+"""
+Records
+
+Patient records, i.e., the row of a patient with the rows of all the other patient tables attached, e.g., her
+chemotherapy cycles and comorbidities. The records are yielded one after the other as soon as the batch of the
+patient is generated, so that the first patients of a cohort can be inspected, or consumed by another tool,
+without waiting for the whole run. Since the data of a patient only depends on the seed and its EHR, the first K
+records are the first K patients of the full data set generated with the same seed.
+
+The records are written as newline-delimited JSON (NDJSON), one patient per line; writing to a pipe blocks while
+the consumer is behind, which also holds back the generation.
+"""
+import collections
+import json
+
+import numpy as np
+
+from batch import generate_batch
+from shards import generate_batches
+from tables import append_batch, clear_patients, read_structure
+
+
+def batch_records(tables: dict, batch: dict):
+    """
+    Yields the records of the patients of a batch generated by `generate_batch`, using the buffers `tables`.
+    The values are the ones of the rows of the tables (see `TableBuffer.rows`), e.g., dates are ISO strings.
+    """
+    append_batch(tables, batch)
+    children = {}
+    for name, table in tables.items():
+        if table.static or name == 'patient':
+            continue
+        children[name] = collections.defaultdict(list)
+        for row in table.rows():
+            row = dict(zip(table.columns, row))
+            children[name][int(row['ehr'])].append(row)  # comorbidity.ehr is a varchar
+    patients = [dict(zip(tables['patient'].columns, row)) for row in tables['patient'].rows()]
+    clear_patients(tables)
+    for patient in patients:
+        patient.update({name: rows.get(patient['ehr'], []) for name, rows in children.items()})
+        yield patient
+
+
+def generate_records(n_patients: int, batch_size: int, error_prob: float, workers: int = 1, seed: int = None,
+                     rates: dict = None, first_ehr: int = 1, first_batch_size: int = 16, cohort=None):
+    """
+    Yields the records of the patients `first_ehr`, ..., `first_ehr + n_patients - 1`, in the order of the EHRs.
+    The first batch has `first_batch_size` patients and the size doubles up to `batch_size`, so that the first
+    records are yielded right away; the data does not depend on the sizes of the batches. `cohort` holds the strata of
+    the patients (see `strata.Cohort`).
+    """
+    tables = read_structure()
+    seed = np.random.SeedSequence(seed).entropy  # the same seed for all the batches if none is given
+    end = first_ehr + n_patients
+    size = min(first_batch_size, batch_size)
+    while first_ehr < end and size < batch_size:
+        yield from batch_records(tables, generate_batch(first_ehr, min(size, end - first_ehr), error_prob, seed=seed,
+                                                        rates=rates, cohort=cohort))
+        first_ehr += size
+        size *= 2
+    if first_ehr < end:
+        for batch in generate_batches(end - first_ehr, batch_size, batch_size, error_prob, workers=workers, seed=seed,
+                                      rates=rates, first_ehr=first_ehr, cohort=cohort):
+            yield from batch_records(tables, batch)
+
+
+def write_ndjson(records, fp) -> int:
+    """Writes the records to `fp` as JSON lines, each one flushed right away; returns the number of records."""
+    count = 0
+    for record in records:
+        fp.write(json.dumps(record) + '\n')
+        fp.flush()
+        count += 1
+    return count
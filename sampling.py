@@ -0,0 +1,67 @@
+"""
+Sampling
+
+Categorical distributions compiled from the probability tables of a profile (see `profiles`). Values are drawn
+by inverse transform sampling, i.e., a binary search of uniform random numbers in the cumulative probabilities,
+either one at a time or for whole arrays of random numbers at once.
+"""
+import numpy as np
+
+
+class Categorical:
+    """Categorical distribution given as a dictionary from value to probability."""
+
+    def __init__(self, probs: dict):
+        self.values = list(probs.keys())
+        self.keys = np.array(self.values)
+        self.cdf = np.cumsum(list(probs.values()))
+
+    def index(self, r: np.ndarray) -> np.ndarray:
+        """Indices of the values corresponding to the uniform random numbers `r`."""
+        return np.minimum(np.searchsorted(self.cdf, r, side='right'), len(self.cdf) - 1)
+
+    def sample(self, r: np.ndarray) -> np.ndarray:
+        """Values corresponding to the uniform random numbers `r`."""
+        return self.keys[self.index(r)]
+
+    def draw(self):
+        """Draws a single value using the global NumPy random number generator."""
+        return self.values[int(self.index(np.random.rand()))]
+
+
+class ConditionalCategorical:
+    """
+    Conditional categorical distribution given as a dictionary from the value of the parent to the
+    distribution of the child. Values can be drawn for a whole array of parents at once.
+    """
+
+    def __init__(self, probs: dict):
+        self.distributions = {parent: Categorical(child_probs) for parent, child_probs in probs.items()}
+        self.parents = np.array(list(probs.keys()))
+        self.order = np.argsort(self.parents)
+        width = max(len(dist.cdf) for dist in self.distributions.values())
+
+        # one row of values and cumulative probabilities per parent, padded to the same width
+        self.sizes = np.array([len(dist.cdf) for dist in self.distributions.values()])
+        self.keys = np.array([dist.values + [dist.values[-1]] * (width - len(dist.values))
+                              for dist in self.distributions.values()])
+        self.cdf = np.array([np.pad(dist.cdf, (0, width - len(dist.cdf)), constant_values=np.inf)
+                             for dist in self.distributions.values()])
+
+    def parent_index(self, parents: np.ndarray) -> np.ndarray:
+        """Rows of the given parents in the table."""
+        return self.order[np.searchsorted(self.parents[self.order], parents)]
+
+    def index(self, p: np.ndarray, r: np.ndarray) -> np.ndarray:
+        """Indices of the children in the rows `p` of the table corresponding to the uniform random numbers `r`."""
+        idx = (self.cdf[p] <= np.asarray(r)[:, None]).sum(axis=1)  # same as searchsorted(side='right') per row
+        return np.minimum(idx, self.sizes[p] - 1)
+
+    def sample(self, parents: np.ndarray, r: np.ndarray) -> np.ndarray:
+        """Values of the children of the given parents corresponding to the uniform random numbers `r`."""
+        p = self.parent_index(parents)
+        return self.keys[p, self.index(p, r)]
+
+    def draw(self, parent):
+        """Draws a single value for the given parent using the global NumPy random number generator."""
+        return self.distributions[parent].draw()
@@ -0,0 +1,218 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Service
+
+Keeps the generator running, so that many small cohorts can be generated on demand, e.g., by test suites, without
+paying the start-up cost of each run. The modules are imported, the tables are read from `table_structure.sql`,
+and the mapping is compiled once when the service starts; a cohort of one patient is generated to warm up all
+code paths. The cohorts are generated without a database, like with `SDG.py --no-db`.
+
+A cohort is requested with a JSON object holding the parameters of the run; all but `n` are optional:
+
+    {"n": 100, "p": 0.1, "seed": 42, "formats": ["sql", "csv"], "rates": {"death_date": 0.2}, "output": "/data/c1"}
+
+With `strata`, the first patients are drawn from the given strata, e.g., `[{"count": 50, "tumor_type": ["NN"],
+"stage": ["IIIA", "IIIB", "IIIC", "IV"], "death": true}]`; see `strata.Stratum`.
+
+The formats are `sql`, `csv`, `rdf`, and `parquet` (default: sql, csv, and rdf); `sql_compression` and
+`csv_compression` select the compression of the files. With `output`, the files are written to this folder and
+the report of the run is returned. Otherwise, the files are sent back as an uncompressed tar archive.
+
+The requests are served one after the other, either over HTTP (POST /generate) or, with `--stdio`, read from
+stdin as JSON lines, in which case `output` is required and the reports are written to stdout as JSON lines.
+"""
+import argparse
+import http.server
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+
+import numpy as np
+
+from distributions import profile_hash
+from metrics import Metrics, process_seconds
+from mutations import mutation_rates
+from output import FORMATS, open_writers, write_chunks
+from shards import generate_chunks
+from strata import Cohort, Stratum
+from tables import read_structure
+from writers import COMPRESSIONS
+
+
+def parse_request(request: dict) -> dict:
+    """Validates the parameters of a request and fills in the defaults; raises a ValueError if they are invalid."""
+    if not isinstance(request, dict):
+        raise ValueError('the request must be a JSON object')
+    unknown = set(request) - {'n', 'p', 'seed', 'formats', 'rates', 'output', 'sql_compression', 'csv_compression',
+                                 'strata'}
+    if unknown:
+        raise ValueError('unknown parameters: ' + ', '.join(sorted(unknown)))
+    n = request.get('n')
+    if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+        raise ValueError('n must be a positive integer')
+    p = request.get('p', 0.0)
+    if not isinstance(p, (int, float)) or isinstance(p, bool) or not 0.0 <= p <= 1.0:
+        raise ValueError('p must be a number in [0.0, 1.0]')
+    seed = request.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError('seed must be a non-negative integer')
+    formats = request.get('formats', ['sql', 'csv', 'rdf'])
+    if not isinstance(formats, list) or not formats or not set(formats) <= set(FORMATS):
+        raise ValueError('formats must be a non-empty list of ' + ', '.join(FORMATS))
+    rates = request.get('rates', {})
+    if not isinstance(rates, dict) or not all(isinstance(rate, (int, float)) for rate in rates.values()):
+        raise ValueError('rates must be an object mapping fields to mutation rates')
+    mutation_rates(p, rates)
+    strata = request.get('strata', [])
+    if not isinstance(strata, list):
+        raise ValueError('strata must be a list of objects')
+    strata = [Stratum.from_dict(stratum) for stratum in strata]
+    if sum(stratum.count for stratum in strata) > n:
+        raise ValueError('the strata have more than n patients')
+    for key in ('sql_compression', 'csv_compression'):
+        if request.get(key, 'none') not in COMPRESSIONS:
+            raise ValueError(key + ' must be one of ' + ', '.join(COMPRESSIONS))
+    return {
+        'n': n,
+        'p': float(p),
+        'seed': seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63),
+        'formats': tuple(f for f in FORMATS if f in formats),
+        'rates': {field: float(rate) for field, rate in rates.items()},
+        'strata': strata,
+        'output': request.get('output'),
+        'sql_compression': request.get('sql_compression', 'gzip'),
+        'csv_compression': request.get('csv_compression', 'none')
+    }
+
+
+class Service:
+    """Generates cohorts on demand; the tables and the compiled mapping are kept between the requests."""
+
+    def __init__(self, rdf_engine: str = 'native', chunk_size: int = 10000, writer_queue: int = 2):
+        self.rdf_engine = rdf_engine
+        self.chunk_size = chunk_size
+        self.writer_queue = writer_queue
+        self.tables = read_structure()
+        with tempfile.TemporaryDirectory() as folder:
+            self.generate(parse_request({'n': 1, 'seed': 0, 'formats': list(FORMATS)}), folder)
+        self.startup_seconds = process_seconds()  # including the imports and the warm-up
+
+    def generate(self, request: dict, folder: str) -> dict:
+        """Generates the cohort of a request parsed by `parse_request` into `folder`; returns the report of the run."""
+        metrics = Metrics(verbose=False)
+        metrics.info.update({key: request[key] for key in ('n', 'p', 'seed', 'rates')})
+        metrics.info['formats'] = list(request['formats'])
+        cohort = Cohort(request['strata']) if request['strata'] else None
+        metrics.info['strata'] = cohort.to_list() if cohort else None
+        metrics.info['profile_hash'] = profile_hash
+        with metrics.phase('setup'):
+            writers = open_writers(self.tables, folder, request['formats'], request['sql_compression'],
+                                   request['csv_compression'], writer_queue=self.writer_queue)
+        with metrics.phase('generate_and_write'):
+            chunks = generate_chunks(request['n'], self.chunk_size, self.chunk_size, request['p'], seed=request['seed'],
+                                     rdf_engine=self.rdf_engine, formats=request['formats'], rates=request['rates'],
+                                     cohort=cohort)
+            write_chunks(chunks, writers, metrics)
+        metrics.patients = request['n']
+        metrics.write(os.path.join(folder, 'report.json'))
+        return metrics.report()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def _send_json(self, status: int, content: dict) -> None:
+        body = json.dumps(content).encode('utf8') + b'\n'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        if self.path != '/generate':
+            self._send_json(404, {'error': 'unknown path ' + self.path})
+            return
+        try:
+            request = parse_request(json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0)))))
+        except ValueError as e:  # also raised for invalid JSON
+            self._send_json(400, {'error': str(e)})
+            return
+
+        service = self.server.service
+        with tempfile.TemporaryDirectory() as folder:
+            # the cohort, and its archive, are complete before the response starts, so that errors get a 500
+            try:
+                if request['output'] is not None:
+                    os.makedirs(request['output'], exist_ok=True)
+                    report = service.generate(request, request['output'])
+                else:
+                    cohort = os.path.join(folder, 'cohort')
+                    os.makedirs(cohort)
+                    service.generate(request, cohort)
+                    with tarfile.open(os.path.join(folder, 'cohort.tar'), mode='w') as archive:
+                        for name in sorted(os.listdir(cohort)):
+                            archive.add(os.path.join(cohort, name), name)
+            except Exception as e:
+                self._send_json(500, {'error': type(e).__name__ + ': ' + str(e)})
+                return
+            if request['output'] is not None:
+                self._send_json(200, report)
+                return
+            try:
+                with open(os.path.join(folder, 'cohort.tar'), 'rb') as archive:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-tar')
+                    self.send_header('Content-Length', str(os.fstat(archive.fileno()).st_size))
+                    self.end_headers()
+                    shutil.copyfileobj(archive, self.wfile)
+            except OSError as e:  # e.g., the client disconnected; the status line is already sent
+                self.log_error('sending the cohort failed: %s', e)
+                self.close_connection = True
+
+
+def serve_stdio(service: Service) -> None:
+    """Reads one request per line from stdin and writes one report (or error) per line to stdout."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = parse_request(json.loads(line))
+            if request['output'] is None:
+                raise ValueError('output is required with --stdio')
+            os.makedirs(request['output'], exist_ok=True)
+            response = service.generate(request, request['output'])
+        except Exception as e:
+            response = {'error': type(e).__name__ + ': ' + str(e)}
+        print(json.dumps(response), flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Service generating synthetic cohorts on demand')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address the HTTP server listens on')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='Port the HTTP server listens on')
+    parser.add_argument('--stdio', action='store_true',
+                        help='Read the requests from stdin and write the reports to stdout instead of serving HTTP')
+    parser.add_argument('--rdf-engine', choices=['native', 'rdfizer'], default='native',
+                        help='How the RDF is created, see SDG.py')
+    parser.add_argument('--chunk-size', metavar='chunk_size', type=int, default=10000,
+                        help='Number of patients generated and written at once')
+    parser.add_argument('--writer-queue', metavar='chunks', type=int, default=2,
+                        help='Number of chunks queued per output format for its writer thread; 0 writes in the main thread')
+    args = parser.parse_args()
+
+    sdg_service = Service(args.rdf_engine, args.chunk_size, args.writer_queue)
+    if args.stdio:
+        print('Ready after', sdg_service.startup_seconds, 'seconds', file=sys.stderr, flush=True)
+        serve_stdio(sdg_service)
+    else:
+        server = http.server.HTTPServer((args.host, args.port), _Handler)
+        server.service = sdg_service
+        print('Ready on http://' + args.host + ':' + str(server.server_port), 'after', sdg_service.startup_seconds, 'seconds',
+              file=sys.stderr, flush=True)
+        server.serve_forever()
@@ -0,0 +1,124 @@
+"""
+Shards
+
+Splits the EHR space into shards, i.e., consecutive ranges of patients, that are generated independently.
+The random values and the comorbidity IDs of a patient are derived from the seed and its EHR, so the shards
+can be generated in parallel by several processes and the output does not depend on the size of the shards.
+The results are returned in the order of the EHRs, no matter which process generated them.
+"""
+import collections
+import multiprocessing
+import time
+
+import numpy as np
+
+from batch import generate_batch
+from rdf import NTriplesSerializer, Semantifier
+from tables import append_batch, clear_patients, read_structure
+from writers import format_csv, format_sql
+
+_worker = {}  # state of the current process
+
+
+def _shards(n_patients: int, shard_size: int, seed: int, first_ehr: int = 1):
+    seed = np.random.SeedSequence(seed).entropy  # draw a seed once if none is given
+    for ehr_start in range(first_ehr, first_ehr + n_patients, shard_size):
+        yield ehr_start, min(shard_size, first_ehr + n_patients - ehr_start), seed
+
+
+def _run(function, shards, workers: int, initializer=None, initargs=()):
+    """Applies the function to all shards using the given number of processes; the results keep the order of the shards."""
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(function, shards)
+        return
+
+    with multiprocessing.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = collections.deque()
+        for shard in shards:
+            pending.append(pool.apply_async(function, (shard,)))
+            if len(pending) >= 2 * workers:  # limit the number of shards held in memory
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _init_batches(batch_size: int, error_prob: float, rates: dict, cohort=None) -> None:
+    _worker['batch_size'] = batch_size
+    _worker['error_prob'] = error_prob
+    _worker['rates'] = rates
+    _worker['cohort'] = cohort
+
+
+def _generate_batches(shard) -> list:
+    ehr_start, n_patients, seed = shard
+    return [generate_batch(start, min(_worker['batch_size'], ehr_start + n_patients - start), error_prob=_worker['error_prob'],
+                           seed=seed, rates=_worker['rates'], cohort=_worker['cohort'])
+            for start in range(ehr_start, ehr_start + n_patients, _worker['batch_size'])]
+
+
+def generate_batches(n_patients: int, shard_size: int, batch_size: int, error_prob: float, workers: int = 1, seed: int = None,
+                     rates: dict = None, first_ehr: int = 1, cohort=None):
+    """
+    Yields the batches generated by `generate_batch` for the patients `first_ehr`, ..., `first_ehr + n_patients - 1`,
+    in the order of the EHRs. `rates` holds the mutation rates of single fields that differ from `error_prob`;
+    `cohort` holds the strata of the patients (see `strata.Cohort`).
+    """
+    for batches in _run(_generate_batches, _shards(n_patients, shard_size, seed, first_ehr), workers,
+                        _init_batches, (batch_size, error_prob, rates, cohort)):
+        yield from batches
+
+
+def _init_chunks(batch_size: int, error_prob: float, rates: dict, rdf_engine: str, formats: tuple,
+                 cohort=None) -> None:
+    _init_batches(batch_size, error_prob, rates, cohort)
+    # a long-running process, e.g., the service, keeps the tables and the compiled mapping of earlier runs
+    if 'tables' not in _worker:
+        _worker['tables'] = read_structure()
+    clear_patients(_worker['tables'])
+    if 'rdf' in formats and _worker.get('rdf_engine') != rdf_engine:
+        _worker['semantifier'] = NTriplesSerializer() if rdf_engine == 'native' else Semantifier()
+        _worker['rdf_engine'] = rdf_engine
+    _worker['formats'] = formats
+
+
+def _generate_chunk(shard) -> tuple:
+    tables = _worker['tables']
+    times = {}
+    start = time.perf_counter()
+    for batch in _generate_batches(shard):
+        append_batch(tables, batch)
+    times['generate'] = time.perf_counter() - start
+    rows = {name: len(table) for name, table in tables.items() if not table.static}
+    chunk = {}
+    steps = {'sql': ('format_sql', format_sql), 'csv': ('format_csv', format_csv)}
+    if 'parquet' in _worker['formats']:
+        from columnar import format_arrow  # pyarrow is only imported if Parquet files are written
+        steps['parquet'] = ('format_arrow', format_arrow)
+    if 'semantifier' in _worker:
+        steps['rdf'] = ('rdf', _worker['semantifier'].semantify)
+    for output_format in _worker['formats']:
+        name, function = steps[output_format]
+        start = time.perf_counter()
+        chunk[output_format] = function(tables)
+        times[name] = time.perf_counter() - start
+    clear_patients(tables)
+    return chunk, rows, times
+
+
+def generate_chunks(n_patients: int, chunk_size: int, batch_size: int, error_prob: float, workers: int = 1, seed: int = None,
+                    rdf_engine: str = 'native', formats: tuple = ('sql', 'csv', 'rdf'), rates: dict = None, first_ehr: int = 1,
+                    cohort=None):
+    """
+    Yields the formatted output of the patients `first_ehr`, ..., `first_ehr + n_patients - 1` in chunks of
+    `chunk_size` patients, in the order of the EHRs.
+    Each chunk is a tuple of the output per format, the number of rows per table, and the time in seconds spent on
+    generating and formatting the chunk, per step. The formats are `sql` (SQL statements), `csv` (CSV rows per table),
+    `rdf` (N-Triples), and `parquet` (Arrow tables). The N-Triples are created by the `NTriplesSerializer` (native)
+    or by the SDM-RDFizer (rdfizer).
+    `rates` holds the mutation rates of single fields that differ from `error_prob`; `cohort` holds the strata of the
+    patients (see `strata.Cohort`).
+    """
+    yield from _run(_generate_chunk, _shards(n_patients, chunk_size, seed, first_ehr), workers,
+                    _init_chunks, (batch_size, error_prob, rates, rdf_engine, tuple(formats), cohort))
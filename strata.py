@@ -0,0 +1,165 @@
+"""
+Strata
+
+Cohorts with a given mix of patients, e.g., 500 deceased patients with an NN tumor and 200 patients in stage IIIA
+to IV. Each stratum restricts the stratification variables, i.e., the tumor type, the stage at diagnosis, the
+death, and the neoadjuvant therapy, and holds the exact number of its patients. The strata take consecutive
+ranges of EHRs, in the order they are given; the patients after the last stratum are not restricted.
+
+The patients of a stratum are drawn directly from the distribution of the profile conditioned on the stratum:
+the tumor type and the stage are drawn together from their joint probabilities restricted to the stratum and
+renormalized, weighted by the probability of the death of the tumor type if the death is restricted. The same
+random numbers are used as for the patients that are not restricted, so no patient is rejected and the cost of
+a cohort only depends on its size.
+"""
+import numpy as np
+
+from dimensions import STAGE, TUMOR_TYPE
+from distributions import death_prob, stage_dx_dist, tumor_type_dist
+
+VARIABLES = ('tumor_type', 'stage', 'death', 'neoadjuvant')
+_BOOLEANS = {'yes': True, 'no': False}
+
+
+class Stratum:
+    """
+    Restriction of the stratification variables to the given values, e.g., the tumor types ['NN', 'PP'] or the
+    death True, and the number of its patients; None does not restrict the variable.
+    """
+
+    def __init__(self, count: int, tumor_type: list = None, stage: list = None, death: bool = None,
+                 neoadjuvant: bool = None):
+        if count < 1:
+            raise ValueError('the count of a stratum must be positive')
+        for name, values, dimension in (('tumor_type', tumor_type, TUMOR_TYPE), ('stage', stage, STAGE)):
+            unknown = set(values or ()) - set(dimension.values)
+            if unknown:
+                raise ValueError('unknown %s: %s' % (name, ', '.join(sorted(map(str, unknown)))))
+        self.count = count
+        self.tumor_type = None if tumor_type is None else sorted(set(tumor_type), key=TUMOR_TYPE.code)
+        self.stage = None if stage is None else sorted(set(stage), key=STAGE.code)
+        self.death = death
+        self.neoadjuvant = neoadjuvant
+
+        # joint probabilities of the tumor types (rows) and stages (columns), indexed as in their distributions
+        tt_values, stage_values = tumor_type_dist.values, stage_dx_dist.values
+        probs = np.outer(np.diff(tumor_type_dist.cdf, prepend=0.0), np.diff(stage_dx_dist.cdf, prepend=0.0))
+        if tumor_type is not None:
+            probs[~np.isin(tt_values, self.tumor_type)] = 0.0
+        if stage is not None:
+            probs[:, ~np.isin(stage_values, self.stage)] = 0.0
+        if death is not None:
+            p_death = np.array([death_prob[value] for value in tt_values])
+            probs *= (p_death if death else 1.0 - p_death)[:, None]
+        if neoadjuvant is not None:
+            early = np.isin(stage_values, ['IA', 'IB'])
+            stage_ii_iii = np.char.startswith(np.array(stage_values), 'II')
+            treated = (early[None, :] & (np.array(tt_values) != 'PN')[:, None]) | stage_ii_iii[None, :]
+            probs[treated != neoadjuvant] = 0.0
+        total = probs.sum()
+        if total <= 0.0:
+            raise ValueError('no patient of the profile belongs to the stratum ' + str(self))
+        self.probability = float(total)  # of a patient of the profile to belong to the stratum
+        self.cdf = np.cumsum(probs.ravel() / total)
+        self.cdf[np.flatnonzero(probs.ravel())[-1]:] = np.inf  # the last pair of the stratum takes the rounding error
+        self.n_stages = len(stage_values)
+
+    @property
+    def restricted(self) -> bool:
+        return any(getattr(self, name) is not None for name in VARIABLES)
+
+    def sample(self, r: np.ndarray) -> tuple:
+        """Indices of the tumor types and of the stages in their distributions for the uniform random numbers `r`."""
+        return np.divmod(np.searchsorted(self.cdf, r, side='right'), self.n_stages)
+
+    def to_dict(self) -> dict:
+        """The count and the restricted variables, e.g., for the reports and the manifest."""
+        return {'count': self.count, **{name: getattr(self, name) for name in VARIABLES if getattr(self, name) is not None}}
+
+    def __str__(self) -> str:
+        return ' '.join([str(self.count)] + ['%s=%s' % (name, ('yes' if value else 'no') if isinstance(value, bool)
+                                                         else ','.join(value))
+                                             for name, value in self.to_dict().items() if name != 'count'])
+
+    @classmethod
+    def from_dict(cls, stratum: dict) -> 'Stratum':
+        """Stratum of an object like the ones of `to_dict`; raises a ValueError if it is invalid."""
+        if not isinstance(stratum, dict):
+            raise ValueError('a stratum must be an object')
+        unknown = set(stratum) - {'count', *VARIABLES}
+        if unknown:
+            raise ValueError('unknown stratification variables: ' + ', '.join(sorted(unknown)))
+        count = stratum.get('count')
+        if not isinstance(count, int) or isinstance(count, bool):
+            raise ValueError('the count of a stratum must be a positive integer')
+        for name in ('tumor_type', 'stage'):
+            values = stratum.get(name)
+            if values is not None and (not isinstance(values, list) or not values):
+                raise ValueError(name + ' must be a non-empty list')
+        for name in ('death', 'neoadjuvant'):
+            if not isinstance(stratum.get(name, False), bool):
+                raise ValueError(name + ' must be a boolean')
+        return cls(count, **{name: stratum.get(name) for name in VARIABLES})
+
+    @classmethod
+    def parse(cls, arguments: list) -> 'Stratum':
+        """
+        Stratum given on the command line as the count followed by the restrictions, e.g.,
+        ['500', 'tumor_type=NN,PP', 'stage=IIIA,IIIB,IIIC,IV', 'death=yes'].
+        """
+        try:
+            count = int(arguments[0])
+        except (IndexError, ValueError):
+            raise ValueError('a stratum starts with the number of its patients')
+        restrictions = {}
+        for argument in arguments[1:]:
+            name, _, value = argument.partition('=')
+            if name not in VARIABLES or not value or name in restrictions:
+                raise ValueError('expected one of %s=VALUE per variable, got %s' % ('|'.join(VARIABLES), argument))
+            if name in ('death', 'neoadjuvant'):
+                if value not in _BOOLEANS:
+                    raise ValueError('%s must be yes or no' % name)
+                restrictions[name] = _BOOLEANS[value]
+            else:
+                restrictions[name] = value.split(',')
+        return cls(count, **restrictions)
+
+
+class Cohort:
+    """Strata of the patients `first_ehr`, ..., in the order of the EHRs; see `generate_batch`."""
+
+    def __init__(self, strata: list, first_ehr: int = 1):
+        self.strata = list(strata)
+        self.first_ehr = first_ehr
+        self.ends = first_ehr + np.cumsum([stratum.count for stratum in self.strata])  # first EHR after each stratum
+
+    @property
+    def n_patients(self) -> int:
+        """Number of the patients in the strata."""
+        return sum(stratum.count for stratum in self.strata)
+
+    def stratum_of(self, ehr: np.ndarray) -> np.ndarray:
+        """Index of the stratum of each EHR; the number of strata for the EHRs after the last stratum."""
+        return np.searchsorted(self.ends, ehr, side='right')
+
+    def sample(self, ehr: np.ndarray, r: np.ndarray, tt: np.ndarray) -> tuple:
+        """
+        Draws the tumor types and the stages of the patients `ehr` using the uniform random numbers `r` of their
+        tumor types `tt` drawn from the profile. Returns the indices of the tumor types, of the stages (-1 if not
+        restricted), and the deaths (-1 if not restricted, 0 or 1 otherwise).
+        """
+        tt = tt.copy()
+        stage = np.full(len(ehr), -1, dtype=np.int64)
+        death = np.full(len(ehr), -1, dtype=np.int8)
+        strata = self.stratum_of(ehr)
+        for s in np.unique(strata):
+            if s == len(self.strata) or not self.strata[s].restricted:
+                continue
+            stratum, rows = self.strata[s], strata == s
+            tt[rows], stage[rows] = stratum.sample(r[rows])
+            if stratum.death is not None:
+                death[rows] = stratum.death
+        return tt, stage, death
+
+    def to_list(self) -> list:
+        return [stratum.to_dict() for stratum in self.strata]
@@ -0,0 +1,79 @@
+"""
+Streams
+
+Random number streams per patient. The values drawn for a patient only depend on the seed and the patient's EHR,
+so any subset of patients can be regenerated on its own and the output does not depend on how the patients
+are split into batches, chunks, or shards.
+"""
+import zlib
+
+import numpy as np
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer; a bijective hash of 64-bit integers."""
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def patient_seed(seed: int, ehr: int) -> int:
+    """Seed of the stream of a single patient, e.g., for seeding the global NumPy RNG used by the scalar engine."""
+    return int(np.random.SeedSequence([seed, ehr]).generate_state(1)[0])
+
+
+class PatientStreams:
+    """
+    Counter-based random number generator with one stream per patient, derived from (seed, ehr).
+
+    Provides the methods of `np.random.Generator` used by `generate_batch`. The first dimension of every
+    draw corresponds to the patients; the value in row i and column j of the k-th draw is a hash of
+    (seed, ehr[i], k, j). Hence, a patient gets the same values in whichever batch it is generated,
+    as long as the sequence of draws is the same, i.e., draws must not depend on the data of a batch.
+    """
+
+    def __init__(self, seed: int, ehr: np.ndarray):
+        key = np.random.SeedSequence(seed).generate_state(1, np.uint64)[0]
+        with np.errstate(over='ignore'):
+            self.keys = _mix(_mix(np.asarray(ehr, dtype=np.uint64) * _GOLDEN_GAMMA) ^ key)
+        self.draws = 0
+
+    def _uniforms(self, size, k: int = 1) -> list:
+        """Returns k arrays of independent uniform values in [0, 1) of the given size."""
+        shape = (len(self.keys),) if size is None else ((size,) if np.isscalar(size) else tuple(size))
+        if shape[0] != len(self.keys):
+            raise ValueError('the first dimension of a draw must be the number of patients')
+        self.draws += 1
+        columns = int(np.prod(shape[1:], dtype=np.int64))
+        counters = (np.uint64(self.draws) << np.uint64(32)) + np.arange(columns * k, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            bits = _mix(self.keys[:, None] ^ _mix(counters * _GOLDEN_GAMMA)[None, :])
+        values = (bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+        return [values[:, t::k].reshape(shape) for t in range(k)]
+
+    def substream(self, name: str) -> 'PatientStreams':
+        """Independent streams of the same patients, selected by `name`; their draws do not affect the draws of this one."""
+        streams = PatientStreams.__new__(PatientStreams)
+        with np.errstate(over='ignore'):
+            streams.keys = _mix(self.keys ^ _mix(np.uint64(zlib.crc32(name.encode())) * _GOLDEN_GAMMA))
+        streams.draws = 0
+        return streams
+
+    def random(self, size=None) -> np.ndarray:
+        return self._uniforms(size)[0]
+
+    def integers(self, low, high, size=None) -> np.ndarray:
+        low, high = np.asarray(low), np.asarray(high)
+        if size is None:
+            size = np.broadcast(low, high).shape or None
+        return low + (self.random(size) * (high - low)).astype(np.int64)
+
+    def normal(self, loc=0.0, scale=1.0, size=None) -> np.ndarray:
+        if size is None:
+            size = np.broadcast(np.asarray(loc), np.asarray(scale)).shape or None
+        u1, u2 = self._uniforms(size, 2)
+        z = np.sqrt(-2.0 * np.log1p(-u1)) * np.cos(2.0 * np.pi * u2)  # Box-Muller transform
+        return loc + scale * z
@@ -0,0 +1,118 @@
+"""
+Tables
+
+Structure of the tables defined in `table_structure.sql` and in-memory buffers holding their rows.
+The buffers are used instead of the MySQL database when running without a database.
+When streaming, only the rows of the current chunk of patients are kept in memory.
+The categorical columns of the patient tables hold the codes of their dimensions, which are decoded when the rows
+are read.
+"""
+import ast
+import re
+
+import numpy as np
+
+from dimensions import DIMENSIONS
+
+_CREATE_TABLE = re.compile(r'CREATE TABLE `(\w+)` \((.*?)\n\)[^;]*;', re.DOTALL)
+_COLUMN = re.compile(r'^\s*`(\w+)` (\w+)', re.MULTILINE)
+_INSERT = re.compile(r'^INSERT INTO `(\w+)` VALUES (.*);$', re.MULTILINE)
+_CREATE_INDEX = re.compile(r'^CREATE INDEX \w+ ON `(\w+)`.*;$', re.MULTILINE)
+
+
+class TableBuffer:
+    """Columnar buffer of the rows of one table; the rows are appended in chunks of NumPy arrays."""
+
+    def __init__(self, name: str, columns: dict, create: str, indexes: list):
+        self.name = name
+        self.columns = columns  # column name -> SQL type
+        self.create = create
+        self.indexes = indexes
+        self.static = False  # True for the tables whose rows are given in the SQL file
+        self.dimensions = DIMENSIONS.get(name, {})  # column name -> dimension of the coded columns
+        self.chunks = []
+
+    def __len__(self) -> int:
+        return sum(len(chunk[0]) for chunk in self.chunks)
+
+    def append(self, columns: dict) -> None:
+        """Appends the rows given as a dictionary of columns; columns not given are filled with NULL."""
+        n = len(next(iter(columns.values())))
+        if n == 0:
+            return
+        self.chunks.append([columns[column] if column in columns else np.full(n, None, dtype=object)
+                            for column in self.columns])
+
+    def clear(self) -> None:
+        """Removes all rows from the buffer."""
+        self.chunks = []
+
+    def decoded(self, name: str, values: np.ndarray) -> np.ndarray:
+        """Returns the values of the column `name` with the codes of a coded column replaced by their values."""
+        dimension = self.dimensions.get(name)
+        return values if dimension is None else dimension.decode(values)
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns all the values of a column as one array."""
+        idx = list(self.columns).index(name)
+        if len(self.chunks) == 0:
+            return np.empty(0, dtype=object)
+        return self.decoded(name, np.concatenate([chunk[idx] for chunk in self.chunks]))
+
+    def rows(self):
+        """Yields the rows as tuples of Python values as they are returned by MySQL; dates are given as ISO strings."""
+        for chunk in self.chunks:
+            yield from zip(*[self.decoded(name, values).tolist() if name in self.dimensions else _to_python(values, sql_type)
+                             for values, (name, sql_type) in zip(chunk, self.columns.items())])
+
+
+def _to_python(values: np.ndarray, sql_type: str) -> list:
+    """Converts an array to a list of the Python values MySQL returns for the given column type."""
+    if sql_type == 'date' and np.issubdtype(values.dtype, np.datetime64):
+        # formatted at once instead of creating a date object per value
+        text = np.datetime_as_string(values.astype('datetime64[D]'), unit='D').astype(object)
+        text[np.isnat(values)] = None
+        return text.tolist()
+    values = values.tolist()
+    if sql_type == 'date':
+        return [None if v is None else str(v) for v in values]
+    if sql_type == 'bit':
+        return [None if v is None else int(v) for v in values]
+    if sql_type == 'float':
+        return [None if v is None else float('%.6g' % v) for v in values]  # MySQL FLOAT is single precision
+    if sql_type in ('varchar', 'char'):
+        return [None if v is None else str(v) for v in values]
+    return values
+
+
+def read_structure(path: str = 'table_structure.sql') -> dict:
+    """Creates empty buffers for all the tables in the SQL file and fills the static ones with their rows."""
+    with open(path, 'r', encoding='utf8') as f:
+        structure = f.read()
+
+    tables = {}
+    for match in _CREATE_TABLE.finditer(structure):
+        name = match.group(1)
+        columns = {column: sql_type for column, sql_type in _COLUMN.findall(match.group(2))}
+        tables[name] = TableBuffer(name, columns, match.group(0), [])
+    for match in _CREATE_INDEX.finditer(structure):
+        tables[match.group(1)].indexes.append(match.group(0))
+    for name, values in _INSERT.findall(structure):
+        rows = ast.literal_eval('[' + values + ']')
+        tables[name].static = True
+        tables[name].append({column: np.array([row[i] for row in rows], dtype=object)
+                             for i, column in enumerate(tables[name].columns)})
+    return tables
+
+
+def append_batch(tables: dict, batch: dict) -> None:
+    """Appends the tables of a batch of patients generated by `generate_batch` to the buffers."""
+    for table, columns in batch.items():
+        tables[table].append(columns)
+
+
+def clear_patients(tables: dict) -> None:
+    """Removes the rows of the patients from the buffers; the static tables are kept."""
+    for table in tables.values():
+        if not table.static:
+            table.clear()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules of the generator are at the top level of the repository and read `table_structure.sql` relative to
+# the working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
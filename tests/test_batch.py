@@ -0,0 +1,113 @@
+"""
+Statistical equivalence of the batch engine (`batch.generate_batch`) and the scalar engine (`SDG.generate_data`):
+both generate 10,000 patients, and the marginal distributions of their rows have to agree within the
+sampling error, for clean data and with mutations.
+"""
+import collections
+import re
+
+import numpy as np
+import pytest
+
+from SDG import generate_data
+from batch import generate_batch
+from tables import append_batch, read_structure
+
+N_PATIENTS = 10000
+_INSERT = re.compile(r'INSERT INTO (\w+)(?:\(([^)]*)\))? VALUES')
+
+
+class RecordingCursor:
+    """Takes the place of the MySQL cursor of `generate_data`; keeps the inserted rows per table as dictionaries."""
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.rows = collections.defaultdict(list)
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        match = _INSERT.match(sql)
+        name = match.group(1)
+        columns = [column.strip() for column in match.group(2).split(',')] if match.group(2) else list(self.tables[name].columns)
+        row = dict.fromkeys(self.tables[name].columns)  # the columns that are not inserted are NULL
+        row.update(zip(columns, params))
+        self.rows[name].append(row)
+
+    def executemany(self, sql: str, rows: list) -> None:
+        for row in rows:
+            self.execute(sql, row)
+
+
+def scalar_rows(n: int, error_prob: float, seed: int) -> dict:
+    tables = read_structure()
+    cursor = RecordingCursor(tables)
+    np.random.seed(seed)
+    for ehr in range(1, n + 1):
+        generate_data(ehr, cursor, error_prob)
+    return cursor.rows
+
+
+def batch_rows(n: int, error_prob: float, seed: int) -> dict:
+    tables = read_structure()
+    append_batch(tables, generate_batch(1, n, error_prob, seed=seed))
+    return {name: [dict(zip(table.columns, row)) for row in table.rows()]
+            for name, table in tables.items() if not table.static}
+
+
+@pytest.fixture(scope='module', params=[0.0, 0.2], ids=['clean', 'mutated'])
+def engines(request) -> tuple:
+    return scalar_rows(N_PATIENTS, request.param, 1), batch_rows(N_PATIENTS, request.param, 1)
+
+
+def assert_same_shares(scalar: list, batch: list) -> None:
+    """The share of each value agrees within 4 standard errors of the difference of two samples (plus 0.5%)."""
+    counts = collections.Counter(scalar), collections.Counter(batch)
+    for value in set(counts[0]) | set(counts[1]):
+        shares = [count[value] / len(values) for count, values in zip(counts, (scalar, batch))]
+        p = (counts[0][value] + counts[1][value]) / (len(scalar) + len(batch))
+        tolerance = 4 * np.sqrt(p * (1 - p) * (1 / len(scalar) + 1 / len(batch))) + 0.005
+        assert abs(shares[0] - shares[1]) <= tolerance, (value, shares)
+
+
+def assert_same_mean(scalar: np.ndarray, batch: np.ndarray) -> None:
+    """The means agree within 4 standard errors of their difference (plus 1% of the mean)."""
+    tolerance = 4 * np.sqrt(scalar.var() / len(scalar) + batch.var() / len(batch)) + 0.01 * abs(scalar.mean())
+    assert abs(scalar.mean() - batch.mean()) <= tolerance, (scalar.mean(), batch.mean())
+
+
+def tumor_type(patient: dict) -> str:
+    return ('P' if patient['er_positive'] or patient['pr_positive'] else 'N') + \
+        ('P' if patient['her2_overall_positive'] else 'N')
+
+
+def rows_per_patient(rows: list) -> np.ndarray:
+    return np.bincount([row['ehr'] for row in rows], minlength=N_PATIENTS + 1)[1:]
+
+
+def test_tumor_type(engines):
+    scalar, batch = engines
+    assert_same_shares([tumor_type(row) for row in scalar['patient']], [tumor_type(row) for row in batch['patient']])
+
+
+def test_death(engines):
+    scalar, batch = engines
+    assert_same_shares([row['death_date'] is not None for row in scalar['patient']],
+                       [row['death_date'] is not None for row in batch['patient']])
+
+
+@pytest.mark.parametrize('column', ['stage_diagnosis', 'stage_after_neo'])
+def test_stage(engines, column):
+    scalar, batch = engines
+    assert_same_shares([row[column] for row in scalar['tumor_tnm']], [row[column] for row in batch['tumor_tnm']])
+
+
+@pytest.mark.parametrize('table', ['chemoterapy_cycle', 'surgery', 'oral_drug', 'family_history'])
+def test_rows_per_patient(engines, table):
+    scalar, batch = engines
+    assert_same_mean(rows_per_patient(scalar[table]), rows_per_patient(batch[table]))
+
+
+@pytest.mark.parametrize('table', ['patient', 'tumor_tnm', 'tumor_type', 'surgery', 'radiotherapy'])
+def test_null_rates(engines, table):
+    scalar, batch = engines
+    for column in scalar[table][0]:
+        assert_same_shares([row[column] is None for row in scalar[table]], [row[column] is None for row in batch[table]])
@@ -0,0 +1,46 @@
+"""
+Profiles that would break the generators are rejected when they are loaded.
+"""
+import json
+
+import pytest
+
+from profiles import load_profile
+
+
+def load(tmp_path, params: dict) -> dict:
+    path = tmp_path / 'profile.json'
+    path.write_text(json.dumps(params))
+    return load_profile(str(path), cache_dir=str(tmp_path / 'cache'))
+
+
+@pytest.mark.parametrize('params', [
+    {'max_cycles_adjuvant': 3},  # the adjuvant cycles are drawn from [3, max_cycles_adjuvant)
+    {'max_cycles_adjuvant': 2},
+    {'radio_days_range': [7, 7]},
+    {'radio_days_range': [60, 7]},
+    {'radio_days_range': [7.5, 60]},
+    {'days_to_radio': [28.5, 42]},
+    {'days_to_radio': [42, 42]},
+    {'std_menarche_age': -1.0},
+    {'std_menopause_age': -0.1},
+    {'std_pregnancies': -2},
+    {'radio_days_std': -19.76},
+    {'radio_gy_std': -8.35},
+], ids=lambda params: '%s=%s' % next(iter(params.items())))
+def test_invalid_profile(tmp_path, params):
+    with pytest.raises(ValueError):
+        load(tmp_path, params)
+
+
+@pytest.mark.parametrize('params', [
+    {'max_cycles_adjuvant': 4},
+    {'radio_days_range': [7, 8]},
+    {'days_to_radio': [28, 29]},
+    {'std_pregnancies': 0},
+    {'radio_gy_range': [4.5, 70.5]},  # only compared to the doses, not drawn from
+], ids=lambda params: '%s=%s' % next(iter(params.items())))
+def test_valid_profile(tmp_path, params):
+    profile = load(tmp_path, params)
+    name, value = next(iter(params.items()))
+    assert profile[name] == (tuple(value) if isinstance(value, list) else value)
@@ -0,0 +1,27 @@
+"""
+The N-Triples of the native serializer (`rdf.NTriplesSerializer`) and of the SDM-RDFizer (`rdf.Semantifier`) for a
+small cohort are the same graph, for clean data and with mutations.
+"""
+import pytest
+import rdflib
+from rdflib.compare import isomorphic
+
+from batch import generate_batch
+from rdf import NTriplesSerializer, Semantifier
+from tables import append_batch, read_structure
+
+
+def graph(triples: str) -> rdflib.Graph:
+    return rdflib.Graph().parse(data=triples, format='nt')
+
+
+@pytest.mark.parametrize('error_prob', [0.0, 0.3])
+def test_native_equals_rdfizer(error_prob, tmp_path, monkeypatch):
+    tables = read_structure()
+    append_batch(tables, generate_batch(1, 50, error_prob, seed=7))
+    native = NTriplesSerializer().semantify(tables)
+    rdfizer = Semantifier()
+    monkeypatch.chdir(tmp_path)  # the SDM-RDFizer writes its error.log to the working directory
+    triples = rdfizer.semantify(tables)
+    assert native.count('\n') > 1000
+    assert isomorphic(graph(native), graph(triples))
@@ -0,0 +1,195 @@
+"""
+The Python port of the SQL of the mapping (`rdf._VIEWS`) returns the same rows as the queries of `mapping.ttl` with
+the functions of `table_structure.sql`, for clean data and with mutations.
+
+The queries are executed on the MySQL server SDG loads the data into (localhost:3306), in a scratch database, if the
+server is running, and always on SQLite. For SQLite, the functions of `table_structure.sql` are transcribed statement
+by statement, and CONCAT, the collation of the tables (case-insensitive, trailing spaces ignored), and the precision
+of the FLOAT columns are those of MySQL. Unlike the isomorphism with the SDM-RDFizer (`test_rdf`), this does not
+read the Python port on both sides.
+"""
+import collections
+import re
+import socket
+import sqlite3
+
+import numpy as np
+import pytest
+
+from SDG import initialize_database
+from batch import generate_batch
+from rdf import ENTITY, _VIEWS, _view_name
+from tables import append_batch, read_structure
+from writers import format_sql
+
+MYSQL = ('localhost', 3306, 'root', 'paladin')  # the server of SDG.py
+MYSQL_DB = 'synth_test_views'
+
+
+def mapping_queries() -> dict:
+    """The distinct queries of the mapping by the name of their view."""
+    with open('mapping.ttl', 'r', encoding='utf8') as f:
+        return {_view_name(query): query for query in re.findall(r'rml:query "(.*?)";', f.read())}
+
+
+# MySQL functions used by the queries and by the functions of `table_structure.sql`; NULL gives NULL
+
+def _equal(a: str, b: str) -> bool:
+    """`a = b` for the collations of the tables: case-insensitive, trailing spaces ignored."""
+    return a.rstrip(' ').lower() == b.rstrip(' ').lower()
+
+
+def _concat(*values):
+    return None if any(value is None for value in values) else ''.join(map(str, values))
+
+
+def _left(value: str, n: int) -> str:
+    return value[:max(n, 0)]
+
+
+def _right(value: str, n: int) -> str:
+    return value[len(value) - n:] if n > 0 else ''
+
+
+def _mid(value: str, pos: int, n: int) -> str:
+    """MID and SUBSTRING count from 1; position 0 gives the empty string."""
+    return value[pos - 1:pos - 1 + n] if pos > 0 else ''
+
+
+def _substring_index(value: str, delim: str, count: int) -> str:
+    return delim.join(value.split(delim)[:count]) if count > 0 else ''
+
+
+def _to_uri(a):
+    if a is None:  # NULL = '' is NULL, so NULL takes the ELSE branch, where CONCAT gives NULL
+        return None
+    if _equal(a, ''):
+        return None
+    return _concat(ENTITY, _concat(_left(a, 1).upper(), _mid(a, 2, len(a))).replace(' ', '_'))
+
+
+def _to_bool_uri(a):
+    return _to_uri('Yes' if a is not None and a == 1 else 'No')
+
+
+def _cap_first(value):
+    if value is None:
+        return None
+    length = len(value)
+    value = value.lower()
+    i = 0
+    while i < length:
+        if _equal(_mid(value, i, 1), ' ') or i == 0:
+            if i < length:
+                value = _concat(_left(value, i), _mid(value, i + 1, 1).upper(), _right(value, length - i - 1))
+        i += 1
+    return value
+
+
+def _split_str(x, delim, pos):
+    if x is None:
+        return None
+    return _cap_first(_mid(_substring_index(x, delim, pos), len(_substring_index(x, delim, pos - 1)) + 1, len(x))
+                      .replace(delim, ''))
+
+
+def _collation(a: str, b: str) -> int:
+    a, b = a.rstrip(' ').lower(), b.rstrip(' ').lower()
+    return (a > b) - (a < b)
+
+
+_SQLITE_TYPES = {'int': 'INTEGER', 'bit': 'INTEGER', 'float': 'REAL'}  # the other columns are strings
+
+
+def sqlite_rows(tables: dict) -> dict:
+    con = sqlite3.connect(':memory:')
+    con.create_collation('mysql', _collation)
+    for name, function, n_args in (('CONCAT', _concat, -1), ('to_uri', _to_uri, 1), ('to_bool_uri', _to_bool_uri, 1),
+                                   ('CAP_FIRST', _cap_first, 1), ('SPLIT_STR', _split_str, 3)):
+        con.create_function(name, n_args, function, deterministic=True)
+    for name, table in tables.items():
+        con.execute('CREATE TABLE %s (%s)' % (name, ', '.join(
+            '%s %s' % (column, _SQLITE_TYPES.get(sql_type, 'TEXT COLLATE mysql')) for column, sql_type in table.columns.items())))
+        floats = [sql_type == 'float' for sql_type in table.columns.values()]
+        con.executemany('INSERT INTO %s VALUES (%s)' % (name, ', '.join('?' * len(table.columns))), [
+            # MySQL keeps the 6 significant digits of a FLOAT
+            [float('%.6g' % value) if is_float and value is not None else value for value, is_float in zip(row, floats)]
+            for row in table.rows()])
+    return {view: query_rows(con.cursor(), query) for view, query in mapping_queries().items()}
+
+
+def mysql_rows(tables: dict) -> dict:
+    import mysql.connector
+
+    host, port, user, pwd = MYSQL
+    con = mysql.connector.connect(host=host, port=port, user=user, password=pwd)
+    cur = con.cursor()
+    try:
+        cur.execute('DROP DATABASE IF EXISTS ' + MYSQL_DB)
+        cur.execute('CREATE DATABASE ' + MYSQL_DB)
+        cur.execute('USE ' + MYSQL_DB)
+        initialize_database(con, cur)
+        for name, rows in format_sql(tables).items():
+            if rows:
+                cur.execute('INSERT INTO `' + name + '` VALUES ' + ','.join(rows))
+        con.commit()
+        return {view: query_rows(cur, query) for view, query in mapping_queries().items()}
+    finally:
+        cur.execute('DROP DATABASE IF EXISTS ' + MYSQL_DB)
+        con.close()
+
+
+def query_rows(cur, query: str) -> tuple:
+    cur.execute(query)
+    rows = cur.fetchall()
+    return [column[0] for column in cur.description], rows
+
+
+def normalized(rows) -> collections.Counter:
+    """The rows as the CSV files of the views hold them, i.e., as strings; the order of the rows is not compared."""
+    return collections.Counter(tuple(None if value is None else str(value) for value in row) for row in rows)
+
+
+def mysql_running() -> bool:
+    try:
+        socket.create_connection(MYSQL[:2], timeout=1.0).close()
+        return True
+    except OSError:
+        return False
+
+
+@pytest.fixture(scope='module', params=[0.0, 0.3], ids=['clean', 'mutated'])
+def tables(request) -> dict:
+    tables = read_structure()
+    append_batch(tables, generate_batch(1, 300, request.param, seed=7))
+    # one cycle of every schema, so that all the names go through CAP_FIRST and SPLIT_STR
+    schemas = np.array([id_schema for id_schema, _ in tables['chemoterapy_schema'].rows()])
+    tables['chemoterapy_cycle'].append({'ehr': np.zeros(len(schemas), dtype=np.int64), 'id_schema': schemas,
+                                        'date': np.full(len(schemas), np.datetime64('2020-01-01')),
+                                        'cycle_number': np.ones(len(schemas), dtype=np.int64)})
+    return tables
+
+
+@pytest.mark.parametrize('engine', [
+    sqlite_rows,
+    pytest.param(mysql_rows, marks=pytest.mark.skipif(not mysql_running(), reason='no MySQL server at localhost:3306'))
+], ids=['sqlite', 'mysql'])
+def test_views_equal_mapping_queries(tables, engine):
+    views = engine(tables)
+    assert set(views) == set(_VIEWS)
+    for view, (columns, rows) in views.items():
+        python_rows, python_columns = _VIEWS[view]
+        assert sorted(python_columns(tables)) == sorted(columns), view  # the columns are read by name
+        assert len(rows) > 0, view
+        assert normalized(tuple(row[column] for column in columns) for row in python_rows(tables)) == normalized(rows), view
+
+
+def test_sql_functions():
+    """The transcriptions of the SQL functions against values computed by hand from their definitions."""
+    assert _to_uri('') is None and _to_uri('  ') is None and _to_uri(None) is None
+    assert _to_uri('cardiac insufficiency') == ENTITY + 'Cardiac_insufficiency'
+    assert _to_bool_uri(1) == ENTITY + 'Yes' and _to_bool_uri(0) == ENTITY + 'No' and _to_bool_uri(None) == ENTITY + 'No'
+    assert _cap_first('TRASTUZUMAB + DOCETAXEL') == 'Trastuzumab + Docetaxel'
+    assert _cap_first('NAB-PACLITAXEL') == 'Nab-paclitaxel'
+    assert [_split_str('EPIRUBICINA + CICLOFOSFAMIDA + FLUOROURACILO', ' + ', pos) for pos in range(1, 5)] == \
+        ['Epirubicina', 'Ciclofosfamida', 'Fluorouracilo', '']
@@ -0,0 +1,454 @@
+#!/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Validator
+
+Checks the guideline invariants implied by `generate_data` on a generated data set, e.g., that the births, aborts,
+and caesareans of a patient add up to her pregnancies or that the TNM categories match the stage. Clean data
+(p=0.0) satisfies all of them; with mutations, the share of the checked rows violating a rule is the deviation
+that was actually achieved. Each rule is a vectorized predicate over the columns of the tables, hence, data sets
+with millions of patients are checked in seconds. The rules are independent of the generators on purpose; they
+only use the parameters of the profile, e.g., the categories of the TNM distributions.
+
+    python validator.py /data
+
+reads the Parquet files of the data set in the folder if there are any and the CSV files otherwise, and prints
+the number of checked and violating rows per rule; `--report` writes them to a JSON file.
+"""
+import argparse
+import collections
+import glob
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.parquet as pq
+
+from distributions import (max_cycles_adjuvant, n_category_iiib_dist, n_category_iv_dist, radio_days_range,
+                           stage_dx_dist, t_category_iiia_dist, t_category_iiic_dist, t_category_iv_dist)
+from tables import read_structure
+
+_ARROW_TYPES = {'int': pa.int64(), 'bit': pa.int64(), 'date': pa.date32(), 'float': pa.float64(),
+                'varchar': pa.string(), 'char': pa.string()}
+_COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+_TABLES = ['patient', 'tumor_tnm', 'tumor_type', 'tumor_grade', 'chemoterapy_cycle', 'surgery', 'radiotherapy',
+           'comorbidity', 'oral_drug']
+_NUMERIC_STRINGS = {('comorbidity', 'ehr'), ('comorbidity', 'negated')}  # varchar in the data model, but numbers
+
+
+def _tnm_combinations() -> set:
+    """The (stage, T, N, N subcategory, M) combinations `get_tnm` can return."""
+    combinations = {('0', 'IS', '0', 'None', '0'), ('IA', '1', '0', 'None', '0'), ('IB', '1', '1', 'MI', '0'),
+                    ('IB', '0', '1', 'MI', '0'), ('IIA', '0', '1', 'None', '0'), ('IIA', '1', '1', 'None', '0'),
+                    ('IIA', '2', '0', 'None', '0'), ('IIB', '2', '1', 'None', '0'), ('IIB', '3', '0', 'None', '0'),
+                    ('IIIA', '3', '1', 'None', '0')}
+    combinations |= {('IIIA', t, '2', 'None', '0') for t in t_category_iiia_dist.values}
+    combinations |= {('IIIB', '4', n, 'None', '0') for n in n_category_iiib_dist.values}
+    combinations |= {('IIIC', t, '3', 'None', '0') for t in t_category_iiic_dist.values}
+    combinations |= {('IV', t, n, 'None', '0') for t in t_category_iv_dist.values for n in n_category_iv_dist.values}
+    return combinations
+
+
+_TNM = _tnm_combinations()
+# the values of each position of the combinations, and the combinations as numbers with one digit per position
+_TNM_VALUES = [sorted(set(values)) for values in zip(*_TNM)]
+_TNM_RADIX = np.cumprod([1] + [len(values) for values in _TNM_VALUES[:-1]])
+_TNM_CODES = np.array(sorted(sum(values.index(value) * radix for values, value, radix
+                                 in zip(_TNM_VALUES, combination, _TNM_RADIX)) for combination in _TNM))
+_STAGE_II_III = [stage for stage in stage_dx_dist.values if stage.startswith('II')]
+
+
+def _to_numpy(column: pa.ChunkedArray, numeric: bool = False) -> np.ndarray:
+    """
+    Numbers become floats with NaN for NULL, dates datetime64[D] with NaT, and strings object arrays with None;
+    strings are parsed as numbers if `numeric` is set.
+    """
+    if numeric:
+        return column.cast(pa.string()).cast(pa.float64()).to_numpy()
+    if pa.types.is_date(column.type):
+        return column.cast(pa.date32()).to_numpy().astype('datetime64[D]')
+    if pa.types.is_string(column.type) or pa.types.is_dictionary(column.type):
+        return column.cast(pa.string()).to_numpy()
+    return column.cast(pa.float64()).to_numpy()
+
+
+def _ymd(dates: np.ndarray) -> tuple:
+    years = dates.astype('datetime64[Y]')
+    months = dates.astype('datetime64[M]')
+    return (years.astype(np.int64), (months - years.astype('datetime64[M]')).astype(np.int64),
+            (dates - months.astype('datetime64[D]')).astype(np.int64))
+
+
+def _age(born: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """Age in full years at the date `current` of a person born at `born`."""
+    born_y, born_m, born_d = _ymd(born)
+    current_y, current_m, current_d = _ymd(current)
+    return current_y - born_y - ((current_m * 100 + current_d) < (born_m * 100 + born_d))
+
+
+class Data:
+    """
+    The columns of the tables of a data set as NumPy arrays, see `_to_numpy`, with helpers to relate the rows of
+    the 1:N tables to the patients. The patients are sorted by their EHR.
+    """
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.columns = {}
+        self.orders = {}
+        for name, table in tables.items():
+            columns = {column: _to_numpy(table.column(column), (name, column) in _NUMERIC_STRINGS)
+                       for column in table.column_names}
+            self.orders[name] = np.argsort(columns['ehr'], kind='stable')
+            self.columns[name] = {column: values[self.orders[name]] for column, values in columns.items()}
+        self.ehr = self.columns['patient']['ehr']
+
+    def __getitem__(self, table: str) -> dict:
+        return self.columns[table]
+
+    def codes(self, table: str, column: str, values: list) -> np.ndarray:
+        """
+        Index of the value of each row of a string column in `values`; -1 for NULL and the other values. The codes
+        are looked up in the Arrow column, i.e., without the Python strings of its values.
+        """
+        value_set = pa.array(values, pa.string())
+        codes = [np.zeros(0, dtype=np.int64)]
+        for chunk in self.tables[table].column(column).chunks:
+            if pa.types.is_dictionary(chunk.type):  # the values of the dictionary, followed by -1 for NULL
+                mapping = np.append(pc.index_in(chunk.dictionary.cast(pa.string()), value_set=value_set)
+                                    .fill_null(-1).to_numpy(), -1)
+                codes.append(mapping[chunk.indices.fill_null(len(mapping) - 1).to_numpy()])
+            else:
+                codes.append(pc.index_in(chunk.cast(pa.string()), value_set=value_set).fill_null(-1).to_numpy())
+        return np.concatenate(codes)[self.orders[table]]
+
+    def patient_of(self, table: str) -> np.ndarray:
+        """Row of the patient of each row of `table`; rows of unknown patients get -1."""
+        ehr = self.columns[table]['ehr']
+        idx = np.minimum(np.searchsorted(self.ehr, ehr), max(len(self.ehr) - 1, 0))
+        return np.where((len(self.ehr) > 0) & (self.ehr[idx] == ehr), idx, -1)
+
+    def count(self, table: str, where: np.ndarray = None) -> np.ndarray:
+        """Number of rows of `table` (where `where` is set) per patient."""
+        patient = self.patient_of(table)
+        where = patient >= 0 if where is None else where & (patient >= 0)
+        return np.bincount(patient[where], minlength=len(self.ehr))
+
+    def first(self, table: str, column: str, reduce=np.minimum) -> np.ndarray:
+        """Smallest (or, with `np.maximum`, largest) date of the column per patient; NaT if the patient has no rows."""
+        patient = self.patient_of(table)
+        values = self.columns[table][column]
+        valid = (patient >= 0) & ~np.isnat(values)
+        initial = np.iinfo(np.int64).max if reduce is np.minimum else np.iinfo(np.int64).min
+        result = np.full(len(self.ehr), initial, dtype=np.int64)
+        reduce.at(result, patient[valid], values[valid].astype(np.int64))
+        return np.where(result == initial, np.datetime64('NaT'), result.astype('datetime64[D]'))
+
+    def of_patient(self, table: str, column: str) -> np.ndarray:
+        """Value of the column of a 1:1 table, e.g., `tumor_tnm`, per patient; None or NaN for missing rows."""
+        patient = self.patient_of(table)
+        values = self.columns[table][column]
+        if values.dtype.kind == 'M':
+            result = np.full(len(self.ehr), np.datetime64('NaT'), dtype=values.dtype)
+        elif values.dtype.kind == 'O':
+            result = np.full(len(self.ehr), None, dtype=object)
+        else:
+            result = np.full(len(self.ehr), np.nan)
+        result[patient[patient >= 0]] = values[patient >= 0]
+        return result
+
+
+def _surgery_date(data: Data) -> np.ndarray:
+    """Date of each row of `surgery`; NaT if a part of it is missing."""
+    surgery = data['surgery']
+    parts = [surgery[column] for column in ('date_year', 'date_month', 'date_day')]
+    missing = np.any([np.isnan(part) for part in parts], axis=0)
+    years, months, days = [np.where(missing, 1, part).astype(np.int64) for part in parts]
+    dates = ((years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1)).astype('datetime64[D]') + (days - 1)
+    return np.where(missing, np.datetime64('NaT'), dates)
+
+
+def _cycles_before_surgery(data: Data) -> np.ndarray:
+    surgery_date = data['patient']['surgery_date']
+    patient = data.patient_of('chemoterapy_cycle')
+    before = data['chemoterapy_cycle']['date'] < surgery_date[np.maximum(patient, 0)]
+    return data.count('chemoterapy_cycle', before)
+
+
+def _neoadjuvant(data: Data) -> np.ndarray:
+    return data['patient']['neoadjuvant'] == 'yes'
+
+
+def _stage(data: Data) -> np.ndarray:
+    return data.of_patient('tumor_tnm', 'stage_diagnosis')
+
+
+# checks: table -> boolean array of the violations of the checked rows, e.g., of the patients the rule applies to
+
+def _age_at_diagnosis(data: Data) -> np.ndarray:
+    patient = data['patient']
+    return (patient['age_at_diagnosis'] != _age(patient['birth_date'], patient['diagnosis_date'])) | \
+        (patient['age_at_diagnosis'] < 20)
+
+
+def _death_after_diagnosis(data: Data) -> np.ndarray:
+    patient = data['patient']
+    dead = ~np.isnat(patient['death_date'])
+    return ~(patient['death_date'][dead] >= patient['diagnosis_date'][dead] + np.timedelta64(200, 'D'))
+
+
+def _age_at_death(data: Data) -> np.ndarray:
+    patient = data['patient']
+    dead = ~np.isnat(patient['death_date'])
+    age = _age(patient['birth_date'], np.where(dead, patient['death_date'], patient['birth_date']))
+    return np.where(dead, patient['age_at_death'] != age, ~np.isnan(patient['age_at_death']))
+
+
+def _menarche_before_menopause(data: Data) -> np.ndarray:
+    patient = data['patient']
+    menopause = ~np.isnan(patient['menopause_age'])
+    return ~(patient['menarche_age'][menopause] < patient['menopause_age'][menopause])
+
+
+def _menopause_before_death(data: Data) -> np.ndarray:
+    patient = data['patient']
+    both = ~np.isnan(patient['menopause_age']) & ~np.isnan(patient['age_at_death'])
+    return ~(patient['menopause_age'][both] <= patient['age_at_death'][both])
+
+
+def _menopause_pre(data: Data) -> np.ndarray:
+    patient = data['patient']
+    return (patient['menopause_pre'] == 1) != (patient['menopause_age'] < patient['age_at_diagnosis'])
+
+
+def _pregnancies(data: Data) -> np.ndarray:
+    patient = data['patient']
+    counts = [patient[column] for column in ('birth', 'abort', 'caesarean')]
+    return (patient['pregnancy'] != sum(counts)) | np.any([c < 0 for c in counts], axis=0)
+
+
+def _ki67(data: Data) -> np.ndarray:
+    ki67 = data['patient']['ki67_percent_max_simp']
+    return ~((ki67 >= 0) & (ki67 <= 100))
+
+
+def _first_treatment_date(data: Data) -> np.ndarray:
+    first = data['patient']['first_treatment_date']
+    first_cycle = data.first('chemoterapy_cycle', 'date')
+    return ~((first == first_cycle) | (np.isnat(first) & np.isnat(first_cycle)))
+
+
+def _surgery_recorded(data: Data) -> np.ndarray:
+    surgery_date = data['patient']['surgery_date']
+    patient = data.patient_of('surgery')
+    other_date = _surgery_date(data) != surgery_date[np.maximum(patient, 0)]
+    return (np.isnat(surgery_date) != (data.count('surgery') == 0)) | (data.count('surgery', other_date) > 0)
+
+
+def _neoadjuvant_before_surgery(data: Data) -> np.ndarray:
+    surgery = ~np.isnat(data['patient']['surgery_date'])
+    before = _cycles_before_surgery(data)[surgery]
+    return np.where(_neoadjuvant(data)[surgery], (before < 3) | (before > 5), before > 0)
+
+
+def _adjuvant_chemo(data: Data) -> np.ndarray:
+    patient = data['patient']
+    after = data.count('chemoterapy_cycle') - np.where(np.isnat(patient['surgery_date']), 0, _cycles_before_surgery(data))
+    return np.where(_stage(data) == '0', after != 0, (after < 3) | (after >= max_cycles_adjuvant))
+
+
+def _cycle_interval(data: Data) -> np.ndarray:
+    cycles = data['chemoterapy_cycle']
+    order = np.lexsort((cycles['cycle_number'], cycles['ehr']))
+    ehr, dates = cycles['ehr'][order], cycles['date'][order]
+    same = ehr[1:] == ehr[:-1]
+    days = (dates[1:] - dates[:-1]).astype(np.int64)[same]
+    # the surgery is at least 42 days after the last neoadjuvant cycle, the adjuvant chemo at least 28 days after it
+    return (days != 21) & (days < 70)
+
+
+def _cycle_numbers(data: Data) -> np.ndarray:
+    cycles = data['chemoterapy_cycle']
+    order = np.lexsort((cycles['cycle_number'], cycles['ehr']))
+    ehr = cycles['ehr'][order]
+    start = np.flatnonzero(np.r_[True, ehr[1:] != ehr[:-1]])
+    position = np.arange(len(ehr)) - np.repeat(start, np.diff(np.r_[start, len(ehr)]))
+    return cycles['cycle_number'][order] != position + 1
+
+
+def _tnm_valid(data: Data, columns: list) -> np.ndarray:
+    """Whether the (stage, T, N, N subcategory, M) columns of each row of `tumor_tnm` are a combination of `_TNM`."""
+    codes = [data.codes('tumor_tnm', column, values) for column, values in zip(columns, _TNM_VALUES)]
+    known = np.all([code >= 0 for code in codes], axis=0)  # NULL and values that are in no combination are invalid
+    return known & np.isin(sum(code * radix for code, radix in zip(codes, _TNM_RADIX)), _TNM_CODES)
+
+
+def _tnm_diagnosis(data: Data) -> np.ndarray:
+    return ~_tnm_valid(data, ['stage_diagnosis', 't_category', 'n_category', 'n_subcategory', 'm_category'])
+
+
+def _tnm_after_neoadjuvant(data: Data) -> np.ndarray:
+    tnm = data['tumor_tnm']
+    columns = ['stage_after_neo', 't_category_after_neoadj', 'n_category_after_neoadj', 'n_subcategory_after_neoadj',
+               'm_category_after_neoadj']
+    neoadjuvant = _neoadjuvant(data)[np.maximum(data.patient_of('tumor_tnm'), 0)]
+    missing = np.all([tnm[column] == None for column in columns], axis=0)  # noqa: E711, elementwise
+    return np.where(neoadjuvant, ~_tnm_valid(data, columns), ~missing)
+
+
+def _tnm_prefix(data: Data) -> np.ndarray:
+    tnm = data['tumor_tnm']
+    patient = np.maximum(data.patient_of('tumor_tnm'), 0)
+    surgery = ~np.isnat(data['patient']['surgery_date'])[patient]
+    neoadjuvant = _neoadjuvant(data)[patient]
+    prefix = np.where(~surgery | neoadjuvant, 'C', 'P')
+    prefix_neo = np.where(neoadjuvant, np.where(surgery, 'P', 'C'), None)
+    return (tnm['t_prefix'] != prefix) | (tnm['n_prefix'] != prefix) | \
+        (tnm['t_prefix_after_neoadj'] != prefix_neo) | (tnm['n_prefix_after_neoadj'] != prefix_neo)
+
+
+def _invasive(data: Data) -> np.ndarray:
+    tumor_type = data['tumor_type']
+    stage = _stage(data)[np.maximum(data.patient_of('tumor_type'), 0)]
+    invasive = tumor_type['invasive'] == 1
+    return (invasive != (stage != '0')) | ((tumor_type['in_situ'] == 1) == invasive)
+
+
+def _histological_type(data: Data) -> np.ndarray:
+    tumor_type = data['tumor_type']
+    return (tumor_type['ductal'] == 1) & (tumor_type['lobular'] == 1)
+
+
+def _grade(data: Data) -> np.ndarray:
+    return ~np.isin(data['tumor_grade']['grade'], [1, 2, 3])
+
+
+def _lymphadenectomy(data: Data) -> np.ndarray:
+    surgery = data.count('surgery') > 0
+    lymphadenectomy = data.count('surgery', data.codes('surgery', 'surgery', ['lymphadenectomy']) == 0) > 0
+    patient = data.patient_of('tumor_tnm')
+    stage_ii_iii = np.zeros(len(data.ehr), dtype=bool)  # False for patients without a stage
+    stage_ii_iii[patient[patient >= 0]] = (data.codes('tumor_tnm', 'stage_diagnosis', _STAGE_II_III) >= 0)[patient >= 0]
+    return lymphadenectomy[surgery] != stage_ii_iii[surgery]
+
+
+def _radiotherapy_duration(data: Data) -> np.ndarray:
+    radiotherapy = data['radiotherapy']
+    days = (radiotherapy['date_end'] - radiotherapy['date_start']).astype(np.int64)
+    return (days < radio_days_range[0]) | (days > radio_days_range[1])
+
+
+def _radiotherapy_after_treatment(data: Data) -> np.ndarray:
+    radiotherapy = data['radiotherapy']
+    patient = np.maximum(data.patient_of('radiotherapy'), 0)
+    last_cycle = data.first('chemoterapy_cycle', 'date', np.maximum)[patient]
+    surgery_date = data['patient']['surgery_date'][patient]
+    start = radiotherapy['date_start']
+    return (start <= last_cycle) | (start <= surgery_date)  # comparisons with NaT are False
+
+
+def _smoker(data: Data) -> np.ndarray:
+    comorbidity = data['comorbidity']
+    smoking = np.isin(comorbidity['comorbidity'], ['smoker', 'ex-smoker']) & (comorbidity['negated'] == 1)
+    return data.count('comorbidity', smoking) > 1
+
+
+def _oral_drug_receptors(data: Data) -> np.ndarray:
+    patient = data['patient']
+    takes = data.count('oral_drug') > 0
+    return ~((patient['er_positive'] == 1) | (patient['pr_positive'] == 1))[takes]
+
+
+Rule = collections.namedtuple('Rule', ['name', 'rows', 'check', 'description'])
+
+RULES = [
+    Rule('age_at_diagnosis', 'patient', _age_at_diagnosis, 'the age at diagnosis matches the birth and diagnosis dates and is at least 20'),
+    Rule('death_after_diagnosis', 'deceased patient', _death_after_diagnosis, 'the death date is at least 200 days after the diagnosis'),
+    Rule('age_at_death', 'patient', _age_at_death, 'the age at death is given exactly for the deceased patients and matches the dates'),
+    Rule('menarche_before_menopause', 'patient with menopause', _menarche_before_menopause, 'the menarche age is below the menopause age'),
+    Rule('menopause_before_death', 'deceased patient with menopause', _menopause_before_death, 'the menopause age is not above the age at death'),
+    Rule('menopause_pre', 'patient', _menopause_pre, 'menopause_pre is set if and only if the menopause was before the diagnosis'),
+    Rule('pregnancies', 'patient', _pregnancies, 'births, aborts, and caesareans are not negative and add up to the pregnancies'),
+    Rule('ki67', 'patient', _ki67, 'the Ki-67 percentage is in [0, 100]'),
+    Rule('first_treatment_date', 'patient', _first_treatment_date, 'the first treatment date is the date of the first chemotherapy cycle'),
+    Rule('surgery_recorded', 'patient', _surgery_recorded, 'the surgery date is given if and only if there are surgeries, all on that date'),
+    Rule('neoadjuvant_before_surgery', 'patient with surgery', _neoadjuvant_before_surgery,
+         'neoadjuvant patients have 3 to 5 chemotherapy cycles before the surgery, the other patients none'),
+    Rule('adjuvant_chemo', 'patient', _adjuvant_chemo, 'patients beyond stage 0 have 3 to max_cycles_adjuvant - 1 adjuvant cycles, the other patients none'),
+    Rule('cycle_interval', 'pair of consecutive cycles', _cycle_interval,
+         'the cycles of a chemotherapy are 21 days apart; the adjuvant one starts at least 70 days after the last neoadjuvant cycle'),
+    Rule('cycle_numbers', 'chemotherapy cycle', _cycle_numbers, 'the cycles of a patient are numbered 1, 2, ...'),
+    Rule('tnm_diagnosis', 'tumor', _tnm_diagnosis, 'the TNM categories at diagnosis are possible for the stage'),
+    Rule('tnm_after_neoadjuvant', 'tumor', _tnm_after_neoadjuvant,
+         'the TNM categories after the neoadjuvant chemo are possible for the stage and only given for neoadjuvant patients'),
+    Rule('tnm_prefix', 'tumor', _tnm_prefix, 'the prefixes are C (clinical) without surgery or with neoadjuvant chemo, P otherwise'),
+    Rule('invasive', 'tumor', _invasive, 'tumors beyond stage 0 are invasive, the other ones in situ'),
+    Rule('histological_type', 'tumor', _histological_type, 'a tumor is not both ductal and lobular'),
+    Rule('grade', 'tumor grade', _grade, 'the grade is 1, 2, or 3'),
+    Rule('lymphadenectomy', 'patient with surgery', _lymphadenectomy, 'patients in stage II or III and only these get a lymphadenectomy'),
+    Rule('radiotherapy_duration', 'radiotherapy', _radiotherapy_duration, 'the radiotherapy lasts radio_days_range days'),
+    Rule('radiotherapy_after_treatment', 'radiotherapy', _radiotherapy_after_treatment, 'the radiotherapy starts after the chemotherapy and the surgery'),
+    Rule('smoker', 'patient', _smoker, 'a patient is not both smoker and ex-smoker'),
+    Rule('oral_drug_receptors', 'patient with oral drugs', _oral_drug_receptors, 'only ER or PR positive patients get oral drugs')
+]
+
+
+def validate(tables: dict) -> dict:
+    """
+    Checks the rules on the Arrow tables of a data set, e.g., as returned by `read_tables`; returns the number of
+    checked rows, violations, and the share of violations per rule.
+    """
+    data = Data(tables)
+    report = {}
+    for rule in RULES:
+        violations = rule.check(data)
+        checked, violated = len(violations), int(np.count_nonzero(violations))
+        report[rule.name] = {'rows': rule.rows, 'checked': checked, 'violations': violated,
+                             'rate': violated / checked if checked > 0 else None}
+    return report
+
+
+def _read_csv(path: str, columns: dict) -> pa.Table:
+    compression = _COMPRESSIONS.get(os.path.splitext(path)[1])
+    with pa.input_stream(path, compression=compression) as fp:
+        return pyarrow.csv.read_csv(fp, convert_options=pyarrow.csv.ConvertOptions(
+            column_types={column: _ARROW_TYPES[sql_type] for column, sql_type in columns.items()},
+            strings_can_be_null=True))
+
+
+def read_tables(folder: str) -> dict:
+    """Reads the tables checked by the rules from the Parquet files in `folder` if there are any, else from the CSV files."""
+    structure = read_structure()
+    tables = {}
+    for name in _TABLES:
+        parquet = glob.glob(os.path.join(folder, 'parquet', name + '.parquet')) + \
+            glob.glob(os.path.join(folder, 'parquet', name + '-*.parquet')) + \
+            glob.glob(os.path.join(folder, 'parquet', name, '**', '*.parquet'), recursive=True)
+        if parquet:
+            tables[name] = pa.concat_tables([pq.read_table(path) for path in sorted(parquet)])
+            continue
+        csv = glob.glob(os.path.join(folder, 'csv', name + '.csv*'))
+        if not csv:
+            raise FileNotFoundError('no Parquet or CSV file of the table ' + name + ' in ' + folder)
+        tables[name] = _read_csv(csv[0], structure[name].columns)
+    return tables
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks the guideline invariants on a generated data set')
+    parser.add_argument('folder', help='Folder of the data set, i.e., the output folder of SDG.py')
+    parser.add_argument('--report', metavar='report_file', default=None,
+                        help='JSON file to which the number of checked rows and violations per rule are written')
+    args = parser.parse_args()
+
+    results = validate(read_tables(args.folder))
+    for name, result in results.items():
+        rate = '' if result['rate'] is None else '%8.4f%%' % (100 * result['rate'])
+        print('%-30s %10d of %10d %-32s %s' % (name, result['violations'], result['checked'], result['rows'], rate))
+    if args.report is not None:
+        with open(args.report, 'w', encoding='utf8') as fp:
+            json.dump(results, fp, indent=2)
+            fp.write('\n')
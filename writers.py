@@ -0,0 +1,392 @@
+"""
+Writers
+
+Write the tables held in memory directly to the output formats, i.e., without a MySQL database.
+The files are equivalent to the ones created from the database with `mysqldump` and `dump_csv`.
+The writers are opened once and the rows of the patients are appended chunk by chunk, so that
+only one chunk of patients is kept in memory at any time. Formatting a chunk does not depend on
+the writer, hence, chunks can be formatted in parallel and written in order afterwards.
+The files can be compressed with gzip, with gzip in independent blocks compressed by several threads, or
+with zstd. A `ThreadedWriter` runs a writer in a background thread, so that the compression and the disk I/O
+of the output formats overlap with each other and with the generation of the next chunk.
+
+The writers can take checkpoints: `checkpoint` writes everything received so far to the files and returns the
+offsets of the files, which a writer opened with `resume` truncates the files to, so that an interrupted run can
+be continued from the last checkpoint. A compressed file continues with a new gzip member or zstd frame after each
+checkpoint, which does not change the decompressed data.
+"""
+import collections
+import concurrent.futures
+import csv
+import gzip
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:  # only needed for the zstd compression
+    zstandard = None
+
+_MAX_INSERT_LENGTH = 1024 * 1024  # same as the default net_buffer_length of mysqldump
+_ESCAPE = str.maketrans({'\\': '\\\\', '\'': '\\\'', '"': '\\"', '\n': '\\n', '\r': '\\r', '\0': '\\0', '\x1a': '\\Z'})
+_BLOCK_SIZE = 1024 * 1024  # uncompressed size of the blocks compressed in parallel by 'gzip-mt'
+
+COMPRESSIONS = {'none': '', 'gzip': '.gz', 'gzip-mt': '.gz', 'zstd': '.zst'}  # compression -> file extension
+
+
+class _GzipFile(gzip.GzipFile):
+    """Gzip file without name and timestamp in the header, i.e., the file only depends on the data."""
+
+    def __init__(self, path: str, level: int, mode: str = 'wb'):
+        super().__init__(filename='', mode='wb', fileobj=open(path, mode), compresslevel=level, mtime=0)
+        self.myfileobj = self.fileobj  # closed together with the gzip file
+
+
+class _BlockGzipFile(io.BufferedIOBase):
+    """
+    Gzip file whose data is split into blocks that are compressed in parallel by a pool of threads and
+    written in order as consecutive gzip members. Such a file can be read by any gzip decompressor.
+    """
+
+    def __init__(self, path: str, level: int, threads: int, mode: str = 'wb'):
+        self.fp = open(path, mode)
+        self.level = level
+        self.threads = threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)  # zlib releases the GIL while compressing
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        while len(self.buffer) >= _BLOCK_SIZE:
+            self._submit(bytes(self.buffer[:_BLOCK_SIZE]))
+            del self.buffer[:_BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self.pending.append(self.executor.submit(gzip.compress, block, self.level, mtime=0))
+        while len(self.pending) > 2 * self.threads:  # limits the memory held by blocks not yet written
+            self.fp.write(self.pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.fp.write(self.pending.popleft().result())
+        self.executor.shutdown()
+        self.fp.close()
+        super().close()
+
+
+def open_compressed(path: str, compression: str = 'none', level: int = None, threads: int = None, append: bool = False):
+    """
+    Opens a binary file for writing that is compressed with `compression`, i.e., one of `COMPRESSIONS`.
+    The extension of the compression is not added to `path`. If not given, the level is the default of
+    the compression and the number of threads used by 'gzip-mt' and 'zstd' is the number of CPUs.
+    With `append`, the data is added to the end of the file; for gzip and zstd, as new members or frames,
+    which are decompressed as one stream.
+    """
+    threads = threads if threads is not None else os.cpu_count() or 1
+    mode = 'ab' if append else 'wb'
+    if compression == 'none':
+        return open(path, mode)
+    if compression == 'gzip':
+        return _GzipFile(path, level if level is not None else 9, mode)
+    if compression == 'gzip-mt':
+        return _BlockGzipFile(path, level if level is not None else 9, threads, mode)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('the zstd compression requires the package zstandard')
+        compressor = zstandard.ZstdCompressor(level=level if level is not None else 3, threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(open(path, mode))
+    raise ValueError('unknown compression: ' + compression)
+
+
+def open_text(path: str, compression: str = 'none', level: int = None, threads: int = None, append: bool = False):
+    """Opens a UTF-8 text file for writing that is compressed with `compression`."""
+    return io.TextIOWrapper(open_compressed(path, compression, level, threads, append), encoding='utf8')
+
+
+def truncate(path: str, size: int) -> None:
+    """Truncates the file to `size` bytes, i.e., to its size at a checkpoint."""
+    with open(path, 'r+b') as fp:
+        fp.truncate(size)
+
+
+class CSVWriter:
+    """
+    Writes one CSV file per table, compressed with `compression`; the rows of the patients are appended
+    chunk by chunk. With `append`, the rows are added to the files of the patient tables written before.
+    With `resume`, the state returned by `checkpoint`, the files are truncated to their sizes at the checkpoint
+    and the rows are added to them.
+    """
+
+    def __init__(self, tables: dict, folder: str, compression: str = 'none', level: int = None, threads: int = None,
+                 append: bool = False, resume: dict = None):
+        os.makedirs(folder, exist_ok=True)
+        self.compression = (compression, level, threads)
+        self.paths = {}
+        self.files = {}
+        self.writers = {}
+        for name in sorted(tables):  # same order as 'show tables'
+            table = tables[name]
+            if (append or resume is not None) and table.static:
+                continue
+            self.paths[name] = os.path.join(folder, name + '.csv' + COMPRESSIONS[compression])
+            if resume is not None:
+                truncate(self.paths[name], resume[name])
+            self.files[name] = open_text(self.paths[name], compression, level, threads, append or resume is not None)
+            self.writers[name] = csv.writer(self.files[name], lineterminator='\n')
+            if append or resume is not None:
+                continue
+            self.writers[name].writerow(table.columns.keys())
+            if table.static:  # complete; only the files of the patient tables are written chunk by chunk
+                self.writers[name].writerows(table.rows())
+                self.files.pop(name).close()
+
+    def write(self, chunk: dict) -> None:
+        """Appends the rows of one chunk of patients formatted with `format_csv`."""
+        for name, rows in chunk.items():
+            self.files[name].write(rows)
+
+    def checkpoint(self) -> dict:
+        """Completes the files written so far and returns their sizes; the rows that follow are appended to them."""
+        sizes = {}
+        for name, fp in self.files.items():
+            fp.close()
+            sizes[name] = os.path.getsize(self.paths[name])
+            self.files[name] = open_text(self.paths[name], *self.compression, append=True)
+        return sizes
+
+    def close(self) -> None:
+        for fp in self.files.values():
+            fp.close()
+
+
+def format_csv(tables: dict) -> dict:
+    """Formats the rows of the patients currently held in the buffers as CSV; one string per table."""
+    chunk = {}
+    for name, table in tables.items():
+        if not table.static:
+            fp = io.StringIO()
+            csv.writer(fp, lineterminator='\n').writerows(table.rows())
+            chunk[name] = fp.getvalue()
+    return chunk
+
+
+def _sql_value(value, sql_type: str) -> str:
+    if value is None:
+        return 'NULL'
+    if sql_type == 'date':
+        return "'" + value + "'"
+    if sql_type == 'bit':
+        return "b'" + str(value) + "'"
+    if isinstance(value, str):
+        return "'" + str(value).translate(_ESCAPE) + "'"
+    return str(value)
+
+
+def _format_rows(table) -> list:
+    types = list(table.columns.values())
+    return ['(' + ','.join(_sql_value(value, sql_type) for value, sql_type in zip(row, types)) + ')' for row in table.rows()]
+
+
+def format_sql(tables: dict) -> dict:
+    """Formats the rows of the patients currently held in the buffers as SQL values; one list of rows per table."""
+    return {name: _format_rows(table) for name, table in tables.items() if not table.static}
+
+
+class SQLDumpWriter:
+    """
+    Writes a SQL dump that can be loaded into MySQL, compressed with `compression` (gzip by default); the rows of the
+    patients are appended chunk by chunk.
+    As in a dump created by `mysqldump`, the rows of each table are written in extended INSERT statements of at most
+    `_MAX_INSERT_LENGTH` characters. Until the dump is closed, the statements of each table are kept in a temporary
+    file, so that the dump does not depend on the size of the chunks. With `append`, only the INSERT statements of
+    the patients are added to the end of an existing dump, so that loading it also loads the new patients.
+    With `checkpoints`, the statements are kept in the folder `path.parts` instead, so that a run can be continued
+    from a checkpoint with `resume`, the state returned by `checkpoint`.
+    """
+
+    def __init__(self, tables: dict, path: str, db_name: str = 'synth', compression: str = 'gzip', level: int = None,
+                 threads: int = None, append: bool = False, checkpoints: bool = False, resume: dict = None):
+        self.path = path
+        self.db_name = db_name
+        self.compression = (compression, level, threads)
+        self.append = append
+        self.tables = {name: table for name, table in sorted(tables.items())}
+        if checkpoints or resume is not None:
+            self.tmp_dir = None
+            self.parts = path + '.parts'
+            os.makedirs(self.parts, exist_ok=resume is not None)
+        else:
+            self.tmp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path)))
+            self.parts = self.tmp_dir.name
+        if resume is not None:
+            if append:  # the dump is only extended when it is closed
+                truncate(path, resume['size'])
+            for name, offset in resume['offsets'].items():
+                truncate(os.path.join(self.parts, name + '.sql'), offset)
+        self.files = {name: open(os.path.join(self.parts, name + '.sql'), 'w' if resume is None else 'a', encoding='utf8')
+                      for name in tables}
+        # length of the current INSERT statement per table
+        self.lengths = dict.fromkeys(tables, 0) if resume is None else dict(resume['lengths'])
+        for name, table in tables.items():
+            if table.static and not append and resume is None:
+                self._write_rows(name, _format_rows(table))
+
+    def _write_rows(self, name: str, rows: list) -> None:
+        fp = self.files[name]
+        length = self.lengths[name]
+        for values in rows:
+            if length == 0:
+                statement = 'INSERT INTO `' + name + '` VALUES ' + values
+                fp.write(statement)
+                length = len(statement)
+            elif length + len(values) + 1 > _MAX_INSERT_LENGTH:
+                statement = ';\nINSERT INTO `' + name + '` VALUES ' + values
+                fp.write(statement)
+                length = len(statement) - 2
+            else:
+                fp.write(',' + values)
+                length += len(values) + 1
+        self.lengths[name] = length
+
+    def write(self, chunk: dict) -> None:
+        """Appends the rows of one chunk of patients formatted with `format_sql`."""
+        for name, rows in chunk.items():
+            self._write_rows(name, rows)
+
+    def checkpoint(self) -> dict:
+        """Writes the statements received so far to the files in `path.parts` and returns their sizes."""
+        offsets = {}
+        for name, fp in self.files.items():
+            fp.flush()
+            offsets[name] = fp.tell()
+        size = os.path.getsize(self.path) if self.append else None
+        return {'offsets': offsets, 'lengths': dict(self.lengths), 'size': size}
+
+    def close(self) -> None:
+        with open_text(self.path, *self.compression, self.append) as fp:
+            if self.append:
+                fp.write('\n-- Patients appended to the database `' + self.db_name + '` by the Synthetic Data Generator\n\n')
+            else:
+                fp.write('-- SQL dump of the database `' + self.db_name + '` created by the Synthetic Data Generator\n\n')
+            fp.write('/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n')
+            fp.write('/*!50503 SET NAMES utf8mb4 */;\n')
+            fp.write('/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n')
+            fp.write('/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n')
+
+            for name, table in self.tables.items():
+                if not self.append:
+                    fp.write('\n--\n-- Table structure for table `' + name + '`\n--\n\n')
+                    fp.write('DROP TABLE IF EXISTS `' + name + '`;\n')
+                    fp.write(table.create + '\n')
+                    for index in table.indexes:
+                        fp.write(index + '\n')
+
+                self.files[name].close()
+                if self.lengths[name] == 0:
+                    continue
+                fp.write('\n--\n-- Dumping data for table `' + name + '`\n--\n\n')
+                fp.write('LOCK TABLES `' + name + '` WRITE;\n')
+                fp.write('/*!40000 ALTER TABLE `' + name + '` DISABLE KEYS */;\n')
+                with open(self.files[name].name, 'r', encoding='utf8') as statements:
+                    shutil.copyfileobj(statements, fp)
+                fp.write(';\n')
+                fp.write('/*!40000 ALTER TABLE `' + name + '` ENABLE KEYS */;\n')
+                fp.write('UNLOCK TABLES;\n')
+
+            fp.write('\n/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n')
+            fp.write('/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;\n')
+            fp.write('/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n')
+        if self.tmp_dir is not None:
+            self.tmp_dir.cleanup()
+        else:
+            shutil.rmtree(self.parts)
+
+
+_CLOSE = object()  # closes the writer of a `ThreadedWriter`
+
+
+class ThreadedWriter:
+    """
+    Runs a writer, e.g., a `CSVWriter`, in a background thread. The chunks passed to `write` are queued and
+    written in order; at most `max_pending` chunks are queued before `write` blocks. Errors of the writer are
+    raised by the next call of `write`, `checkpoint`, or `close`. The time the thread spent on writing is kept in
+    `seconds`.
+    """
+
+    def __init__(self, writer, max_pending: int = 2):
+        self.writer = writer
+        self.queue = queue.Queue(max_pending)
+        self.error = None
+        self.seconds = 0.0
+        self.closing = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            chunk = self.queue.get()
+            start = time.perf_counter()
+            try:
+                if chunk is _CLOSE:
+                    self.writer.close()
+                elif isinstance(chunk, concurrent.futures.Future):  # a checkpoint after the chunks queued before
+                    if self.error is None:
+                        chunk.set_result(self.writer.checkpoint())
+                    else:
+                        chunk.set_exception(self.error)
+                elif self.error is None:
+                    self.writer.write(chunk)
+            except BaseException as e:
+                self.error = e
+                if isinstance(chunk, concurrent.futures.Future):
+                    chunk.set_exception(e)
+            self.seconds += time.perf_counter() - start
+            if chunk is _CLOSE:
+                return
+
+    def write(self, chunk) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put(chunk)
+
+    def checkpoint(self):
+        """Waits until the queued chunks are written and returns the state of the writer at the checkpoint."""
+        if self.error is not None:
+            raise self.error
+        state = concurrent.futures.Future()
+        self.queue.put(state)
+        return state.result()
+
+    def close(self, wait: bool = True) -> None:
+        """Closes the writer after the queued chunks are written; with `wait=False`, it does not wait for it."""
+        if not self.closing:
+            self.closing = True
+            self.queue.put(_CLOSE)
+        if wait:
+            self.thread.join()
+            if self.error is not None:
+                raise self.error
+
+
+def close_writers(writers: list) -> None:
+    """Closes several writers at the same time; the `ThreadedWriter`s are closed in parallel."""
+    for writer in writers:
+        if isinstance(writer, ThreadedWriter):
+            writer.close(wait=False)
+    for writer in writers:
+        writer.close()